@@ -173,6 +173,10 @@ export default function AdminOrdersPage() {
           Authorization: `Bearer ${token || ""}`,
         }
       })
+      if (response.status === 409) {
+        alert("La boleta aún se está generando. Intenta de nuevo en unos segundos.")
+        return
+      }
       if (!response.ok) {
         alert("Error al descargar la boleta.")
         return
@@ -70,6 +70,10 @@ export default function InvoicesPage() {
       const res = await fetch(`http://localhost:5000/invoices/${invoice.invoice_id}/download`, {
         headers: { Authorization: `Bearer ${token}` },
       })
+      if (res.status === 409) {
+        alert("La boleta aún se está generando. Intenta de nuevo en unos segundos.")
+        return
+      }
       if (!res.ok) throw new Error("No se pudo descargar la boleta")
       const blob = await res.blob()
       const url = window.URL.createObjectURL(blob)
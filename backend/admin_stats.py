@@ -0,0 +1,292 @@
+"""
+Agregados del panel de administración (/admin/stats) mantenidos al escribir.
+
+En vez de contar y sumar todas las tablas en cada refresco del panel, cada
+escritura en crud/stock suma o resta su parte en la tabla admin_stats, dentro
+de la misma transacción (si la escritura hace rollback, el ajuste también).
+Los ajustes son UPDATE atómicos (`count = count + n`), como en stock.py.
+
+Contadores repartidos: cada (metric, dimension) tiene hasta
+ADMIN_STATS_SHARDS filas y cada transacción suma en una al azar; al leer se
+suman todas. Así dos checkouts casi nunca esperan el bloqueo de la misma
+fila hasta el commit del otro.
+
+Filas: (metric, dimension, shard) -> (count, amount)
+  products, users, low_stock        dimension ''
+  orders                            dimension '', amount = ingresos
+  status / payment_method           dimension = valor, amount = ingresos
+
+reconcile() recalcula todo desde las tablas base y corrige la deriva
+(flask reconcile-stats). Deja una fila marca (_seeded): mientras no exista,
+los contadores son parciales. La primera carga la hace la migración 014 o
+ese comando; snapshot() nunca concilia (corre en GET, que puede ir a una
+réplica) y solo informa con "seeded" si los totales todavía no valen.
+"""
+import random
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from models import db, AdminStat, Product, User, Order
+
+PRODUCTS = "products"
+USERS = "users"
+LOW_STOCK = "low_stock"
+ORDERS = "orders"
+BY_STATUS = "status"
+BY_PAYMENT_METHOD = "payment_method"
+# Marca de que reconcile() ya llenó la tabla (no es un contador)
+SEEDED = "_seeded"
+
+CENT = Decimal("0.01")
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def is_low(stock, min_stock):
+    # Igual que `stock < min_stock` en SQL: con NULL no cuenta
+    return stock is not None and min_stock is not None and stock < min_stock
+
+
+def _apply(deltas):
+    """
+    Suma {(metric, dimension): (count, amount)} a la tabla, todo en un mismo
+    shard al azar. Las filas se actualizan siempre en el mismo orden para no
+    cruzar bloqueos.
+    """
+    shard = random.randrange(max(current_app.config.get("ADMIN_STATS_SHARDS", 16), 1))
+    for (metric, dimension), (count, amount) in sorted(deltas.items()):
+        if not count and not amount:
+            continue
+        where = (AdminStat.metric == metric, AdminStat.dimension == dimension, AdminStat.shard == shard)
+        increment = (
+            update(AdminStat).where(*where)
+            .values(count=AdminStat.count + count, amount=AdminStat.amount + amount)
+            .execution_options(synchronize_session=False)
+        )
+        if db.session.execute(increment).rowcount:
+            continue
+        # Primera vez que aparece este valor (p. ej. un status nuevo)
+        savepoint = db.session.begin_nested()
+        try:
+            db.session.execute(insert(AdminStat).values(
+                metric=metric, dimension=dimension, shard=shard, count=count, amount=amount,
+            ))
+            savepoint.commit()
+        except IntegrityError:
+            # Otra transacción la creó primero
+            savepoint.rollback()
+            db.session.execute(increment)
+
+
+def _order_deltas(status, payment_method, total_amount, sign):
+    amount = _money(total_amount) * sign
+    return {
+        (ORDERS, ""): (sign, amount),
+        (BY_STATUS, status or ""): (sign, amount),
+        (BY_PAYMENT_METHOD, payment_method or ""): (sign, amount),
+    }
+
+
+def _merge(*parts):
+    merged = {}
+    for part in parts:
+        for key, (count, amount) in part.items():
+            old_count, old_amount = merged.get(key, (0, 0))
+            merged[key] = (old_count + count, old_amount + amount)
+    return merged
+
+
+# --- Hooks (se llaman antes del commit, dentro de la transacción) ---
+
+def user_added():
+    _apply({(USERS, ""): (1, 0)})
+
+
+def user_removed(user_id):
+    """El cascade de User borra también sus órdenes: se restan aquí."""
+    rows = (
+        db.session.query(Order.status, Order.payment_method, func.count(), func.sum(Order.total_amount))
+        .filter(Order.user_id == user_id)
+        .group_by(Order.status, Order.payment_method)
+        .all()
+    )
+    deltas = [{(USERS, ""): (-1, 0)}]
+    for status, payment_method, count, amount in rows:
+        deltas.append({
+            key: (-count, -_money(amount))
+            for key in _order_deltas(status, payment_method, 0, 1)
+        })
+    _apply(_merge(*deltas))
+
+
+def product_added(product):
+    _apply({
+        (PRODUCTS, ""): (1, 0),
+        (LOW_STOCK, ""): (int(is_low(product.stock, product.min_stock)), 0),
+    })
+
+
+def product_changed(was_low, product):
+    _apply({(LOW_STOCK, ""): (int(is_low(product.stock, product.min_stock)) - int(was_low), 0)})
+
+
+def products_imported(added, low_delta):
+    """Un lote de product_import: productos nuevos y cambio neto de stock bajo."""
+    _apply({(PRODUCTS, ""): (added, 0), (LOW_STOCK, ""): (low_delta, 0)})
+
+
+def products_removed(products):
+    products = list(products)
+    _apply({
+        (PRODUCTS, ""): (-len(products), 0),
+        (LOW_STOCK, ""): (-sum(1 for p in products if is_low(p.stock, p.min_stock)), 0),
+    })
+
+
+def stock_changed(quantities, sign):
+    """
+    Tras un UPDATE de stock (stock.py) de {product_id: cantidad} con signo
+    -1 (descuento) o +1 (devolución). Las filas ya están bloqueadas por el
+    UPDATE, así el stock previo se deduce sin carreras.
+    """
+    rows = (
+        db.session.query(Product.stock, Product.min_stock, Product.id)
+        .filter(Product.id.in_(list(quantities)))
+        .all()
+    )
+    delta = 0
+    for stock, min_stock, product_id in rows:
+        before = stock - sign * quantities[product_id]
+        delta += int(is_low(stock, min_stock)) - int(is_low(before, min_stock))
+    _apply({(LOW_STOCK, ""): (delta, 0)})
+
+
+def order_added(order):
+    _apply(_order_deltas(order.status, order.payment_method, order.total_amount, 1))
+
+
+def order_snapshot(order):
+    """Lo que hace falta recordar de una orden antes de modificarla."""
+    return order.status, order.payment_method, order.total_amount
+
+
+def order_changed(before, order):
+    _apply(_merge(
+        _order_deltas(*before, -1),
+        _order_deltas(order.status, order.payment_method, order.total_amount, 1),
+    ))
+
+
+def order_removed(order):
+    _apply(_order_deltas(order.status, order.payment_method, order.total_amount, -1))
+
+
+# --- Lectura y conciliación ---
+
+def compute():
+    """Valores exactos desde las tablas base (lo que hacía el panel antes)."""
+    values = {
+        (PRODUCTS, ""): (Product.query.count(), Decimal(0)),
+        (USERS, ""): (User.query.count(), Decimal(0)),
+        (LOW_STOCK, ""): (Product.query.filter(Product.stock < Product.min_stock).count(), Decimal(0)),
+    }
+    rows = (
+        db.session.query(Order.status, Order.payment_method, func.count(), func.sum(Order.total_amount))
+        .group_by(Order.status, Order.payment_method)
+        .all()
+    )
+    values[(ORDERS, "")] = (0, Decimal(0))
+    for status, payment_method, count, amount in rows:
+        values = _merge(values, {
+            key: (count, _money(amount))
+            for key in _order_deltas(status, payment_method, 0, 1)
+        })
+    return values
+
+
+def _current(lock=False):
+    """{(metric, dimension): (count, amount)} sumando los shards; incluye la marca SEEDED."""
+    query = AdminStat.query.order_by(AdminStat.metric, AdminStat.dimension, AdminStat.shard)
+    if lock:
+        query = query.with_for_update()
+    values = {}
+    for stat in query.all():
+        values = _merge(values, {(stat.metric, stat.dimension): (stat.count, _money(stat.amount))})
+    return values
+
+
+def reconcile():
+    """
+    Corrige la deriva (ediciones directas en la BD, carreras en update_order)
+    y deja los valores exactos en el shard 0. Bloquea primero las filas de
+    admin_stats: las escrituras que llegan mientras tanto esperan y aplican
+    su ajuste sobre el valor ya corregido.
+    Devuelve {(metric, dimension): (antes, ahora)} con lo que cambió.
+    """
+    current = _current(lock=True)
+    current.pop((SEEDED, ""), None)
+    expected = compute()
+    drift = {}
+    for key in sorted(set(current) | set(expected)):
+        old = current.get(key, (0, Decimal(0)))
+        new = expected.get(key, (0, Decimal(0)))
+        if old[0] != new[0] or old[1] != new[1]:
+            drift[key] = (old, new)
+    db.session.execute(delete(AdminStat).execution_options(synchronize_session=False))
+    rows = [
+        {"metric": metric, "dimension": dimension, "shard": 0, "count": count, "amount": amount}
+        for (metric, dimension), (count, amount) in sorted(expected.items())
+    ]
+    rows.append({"metric": SEEDED, "dimension": "", "shard": 0, "count": 1, "amount": 0})
+    db.session.execute(insert(AdminStat), rows)
+    db.session.commit()
+    return drift
+
+
+def _seeded():
+    return AdminStat.query.filter_by(metric=SEEDED).first() is not None
+
+
+def count(metric, dimension=""):
+    """Conteo de una métrica (suma de sus shards); None si reconcile() todavía no llenó la tabla."""
+    if not _seeded():
+        return None
+    total = (
+        db.session.query(func.sum(AdminStat.count))
+        .filter(AdminStat.metric == metric, AdminStat.dimension == dimension)
+        .scalar()
+    )
+    return int(total or 0)
+
+
+def snapshot():
+    """
+    Datos del panel leyendo solo admin_stats (unas pocas filas), tal como
+    están. Sin la marca SEEDED ("seeded": False) son solo los ajustes de los
+    hooks, no el total: falta flask reconcile-stats.
+    """
+    values = _current()
+    seeded = values.pop((SEEDED, ""), None) is not None
+
+    def breakdown(metric):
+        return {
+            dimension: {"count": count, "revenue": float(amount)}
+            for (m, dimension), (count, amount) in values.items() if m == metric
+        }
+
+    def total(metric):
+        return values.get((metric, ""), (0, Decimal(0)))
+
+    return {
+        "totalProducts": total(PRODUCTS)[0],
+        "totalUsers": total(USERS)[0],
+        "totalOrders": total(ORDERS)[0],
+        "totalRevenue": float(total(ORDERS)[1]),
+        "lowStockProducts": total(LOW_STOCK)[0],
+        "revenueByStatus": breakdown(BY_STATUS),
+        "revenueByPaymentMethod": breakdown(BY_PAYMENT_METHOD),
+        "seeded": seeded,
+    }
@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 import os
+import click
 
 # 1. Carga las variables del .env
 load_dotenv() 
@@ -21,6 +22,8 @@ from routes.invoices import invoices_bp
 from routes.cart_items import cart_items_bp
 from routes.auth import auth_bp
 from routes.stats import stats_bp
+from routes.analytics import analytics_bp
+from routes.metrics import metrics_bp
 
 # 2. Inicializa la app Flask
 app = Flask(__name__)
@@ -43,10 +46,22 @@ app.config["JWT_HEADER_TYPE"] = "Bearer"
 # 7. Inicializa JWTManager
 jwt = JWTManager(app)
 
-# 8. Inicializa la base de datos
+# 8. Inicializa la base de datos (y las métricas del pool de conexiones)
 db.init_app(app)
+with app.app_context():
+    import pool_metrics
+    import replicas
+    for engine in db.engines.values():
+        pool_metrics.install(engine)
+    replicas.install(db)
+    # Métricas por endpoint (/metrics) y log de peticiones lentas
+    import request_metrics
+    request_metrics.install(app, db.engines.values())
 
-# 9. Registra todos los blueprints
+# 9. Registra todos los blueprints. Los GET del catálogo, los listados de
+# órdenes y los reportes leen de réplicas si hay (DATABASE_REPLICA_URLS)
+for blueprint in (categories_bp, products_bp, orders_bp, stats_bp, analytics_bp):
+    replicas.route_reads(blueprint)
 app.register_blueprint(users_bp)
 app.register_blueprint(categories_bp)
 app.register_blueprint(products_bp)
@@ -57,8 +72,96 @@ app.register_blueprint(invoices_bp)
 app.register_blueprint(cart_items_bp)
 app.register_blueprint(auth_bp)
 app.register_blueprint(stats_bp)
+app.register_blueprint(analytics_bp)
+app.register_blueprint(metrics_bp)
+
+# Carritos en memoria/Redis con escritura diferida (CART_STORE); recupera lo
+# que quedó sin guardar y arranca el hilo que lo persiste
+import cart_store
+cart_store.init_app(app)
+
+# 10. Tareas periódicas (cron): flask --app app release-holds
+@app.cli.command("release-holds")
+def release_holds_command():
+    """Devuelve al stock las reservas de carrito vencidas."""
+    import crud
+    product_ids = crud.release_expired_holds()
+    print(f"Reservas liberadas en {len(product_ids)} productos.")
+
+@app.cli.command("flush-carts")
+@click.option("--retry-failed", is_flag=True, help="Reintenta también los carritos en cuarentena.")
+def flush_carts_command(retry_failed):
+    """Guarda en la BD los carritos pendientes del almacén (CART_STORE)."""
+    import cart_store
+    if not cart_store.enabled():
+        print("CART_STORE=db: no hay carritos pendientes.")
+        return
+    if retry_failed:
+        print(f"Carritos en cuarentena reintentados: {cart_store.retry_failed()}.")
+    flushed = cart_store.flush_all(wait=30)
+    print(f"Carritos guardados: {flushed}.")
+
+@app.cli.command("render-pending-invoices")
+def render_pending_invoices_command():
+    """Genera los PDF de boletas que quedaron pendientes o fallidas."""
+    import invoice_jobs
+    done, total = invoice_jobs.requeue_pending()
+    print(f"Boletas generadas: {done} de {total}.")
+
+@app.cli.command("migrate-invoice-blobs")
+@click.option("--batch-size", default=100, show_default=True, help="Boletas por commit.")
+@click.option("--keep-blob", is_flag=True, help="No borra invoices.pdf_data tras copiarlo.")
+def migrate_invoice_blobs_command(batch_size, keep_blob):
+    """Mueve los PDF guardados en invoices.pdf_data al almacén de blobs."""
+    import blob_store
+    migrated = blob_store.migrate_invoice_blobs(batch_size=batch_size, keep_blob=keep_blob)
+    print(f"Migración completa: {migrated} boletas.")
+
+@app.cli.command("reconcile-stats")
+def reconcile_stats_command():
+    """Recalcula los agregados del panel desde las tablas y corrige la deriva."""
+    import admin_stats
+    drift = admin_stats.reconcile()
+    for (metric, dimension), (old, new) in drift.items():
+        print(f"{metric} {dimension or '-'}: {old[0]} / {old[1]} -> {new[0]} / {new[1]}")
+    print(f"Agregados conciliados ({len(drift)} corregidos).")
+
+@app.cli.command("rollup-sales")
+def rollup_sales_command():
+    """Actualiza los rollups de ventas de los días con órdenes modificadas."""
+    import sales_analytics
+    days = sales_analytics.refresh()
+    print(f"Rollups de ventas actualizados: {days} días.")
+
+@app.cli.command("backfill-sales")
+@click.option("--from", "date_from", help="Desde (YYYY-MM-DD); por defecto la primera orden.")
+@click.option("--to", "date_to", help="Hasta (YYYY-MM-DD, inclusive); por defecto la última orden.")
+def backfill_sales_command(date_from, date_to):
+    """Reconstruye los rollups de ventas desde orders/order_items."""
+    from datetime import datetime, timedelta
+    import sales_analytics
+    start = datetime.strptime(date_from, "%Y-%m-%d") if date_from else None
+    end = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1) if date_to else None
+    months = sales_analytics.backfill(start, end)
+    print(f"Backfill completo: {months} meses.")
+
+@app.cli.command("import-products")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "import_format", type=click.Choice(["csv", "jsonl"]), help="Por defecto según la extensión.")
+@click.option("--chunk-size", default=500, show_default=True, help="Filas por transacción.")
+def import_products_command(path, import_format, chunk_size):
+    """Crea o actualiza productos por product_code desde un CSV o JSONL."""
+    import product_import
+    import_format = import_format or product_import.format_from_filename(path)
+    if not import_format:
+        raise click.UsageError("No se pudo deducir el formato: usa --format csv|jsonl")
+    with open(path, encoding="utf-8-sig", errors="surrogateescape", newline="") as stream:
+        result = product_import.import_products(stream, import_format, chunk_size)
+    for error in result["errors"]:
+        print(f"línea {error['line']} ({error['product_code'] or '-'}): {error['error']}")
+    print(f"Creados: {result['created']}, actualizados: {result['updated']}, fallidos: {result['failed']}.")
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        db.create_all(bind_key=None)  # solo el primario; las réplicas replican el esquema
     app.run(host="localhost", port=5000, debug=True)
@@ -1,25 +1,116 @@
+"""
+Autenticación por JWT (los tokens de /login, firmados con JWT_SECRET_KEY).
+
+Cada token se verifica (firma HMAC, exp, nbf) una sola vez por proceso: los
+claims quedan en una caché LRU acotada, con clave el hash del token, hasta
+su exp (o AUTH_TOKEN_CACHE_TTL si es antes). Dentro de la petición quedan
+en `g`, así current_user_id()/current_role() no decodifican ni consultan la
+base otra vez.
+
+Decoradores: login_required (cualquier usuario) y admin_required.
+"""
+import hashlib
+import time
 from functools import wraps
-from flask import request, jsonify
+from flask import current_app, g, jsonify, request
 import jwt
-import os
+from cache import LocalCache
+
+ALGORITHMS = ["HS256"]
+
+_verified = None
+
+
+def _verified_tokens():
+    global _verified
+    if _verified is None:
+        _verified = LocalCache(current_app.config.get("AUTH_TOKEN_CACHE_SIZE", 10000))
+    return _verified
+
+
+def reset_cache():
+    """Vacía la caché de tokens (p. ej. tras cambiar JWT_SECRET_KEY)."""
+    global _verified
+    _verified = None
+
+
+def _bearer_token():
+    parts = request.headers.get("Authorization", "").split(" ")
+    if len(parts) == 2 and parts[0] == "Bearer" and parts[1]:
+        return parts[1]
+    return None
+
+
+def verify_token(token):
+    """Claims del token; lanza jwt.InvalidTokenError si no es válido."""
+    config = current_app.config
+    cached_tokens = _verified_tokens() if config.get("AUTH_TOKEN_CACHE_SIZE", 10000) else None
+    key = hashlib.sha256(token.encode()).hexdigest()
+    if cached_tokens is not None:
+        cached = cached_tokens.get(key)
+        # exp también se revisa al leer: el TTL de la caché es monotónico
+        if isinstance(cached, tuple) and (cached[1] is None or time.time() < cached[1]):
+            return cached[0]
+    claims = jwt.decode(token, config["JWT_SECRET_KEY"], algorithms=ALGORITHMS)
+    ttl = config.get("AUTH_TOKEN_CACHE_TTL", 300)
+    if cached_tokens is not None and ttl:
+        exp = claims.get("exp")
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl > 0:
+            cached_tokens.set(key, (claims, exp), ttl)
+    return claims
+
+
+def current_claims():
+    """
+    Claims del token de la petición (verificado una vez por petición);
+    None si no hay token. Lanza jwt.InvalidTokenError si es inválido.
+    """
+    if "auth_claims" not in g:
+        token = _bearer_token()
+        g.auth_claims = verify_token(token) if token else None
+    return g.auth_claims
+
+
+def current_user_id():
+    claims = current_claims()
+    return claims.get("sub") if claims else None
+
+
+def current_role():
+    claims = current_claims()
+    return claims.get("role") if claims else None
+
+
+def _authenticate():
+    """(claims, None) o (None, respuesta de error)."""
+    try:
+        claims = current_claims()
+    except jwt.InvalidTokenError as e:
+        return None, (jsonify({"message": f"Token inválido: {str(e)}"}), 401)
+    if claims is None:
+        return None, (jsonify({"message": "Token requerido"}), 401)
+    return claims, None
+
+
+def login_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        _, error = _authenticate()
+        if error:
+            return error
+        return f(*args, **kwargs)
+    return decorated
 
-JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 
 def admin_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            parts = request.headers['Authorization'].split(" ")
-            if len(parts) == 2 and parts[0] == "Bearer":
-                token = parts[1]
-        if not token:
-            return jsonify({"message": "Token requerido"}), 401
-        try:
-            data = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
-            if data.get('role') != 'admin':
-                return jsonify({"message": "Solo administradores"}), 403
-        except Exception as e:
-            return jsonify({"message": f"Token inválido: {str(e)}"}), 401
+        claims, error = _authenticate()
+        if error:
+            return error
+        if claims.get('role') != 'admin':
+            return jsonify({"message": "Solo administradores"}), 403
         return f(*args, **kwargs)
     return decorated
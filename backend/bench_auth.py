@@ -0,0 +1,65 @@
+"""
+Costo de la autenticación por petición.
+
+Mide (1) verify_token solo, sin caché (jwt.decode completo) y con la caché
+de tokens verificados, y (2) peticiones completas con el cliente de pruebas
+a un endpoint protegido (/admin/pool) y al mismo endpoint sin decorador,
+para ver qué parte de la latencia es autenticación.
+
+Usa un SQLite en memoria; no necesita datos.
+
+Uso: python bench_auth.py [iteraciones]
+"""
+import os
+import sys
+import time
+
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.setdefault("JWT_SECRET_KEY", "bench-auth-secret-key-0123456789abcdef")
+
+from flask import jsonify
+from flask_jwt_extended import create_access_token
+from app import app
+import auth_utils
+import pool_metrics
+
+
+def per_call(fn, iterations):
+    fn()  # calentamiento
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main(iterations=5000):
+    app.add_url_rule("/bench/open", "bench_open", lambda: jsonify(pool_metrics.snapshot()))
+    client = app.test_client()
+    with app.app_context():
+        token = create_access_token(identity="bench-user", additional_claims={"role": "admin"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with app.test_request_context():
+        app.config["AUTH_TOKEN_CACHE_SIZE"] = 0
+        decode_us = per_call(lambda: auth_utils.verify_token(token), iterations)
+        app.config["AUTH_TOKEN_CACHE_SIZE"] = 10000
+        auth_utils.reset_cache()
+        cached_us = per_call(lambda: auth_utils.verify_token(token), iterations)
+
+    requests = max(iterations // 5, 1)
+    open_us = per_call(lambda: client.get("/bench/open"), requests)
+    app.config["AUTH_TOKEN_CACHE_SIZE"] = 0
+    uncached_request_us = per_call(lambda: client.get("/admin/pool", headers=headers), requests)
+    app.config["AUTH_TOKEN_CACHE_SIZE"] = 10000
+    auth_utils.reset_cache()
+    cached_request_us = per_call(lambda: client.get("/admin/pool", headers=headers), requests)
+
+    print(f"verify_token sin caché:   {decode_us:8.1f} µs")
+    print(f"verify_token con caché:   {cached_us:8.1f} µs  ({decode_us / cached_us:.1f}x)")
+    print(f"petición sin auth:        {open_us:8.1f} µs")
+    print(f"petición admin sin caché: {uncached_request_us:8.1f} µs  (+{uncached_request_us - open_us:.1f} µs)")
+    print(f"petición admin con caché: {cached_request_us:8.1f} µs  (+{cached_request_us - open_us:.1f} µs)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark del render de boletas: tiempo por boleta y memoria pico
+(tracemalloc) para boletas cortas y largas (varias páginas).
+
+Para comparar contra otra versión del generador, pasar la ruta de un archivo
+con su propia generar_boleta_pdf, p. ej.:
+
+    git show HEAD~1:backend/pdf_generator.py > /tmp/pdf_generator_old.py
+    python bench_invoice_render.py 200 /tmp/pdf_generator_old.py
+    python bench_invoice_render.py 200
+
+Uso: python bench_invoice_render.py [boletas] [archivo_generador]
+"""
+import importlib.util
+import statistics
+import sys
+import time
+import tracemalloc
+
+ITEM_COUNTS = (3, 20, 80)
+
+
+def load_renderer(path=None):
+    if not path:
+        from pdf_generator import generar_boleta_pdf
+        return generar_boleta_pdf
+    spec = importlib.util.spec_from_file_location("pdf_generator_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.generar_boleta_pdf
+
+
+def sample_data(item_count):
+    return {
+        'invoiceNumber': 'B001-000123',
+        'customerName': 'Cliente de Prueba',
+        'customerDni': '12345678',
+        'customerEmail': 'cliente@example.com',
+        'customerPhone': '999888777',
+        'items': [
+            {
+                'code': f'PRD-{i:05d}',
+                'name': f'Componente de prueba número {i} con un nombre algo largo para forzar saltos de línea',
+                'quantity': 1 + i % 3,
+                'price': 99.9 + i,
+            }
+            for i in range(item_count)
+        ],
+    }
+
+
+def bench(render, item_count, runs):
+    data = sample_data(item_count)
+    render(data)  # calentamiento (imports, fuentes)
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        pdf = render(data)
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    render(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), max(times), peak, len(pdf), pdf.count(b'/Type /Page\n')
+
+
+def main(runs=100, path=None):
+    render = load_renderer(path)
+    print(f"generador: {path or 'pdf_generator'}  repeticiones: {runs}")
+    for item_count in ITEM_COUNTS:
+        median, worst, peak, size, pages = bench(render, item_count, runs)
+        print(f"{item_count:>3} ítems: p50 {median * 1000:.2f} ms  máx {worst * 1000:.2f} ms  "
+              f"memoria pico {peak / 1024:.0f} KiB  pdf {size / 1024:.1f} KiB  páginas {pages}")
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    main(runs, sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,228 @@
+"""
+Almacenamiento de PDFs de boletas fuera de la base de datos.
+
+Los archivos se guardan por contenido (la clave es el SHA-256 de los bytes),
+así escribir dos veces lo mismo no duplica nada y la clave sirve de ETag.
+Hay dos backends con la misma interfaz:
+
+- FileSystemBlobStore: carpeta local; la descarga usa sendfile (send_file)
+  o, detrás de nginx, X-Accel-Redirect sin pasar los bytes por Python.
+- S3BlobStore: cualquier cliente con la API de boto3 (put_object, get_object,
+  head_object, delete_object); sirve MinIO o un doble local en pruebas.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from flask import current_app, Response, send_file
+
+CHUNK_SIZE = 64 * 1024
+# Permisos de los archivos del almacén local (menos lo que quite el umask)
+FILE_MODE = 0o644
+# Códigos de botocore.exceptions.ClientError para un objeto inexistente
+NOT_FOUND_CODES = {"404", "NoSuchKey", "NotFound"}
+
+
+def _umask():
+    # Solo se puede leer cambiándolo: se restaura enseguida. Se lee una vez al
+    # importar, antes de que otros hilos creen archivos con el umask en 0
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _umask()
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _error_code(error):
+    """Código de un ClientError de botocore (sin importar boto3, que es opcional)."""
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        return None
+    return str(response.get("Error", {}).get("Code"))
+
+
+class FileSystemBlobStore:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key):
+        # Dos niveles de carpetas para no juntar millones de archivos en una
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, data):
+        key = content_key(data)
+        path = self._path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Escritura atómica: nunca queda un archivo a medias con la clave final
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            # mkstemp crea con 0600: nginx (X-Accel-Redirect) corre con otro usuario
+            os.fchmod(fd, FILE_MODE & ~_UMASK)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return key
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def size(self, key):
+        return os.path.getsize(self._path(key))
+
+    def open(self, key):
+        return open(self._path(key), "rb")
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def send(self, key, download_name, mimetype="application/pdf"):
+        accel_prefix = current_app.config.get("BLOB_ACCEL_REDIRECT_PREFIX")
+        if accel_prefix:
+            # nginx sirve el archivo (location internal que apunta a BLOB_STORE_PATH)
+            response = Response(mimetype=mimetype)
+            response.headers["X-Accel-Redirect"] = f"{accel_prefix.rstrip('/')}/{key[:2]}/{key[2:4]}/{key}"
+            response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+            return response
+        # send_file usa wsgi.file_wrapper (sendfile) cuando el servidor lo soporta
+        return send_file(
+            self._path(key),
+            download_name=download_name,
+            as_attachment=True,
+            mimetype=mimetype,
+            etag=key,
+            conditional=True,
+        )
+
+
+class S3BlobStore:
+    def __init__(self, client, bucket, prefix="invoices/"):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def put(self, data):
+        key = content_key(data)
+        if not self.exists(key):
+            self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data,
+                                   ContentType="application/pdf")
+        return key
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except Exception as e:
+            # Solo "no existe" es False; un error de permisos, red o
+            # throttling se propaga en vez de volver a subir el PDF
+            if _error_code(e) in NOT_FOUND_CODES:
+                return False
+            raise
+
+    def size(self, key):
+        return self.client.head_object(Bucket=self.bucket, Key=self._key(key))["ContentLength"]
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"]
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def send(self, key, download_name, mimetype="application/pdf"):
+        body = self.open(key)
+
+        def generate():
+            try:
+                while True:
+                    chunk = body.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                body.close()
+
+        response = Response(generate(), mimetype=mimetype)
+        response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+        response.set_etag(key)
+        return response
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _create_store():
+    config = current_app.config
+    backend = config.get("BLOB_STORE", "fs")
+    if backend == "fs":
+        return FileSystemBlobStore(config["BLOB_STORE_PATH"])
+    if backend == "s3":
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("BLOB_STORE=s3 requiere el paquete 'boto3'")
+        client = boto3.client("s3", endpoint_url=config.get("BLOB_S3_ENDPOINT_URL"))
+        return S3BlobStore(client, config["BLOB_S3_BUCKET"], config.get("BLOB_S3_PREFIX", "invoices/"))
+    raise ValueError(f"BLOB_STORE desconocido: {backend}")
+
+
+def get_blob_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _create_store()
+    return _store
+
+
+def set_blob_store(store):
+    """Reemplaza el backend (p. ej. un S3BlobStore con un cliente de pruebas)."""
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def migrate_invoice_blobs(batch_size=100, keep_blob=False, log=print):
+    """
+    Mueve los PDF que siguen en invoices.pdf_data al almacén, por lotes
+    (un commit por lote, recorriendo por id para no releer lo ya migrado).
+    Devuelve la cantidad de boletas migradas.
+    """
+    from models import db, Invoice
+
+    store = get_blob_store()
+    migrated = 0
+    last_id = ""
+    while True:
+        ids = [
+            row.id for row in
+            Invoice.query.with_entities(Invoice.id)
+            .filter(Invoice.pdf_key == None, Invoice.pdf_data != None, Invoice.id > last_id)
+            .order_by(Invoice.id)
+            .limit(batch_size)
+        ]
+        if not ids:
+            break
+        rows = Invoice.query.with_entities(Invoice.id, Invoice.pdf_data).filter(Invoice.id.in_(ids)).all()
+        for invoice_id, pdf_data in rows:
+            key = store.put(pdf_data)
+            values = {"pdf_key": key, "pdf_size": len(pdf_data)}
+            if not keep_blob:
+                values["pdf_data"] = None
+            Invoice.query.filter_by(id=invoice_id).update(values, synchronize_session=False)
+        db.session.commit()
+        db.session.expunge_all()
+        migrated += len(rows)
+        last_id = ids[-1]
+        log(f"{migrated} boletas migradas...")
+    return migrated
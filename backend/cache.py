@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+import replicas
+
+_MISSING = object()
+
+
+class LocalCache:
+    """Caché en memoria del proceso con tamaño acotado, expulsión LRU y TTL."""
+
+    name = "local"
+
+    def __init__(self, max_entries=10000, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """
+    Caché compartida entre workers. `client` es cualquier objeto con la
+    interfaz de redis-py (get, set con ex=, delete, scan_iter); en pruebas
+    sirve un doble en memoria. Los valores se guardan como JSON.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, prefix="pcdos2:", default_ttl=300):
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return _MISSING
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + k for k in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def size(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*"))
+
+
+class NullCache:
+    """Desactiva la caché (CACHE_BACKEND=none) sin tocar a los llamadores."""
+
+    name = "none"
+
+    def get(self, key):
+        return _MISSING
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def size(self):
+        return 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _create_cache():
+    config = current_app.config
+    backend = config.get("CACHE_BACKEND", "local")
+    ttl = config.get("CACHE_TTL", 300)
+    if backend == "local":
+        return LocalCache(config.get("CACHE_MAX_ENTRIES", 10000), ttl)
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requiere el paquete 'redis'")
+        return RedisCache(redis.Redis.from_url(config.get("CACHE_REDIS_URL")), default_ttl=ttl)
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"CACHE_BACKEND desconocido: {backend}")
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _create_cache()
+    return _cache
+
+
+def is_shared():
+    """True si todos los workers ven la misma caché (y por tanto sus invalidaciones)."""
+    return get_cache().name == "redis"
+
+
+def set_cache(cache):
+    """Reemplaza el backend (p. ej. un RedisCache con un cliente de pruebas)."""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def _count(key, outcome):
+    namespace = key.split(":", 1)[0]
+    with _stats_lock:
+        counters = _stats.setdefault(namespace, {"hits": 0, "misses": 0})
+        counters[outcome] += 1
+
+
+def get_or_load(key, loader, ttl=None):
+    """Lectura a través de la caché; `loader` solo se llama en un fallo. None no se guarda."""
+    cache = get_cache()
+    value = cache.get(key)
+    if value is not _MISSING:
+        _count(key, "hits")
+        return value
+    _count(key, "misses")
+    # Lo que se guarda se lee del primario aunque la petición use réplicas
+    value = replicas.primary(loader)()
+    if value is not None:
+        cache.set(key, value, ttl)
+    return value
+
+
+def invalidate(*keys):
+    get_cache().delete(*keys)
+
+
+def stats():
+    cache = get_cache()
+    with _stats_lock:
+        namespaces = {ns: dict(c) for ns, c in _stats.items()}
+    return {
+        "backend": cache.name,
+        "size": cache.size(),
+        "hits": sum(c["hits"] for c in namespaces.values()),
+        "misses": sum(c["misses"] for c in namespaces.values()),
+        "namespaces": namespaces,
+    }
+
+
+# Claves usadas por crud
+def product_key(product_id):
+    return f"product:{product_id}"
+
+
+def category_key(category_id):
+    return f"category:{category_id}"
+
+
+def cart_view_key(user_id, version=None):
+    return f"cart_view:{user_id}" if version is None else f"cart_view:{user_id}:{version}"
+
+
+CATEGORIES_KEY = "categories"
+BRANDS_KEY = "brands"
@@ -0,0 +1,842 @@
+"""
+Carritos activos en un almacén por clave, con escritura diferida a la BD.
+
+Con CART_STORE=memory o redis, agregar/cambiar/quitar un ítem lee y escribe
+solo el carrito del usuario en el almacén (un dict en memoria o una clave de
+Redis con el carrito serializado); el producto sale de la caché de lecturas.
+La latencia del carrito no depende de la carga de la base.
+
+Escritura diferida (write-behind): cada cambio marca el carrito como sucio y
+un hilo por proceso, cada CART_FLUSH_INTERVAL segundos, lo persiste en
+carts/cart_items por lotes de CART_FLUSH_BATCH carritos. Por lote hacen
+falta unas pocas consultas IN y un commit, sin importar cuántos clics hubo.
+Un carrito que cambió mientras se guardaba sigue sucio (versión). Un solo
+flusher trabaja a la vez (candado del proceso o SET NX en Redis); un carrito
+que la BD rechaza queda en cuarentena sin frenar al resto del lote y se
+reintenta con su próximo cambio o con `flask flush-carts --retry-failed`.
+Las rutas nunca hacen flush: los listados desde la BD van hasta
+CART_FLUSH_INTERVAL segundos atrás.
+
+Recuperación ante caídas:
+  - memory: cada cambio se agrega a un diario (CART_JOURNAL_PATH, una línea
+    JSON con el carrito completo). Al arrancar se relee, el último estado
+    de cada usuario se guarda en la BD y el diario se compacta tras cada
+    flush. Sin diario, una caída pierde lo no guardado (como mucho
+    CART_FLUSH_INTERVAL segundos).
+  - redis: el almacén sobrevive al proceso (según la persistencia de Redis);
+    al arrancar se guardan los carritos que quedaron sucios.
+
+"memory" es por proceso: solo sirve con un único worker. Con varios, usar
+"redis". CART_STORE=db (por defecto) deja el camino anterior por crud.
+
+Con reservas de stock (STOCK_HOLD_MINUTES > 0) la reserva sigue siendo un
+UPDATE atómico en la BD (stock.set_hold); solo el carrito va al almacén.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Cart, CartItem, Product, User
+import cache
+import http_cache
+import stock
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCartBackend:
+    """Carritos en un dict del proceso, con diario opcional para recuperar tras una caída."""
+
+    name = "memory"
+
+    def __init__(self, journal_path=None, fsync=False):
+        self._carts = {}
+        self._items = {}   # id de ítem -> user_id
+        self._cart_ids = {}  # id de carrito -> user_id
+        self._dirty = set()
+        self._failed = set()  # carritos que no se pudieron guardar (en cuarentena)
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._user_locks = {}
+        self._journal_path = journal_path
+        self._fsync = fsync
+        self._journal = open(journal_path, "a", encoding="utf-8") if journal_path else None
+
+    @contextmanager
+    def lock(self, user_id):
+        with self._lock:
+            user_lock = self._user_locks.setdefault(user_id, threading.Lock())
+        with user_lock:
+            yield
+
+    def load(self, user_id):
+        with self._lock:
+            cart = self._carts.get(user_id)
+            return copy.deepcopy(cart) if cart else None
+
+    def _index(self, user_id, cart):
+        old = self._carts.get(user_id)
+        if old:
+            for item in old["items"].values():
+                self._items.pop(item["id"], None)
+        if cart:
+            self._cart_ids[cart["id"]] = user_id
+            for item in cart["items"].values():
+                self._items[item["id"]] = user_id
+
+    def save(self, user_id, cart, dirty=True):
+        with self._lock:
+            self._index(user_id, cart)
+            self._carts[user_id] = copy.deepcopy(cart)
+            if dirty:
+                self._dirty.add(user_id)
+                # Un cambio nuevo vuelve a intentar un carrito en cuarentena
+                self._failed.discard(user_id)
+                self._append(user_id, cart)
+
+    def forget(self, user_id):
+        with self._lock:
+            cart = self._carts.get(user_id)
+            self._index(user_id, None)
+            if cart:
+                self._cart_ids.pop(cart["id"], None)
+            self._carts.pop(user_id, None)
+            self._dirty.discard(user_id)
+            self._failed.discard(user_id)
+            self._append(user_id, None)
+
+    def user_of_item(self, item_id):
+        return self._items.get(item_id)
+
+    def user_of_cart(self, cart_id):
+        return self._cart_ids.get(cart_id)
+
+    def dirty(self, limit):
+        with self._lock:
+            return sorted(self._dirty)[:limit]
+
+    def clean(self, user_id, version):
+        with self._lock:
+            cart = self._carts.get(user_id)
+            if cart is None or cart["version"] == version:
+                self._dirty.discard(user_id)
+
+    def quarantine(self, user_id, version):
+        with self._lock:
+            cart = self._carts.get(user_id)
+            if cart is not None and cart["version"] == version:
+                self._dirty.discard(user_id)
+                self._failed.add(user_id)
+
+    def retry_failed(self):
+        with self._lock:
+            failed, self._failed = self._failed, set()
+            self._dirty |= failed
+            return len(failed)
+
+    @contextmanager
+    def flush_lock(self, wait=0):
+        acquired = self._flush_lock.acquire(timeout=wait) if wait else self._flush_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._flush_lock.release()
+
+    # --- Diario ---
+
+    def _append(self, user_id, cart):
+        if self._journal is None:
+            return
+        self._journal.write(json.dumps({"user_id": user_id, "cart": cart}) + "\n")
+        self._journal.flush()
+        if self._fsync:
+            os.fsync(self._journal.fileno())
+
+    def recover(self):
+        """Vuelve a cargar como sucio el último estado de cada carrito del diario."""
+        if not self._journal_path or not os.path.exists(self._journal_path):
+            return 0
+        last = {}
+        with open(self._journal_path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Última línea a medio escribir al caer el proceso
+                    continue
+                last[entry["user_id"]] = entry["cart"]
+        with self._lock:
+            for user_id, cart in last.items():
+                if cart is None:
+                    continue
+                self._index(user_id, cart)
+                self._carts[user_id] = cart
+                self._dirty.add(user_id)
+        return len(self._dirty)
+
+    def compact(self):
+        """Reescribe el diario solo con los carritos sin guardar (sucios o en cuarentena)."""
+        if self._journal is None:
+            return
+        with self._lock:
+            temporary = self._journal_path + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as journal:
+                for user_id in sorted(self._dirty | self._failed):
+                    journal.write(json.dumps({"user_id": user_id, "cart": self._carts[user_id]}) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+            self._journal.close()
+            os.replace(temporary, self._journal_path)
+            self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+
+class RedisCartBackend:
+    """
+    Carritos en Redis (compartidos entre workers). `client` es cualquier objeto
+    con la interfaz de redis-py (get, set con nx/px, delete, hset, hget, hdel,
+    hkeys); en pruebas sirve un doble en memoria.
+    """
+
+    name = "redis"
+    LOCK_MS = 5000
+    # Un lote de flush tarda mucho menos; el TTL solo cubre un worker que murió con el candado
+    FLUSH_LOCK_MS = 60000
+
+    def __init__(self, client, prefix="pcdos2:cart:"):
+        self.client = client
+        self.prefix = prefix
+        self.dirty_key = prefix + "dirty"
+        self.failed_key = prefix + "failed"
+
+    def _acquire(self, key, ttl_ms, wait):
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + wait
+        while not self.client.set(key, token, nx=True, px=ttl_ms):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.005)
+        return token
+
+    def _release(self, key, token):
+        if self._get(key) == token:
+            self.client.delete(key)
+
+    @contextmanager
+    def lock(self, user_id):
+        key = f"{self.prefix}lock:{user_id}"
+        token = self._acquire(key, self.LOCK_MS, self.LOCK_MS / 1000)
+        if token is None:
+            raise RuntimeError("Carrito ocupado, intenta de nuevo")
+        try:
+            yield
+        finally:
+            self._release(key, token)
+
+    @contextmanager
+    def flush_lock(self, wait=0):
+        """Un solo flusher a la vez entre todos los workers (SET NX)."""
+        key = self.prefix + "flushlock"
+        token = self._acquire(key, self.FLUSH_LOCK_MS, wait)
+        try:
+            yield token is not None
+        finally:
+            if token is not None:
+                self._release(key, token)
+
+    def _get(self, key):
+        value = self.client.get(key)
+        if value is None:
+            return None
+        return value.decode() if isinstance(value, bytes) else value
+
+    def load(self, user_id):
+        raw = self._get(f"{self.prefix}user:{user_id}")
+        return json.loads(raw) if raw else None
+
+    def save(self, user_id, cart, dirty=True):
+        old = self.load(user_id)
+        new_ids = {item["id"] for item in cart["items"].values()}
+        for item in (old or {}).get("items", {}).values():
+            if item["id"] not in new_ids:
+                self.client.delete(f"{self.prefix}item:{item['id']}")
+        for item_id in new_ids:
+            self.client.set(f"{self.prefix}item:{item_id}", user_id)
+        self.client.set(f"{self.prefix}id:{cart['id']}", user_id)
+        self.client.set(f"{self.prefix}user:{user_id}", json.dumps(cart))
+        if dirty:
+            self.client.hset(self.dirty_key, user_id, cart["version"])
+            self.client.hdel(self.failed_key, user_id)
+
+    def forget(self, user_id):
+        cart = self.load(user_id)
+        if cart:
+            keys = [f"{self.prefix}item:{item['id']}" for item in cart["items"].values()]
+            self.client.delete(f"{self.prefix}id:{cart['id']}", *keys)
+        self.client.delete(f"{self.prefix}user:{user_id}")
+        self.client.hdel(self.dirty_key, user_id)
+        self.client.hdel(self.failed_key, user_id)
+
+    def user_of_item(self, item_id):
+        return self._get(f"{self.prefix}item:{item_id}")
+
+    def user_of_cart(self, cart_id):
+        return self._get(f"{self.prefix}id:{cart_id}")
+
+    def dirty(self, limit):
+        keys = self.client.hkeys(self.dirty_key)
+        return sorted(k.decode() if isinstance(k, bytes) else k for k in keys)[:limit]
+
+    def clean(self, user_id, version):
+        # Bajo el candado del carrito: un cambio concurrente deja la versión nueva
+        with self.lock(user_id):
+            current = self.client.hget(self.dirty_key, user_id)
+            if current is not None and int(current) == version:
+                self.client.hdel(self.dirty_key, user_id)
+
+    def quarantine(self, user_id, version):
+        with self.lock(user_id):
+            current = self.client.hget(self.dirty_key, user_id)
+            if current is not None and int(current) == version:
+                self.client.hdel(self.dirty_key, user_id)
+                self.client.hset(self.failed_key, user_id, version)
+
+    def retry_failed(self):
+        failed = self.client.hkeys(self.failed_key)
+        for user_id in failed:
+            user_id = user_id.decode() if isinstance(user_id, bytes) else user_id
+            version = self.client.hget(self.failed_key, user_id)
+            self.client.hset(self.dirty_key, user_id, version)
+            self.client.hdel(self.failed_key, user_id)
+        return len(failed)
+
+    def recover(self):
+        return len(self.client.hkeys(self.dirty_key))
+
+    def compact(self):
+        pass
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def enabled():
+    return current_app.config.get("CART_STORE", "db") != "db"
+
+
+def _create_backend():
+    config = current_app.config
+    kind = config.get("CART_STORE", "db")
+    if kind == "memory":
+        return MemoryCartBackend(config.get("CART_JOURNAL_PATH"), config.get("CART_JOURNAL_FSYNC", False))
+    if kind == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CART_STORE=redis requiere el paquete 'redis'")
+        return RedisCartBackend(redis.Redis.from_url(config.get("CART_REDIS_URL")))
+    raise ValueError(f"CART_STORE desconocido: {kind}")
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """Reemplaza el almacén (p. ej. un RedisCartBackend con un cliente de pruebas)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+# --- Lectura y forma de los datos ---
+
+def _now_iso():
+    import crud
+    return crud.now_lima().replace(tzinfo=None).isoformat()
+
+
+def _load_from_db(user_id):
+    """Carrito del usuario desde la BD (una consulta para el carrito y otra para sus ítems)."""
+    row = Cart.query.filter_by(user_id=user_id).first()
+    if row is None:
+        return None
+    items = CartItem.query.filter_by(cart_id=row.id).all()
+    return {
+        "id": row.id,
+        "user_id": user_id,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+        "version": 0,
+        "items": {
+            item.product_id: {
+                "id": item.id,
+                "quantity": item.quantity,
+                "price": float(item.price) if item.price is not None else None,
+                "created_at": item.created_at.isoformat() if item.created_at else None,
+            }
+            for item in items
+        },
+    }
+
+
+def _get_or_load(backend, user_id):
+    cart = backend.load(user_id)
+    if cart is None:
+        cart = _load_from_db(user_id)
+        if cart is not None:
+            backend.save(user_id, cart, dirty=False)
+    return cart
+
+
+def _new_cart(user_id):
+    now = _now_iso()
+    return {"id": str(uuid.uuid4()), "user_id": user_id, "created_at": now, "updated_at": now, "version": 0, "items": {}}
+
+
+def get_cart(user_id):
+    """Carrito del usuario (lo crea si no tiene, como crud.get_or_create_cart_by_user)."""
+    backend = get_backend()
+    with backend.lock(user_id):
+        cart = _get_or_load(backend, user_id)
+        if cart is None:
+            cart = _new_cart(user_id)
+            cart["version"] = 1
+            backend.save(user_id, cart)
+    return cart
+
+
+def find_cart(cart_id):
+    user_id = get_backend().user_of_cart(cart_id)
+    if user_id is None:
+        row = Cart.query.with_entities(Cart.user_id).filter(Cart.id == cart_id).first()
+        if row is None or row.user_id is None:
+            return None
+        user_id = row.user_id
+    cart = _get_or_load(get_backend(), user_id)
+    return cart if cart and cart["id"] == cart_id else None
+
+
+def cart_dict(cart):
+    """Misma forma que Cart.to_dict."""
+    return {key: cart[key] for key in ("id", "user_id", "created_at", "updated_at")}
+
+
+def item_dict(cart, product_id, product=None):
+    """Misma forma que CartItem.to_dict; el producto sale de la caché de lecturas."""
+    import crud
+    item = cart["items"][product_id]
+    if product is None:
+        product = crud.get_product_data(product_id)
+    return {
+        "id": item["id"],
+        "cart_id": cart["id"],
+        "product_id": product_id,
+        "quantity": item["quantity"],
+        "price": item["price"],
+        "created_at": item["created_at"],
+        "name": product["name"] if product else None,
+        "image_url": product["image_url"] if product else None,
+        "stock": product["stock"] if product else None,
+    }
+
+
+def item_dicts(cart):
+    return [item_dict(cart, product_id) for product_id in cart["items"]]
+
+
+def cart_view(user_id):
+    """
+    Como crud.get_cart_view, desde el almacén. Se cachea por versión del
+    carrito, que sale del almacén: aun con la caché local de cada worker, un
+    cambio hecho en otro worker da otra clave y nunca se sirve la vista vieja.
+    """
+    import crud
+    cart = get_cart(user_id)
+    version = http_cache.make_etag(cart["id"], cart["version"], cart["updated_at"])
+
+    def load():
+        # Solo las columnas del producto que se muestran, en una consulta
+        products = {
+            row.id: row for row in
+            db.session.query(Product.id, Product.name, Product.image_url, Product.stock)
+            .filter(Product.id.in_(list(cart["items"])))
+        } if cart["items"] else {}
+        items = []
+        for product_id, item in sorted(cart["items"].items(), key=lambda entry: entry[1]["created_at"] or ""):
+            product = products.get(product_id)
+            # {} (producto borrado) deja name/image_url/stock en None sin ir a la caché
+            snippet = {"name": product.name, "image_url": product.image_url, "stock": product.stock} if product else {}
+            items.append(item_dict(cart, product_id, snippet))
+        return crud.build_cart_view(cart_dict(cart), items, version)
+
+    ttl = current_app.config.get("CART_VIEW_TTL", 30)
+    return cache.get_or_load(cache.cart_view_key(user_id, version), load, ttl)
+
+
+def _locate_item(item_id):
+    """(user_id, product_id) del ítem, o (None, None)."""
+    backend = get_backend()
+    user_id = backend.user_of_item(item_id)
+    if user_id is None:
+        row = (
+            db.session.query(Cart.user_id)
+            .join(CartItem, CartItem.cart_id == Cart.id)
+            .filter(CartItem.id == item_id)
+            .first()
+        )
+        if row is None or row.user_id is None:
+            return None, None
+        user_id = row.user_id
+    cart = _get_or_load(backend, user_id)
+    for product_id, item in (cart or {}).get("items", {}).items():
+        if item["id"] == item_id:
+            return user_id, product_id
+    return None, None
+
+
+def get_item(item_id):
+    user_id, product_id = _locate_item(item_id)
+    if user_id is None:
+        return None
+    return item_dict(get_backend().load(user_id), product_id)
+
+
+# --- Cambios ---
+
+def _hold(user_id, quantities):
+    """Con reservas, el stock se aparta en la BD como en crud (atómico)."""
+    import crud
+    crud.hold_cart_quantities(user_id, quantities)
+    db.session.commit()
+    crud._on_stock_changed(quantities)
+
+
+def _write(backend, user_id, cart):
+    cart["version"] += 1
+    cart["updated_at"] = _now_iso()
+    backend.save(user_id, cart)
+
+
+def add(user_id, product_id, quantity):
+    """Como crud.add_product_to_cart; devuelve el ítem como dict."""
+    import crud
+    quantity = int(quantity)
+    # La fila, no la caché: el precio y el stock que se validan tienen que ser los actuales
+    product = crud.get_product_for_cart(product_id)
+    if not product:
+        raise ValueError("Producto no encontrado")
+    product = product._asdict()
+    backend = get_backend()
+    with backend.lock(user_id):
+        cart = _get_or_load(backend, user_id) or _new_cart(user_id)
+        item = cart["items"].get(product_id)
+        new_quantity = quantity if not item else item["quantity"] + quantity
+        if stock.hold_minutes():
+            _hold(user_id, {product_id: new_quantity})
+        elif new_quantity > product["stock"]:
+            raise ValueError(f"Sólo quedan {product['stock']} unidades disponibles")
+        price_with_igv = float(product["price"]) * crud.IGV
+        if item:
+            item["quantity"] = new_quantity
+            item["price"] = price_with_igv
+        else:
+            cart["items"][product_id] = {
+                "id": str(uuid.uuid4()),
+                "quantity": quantity,
+                "price": price_with_igv,
+                "created_at": _now_iso(),
+            }
+        _write(backend, user_id, cart)
+    return item_dict(cart, product_id, product)
+
+
+def update_item(item_id, updates):
+    """Como crud.update_cart_item (quantity y/o price); None si no existe."""
+    user_id, product_id = _locate_item(item_id)
+    if user_id is None:
+        return None
+    backend = get_backend()
+    with backend.lock(user_id):
+        cart = backend.load(user_id)
+        item = cart["items"].get(product_id) if cart else None
+        if item is None or item["id"] != item_id:
+            return None
+        if 'quantity' in updates and stock.hold_minutes():
+            _hold(user_id, {product_id: int(updates['quantity'])})
+        if 'quantity' in updates:
+            item["quantity"] = int(updates['quantity'])
+        if 'price' in updates:
+            item["price"] = float(updates['price'])
+        _write(backend, user_id, cart)
+    return item_dict(cart, product_id)
+
+
+def remove_item(item_id):
+    user_id, product_id = _locate_item(item_id)
+    if user_id is None:
+        return False
+    backend = get_backend()
+    with backend.lock(user_id):
+        cart = backend.load(user_id)
+        if not cart or product_id not in cart["items"]:
+            return False
+        if stock.hold_minutes():
+            _hold(user_id, {product_id: 0})
+        del cart["items"][product_id]
+        _write(backend, user_id, cart)
+    return True
+
+
+def apply(user_id, operations):
+    """Como crud.apply_cart_operations (todas o ninguna); devuelve el carrito."""
+    import crud
+    backend = get_backend()
+    with backend.lock(user_id):
+        loaded = _get_or_load(backend, user_id)
+        cart = loaded or _new_cart(user_id)
+        current = {product_id: item["quantity"] for product_id, item in cart["items"].items()}
+        changed = crud.plan_cart_operations(current, operations)
+        products = crud.check_cart_stock(changed)
+        if changed and stock.hold_minutes():
+            _hold(user_id, changed)
+        now = _now_iso()
+        for product_id, quantity in changed.items():
+            if quantity <= 0:
+                cart["items"].pop(product_id, None)
+                continue
+            price_with_igv = float(products[product_id].price) * crud.IGV
+            item = cart["items"].get(product_id)
+            if item:
+                item["quantity"] = quantity
+                item["price"] = price_with_igv
+            else:
+                cart["items"][product_id] = {
+                    "id": str(uuid.uuid4()), "quantity": quantity, "price": price_with_igv, "created_at": now,
+                }
+        if changed or loaded is None:
+            _write(backend, user_id, cart)
+    return cart
+
+
+# Cambios de carrito completo (rutas de /cart). Esperan a que termine un flush
+# en curso, así el flusher no vuelve a insertar lo que se acaba de borrar.
+FLUSH_LOCK_WAIT = 5
+
+
+def delete_cart(cart_id):
+    """Borra el carrito del almacén y de la BD; False si no existe."""
+    import crud
+    backend = get_backend()
+    cart = find_cart(cart_id)
+    with backend.flush_lock(FLUSH_LOCK_WAIT) as acquired:
+        if not acquired:
+            raise RuntimeError("Carritos ocupados, intenta de nuevo")
+        if cart:
+            with backend.lock(cart["user_id"]):
+                backend.forget(cart["user_id"])
+        deleted = crud.delete_cart(cart_id)
+    return cart is not None or deleted is not None
+
+
+def move_cart(cart_id, user_id):
+    """Pasa el carrito a otro usuario (PUT /cart/<id>); None si no existe."""
+    backend = get_backend()
+    cart = find_cart(cart_id)
+    if cart is None:
+        return None
+    if cart["user_id"] == user_id:
+        return cart
+    with backend.flush_lock(FLUSH_LOCK_WAIT) as acquired:
+        if not acquired:
+            raise RuntimeError("Carritos ocupados, intenta de nuevo")
+        if _get_or_load(backend, user_id):
+            raise ValueError("El usuario ya tiene un carrito")
+        previous_user_id = cart["user_id"]
+        with backend.lock(previous_user_id):
+            cart = backend.load(previous_user_id)
+            backend.forget(previous_user_id)
+        with backend.lock(user_id):
+            cart["user_id"] = user_id
+            _write(backend, user_id, cart)
+    return cart
+
+
+def forget(user_id):
+    """Saca el carrito del almacén (usuario o carrito borrado en la BD)."""
+    if _backend is not None and user_id:
+        _backend.forget(user_id)
+
+
+# --- Escritura diferida ---
+
+def _write_carts(carts, existing_carts, existing_items, products):
+    """Sentencias en lote para guardar `carts` (sin commit)."""
+    new_carts, touched_carts, new_items, changed_items, keep = [], [], [], [], set()
+    for user_id, cart in carts.items():
+        row = {"id": cart["id"], "user_id": user_id, "updated_at": _parse(cart["updated_at"])}
+        if cart["id"] in existing_carts:
+            touched_carts.append(row)
+        else:
+            new_carts.append({**row, "created_at": _parse(cart["created_at"])})
+        for product_id, item in cart["items"].items():
+            if product_id not in products:
+                continue
+            values = {"id": item["id"], "quantity": item["quantity"], "price": item["price"]}
+            keep.add(item["id"])
+            if item["id"] in existing_items:
+                changed_items.append(values)
+            else:
+                new_items.append({
+                    **values, "cart_id": cart["id"], "product_id": product_id,
+                    "created_at": _parse(item["created_at"]),
+                })
+    cart_ids = {cart["id"] for cart in carts.values()}
+    removed = [item_id for item_id, cart_id in existing_items.items() if cart_id in cart_ids and item_id not in keep]
+
+    if new_carts:
+        db.session.execute(insert(Cart), new_carts)
+    if touched_carts:
+        db.session.execute(update(Cart), touched_carts)
+    if removed:
+        db.session.execute(
+            delete(CartItem).where(CartItem.id.in_(removed)).execution_options(synchronize_session=False)
+        )
+    if changed_items:
+        db.session.execute(update(CartItem), changed_items)
+    if new_items:
+        db.session.execute(insert(CartItem), new_items)
+
+
+def _flush_batch(backend, limit):
+    user_ids = backend.dirty(limit)
+    carts = {user_id: backend.load(user_id) for user_id in user_ids}
+    carts = {user_id: cart for user_id, cart in carts.items() if cart}
+    if not carts:
+        return 0
+
+    # Usuarios o productos borrados mientras el carrito esperaba
+    users = {row.id for row in db.session.query(User.id).filter(User.id.in_(list(carts)))}
+    product_ids = {product_id for cart in carts.values() for product_id in cart["items"]}
+    products = {
+        row.id for row in db.session.query(Product.id).filter(Product.id.in_(list(product_ids)))
+    } if product_ids else set()
+    for user_id in list(carts):
+        if user_id not in users:
+            backend.forget(user_id)
+            del carts[user_id]
+
+    cart_ids = [cart["id"] for cart in carts.values()]
+    existing_carts = {row.id for row in db.session.query(Cart.id).filter(Cart.id.in_(cart_ids))}
+    existing_items = {
+        row.id: row.cart_id
+        for row in db.session.query(CartItem.id, CartItem.cart_id).filter(CartItem.cart_id.in_(cart_ids))
+    } if cart_ids else {}
+
+    # Todo el lote en un savepoint; si falla, carrito por carrito para que uno
+    # malo no frene a los demás: ese queda en cuarentena hasta su próximo cambio
+    failed = set()
+    try:
+        with db.session.begin_nested():
+            _write_carts(carts, existing_carts, existing_items, products)
+    except SQLAlchemyError:
+        for user_id, cart in carts.items():
+            try:
+                with db.session.begin_nested():
+                    _write_carts({user_id: cart}, existing_carts, existing_items, products)
+            except SQLAlchemyError:
+                logger.exception("No se pudo guardar el carrito %s; queda en cuarentena", cart["id"])
+                failed.add(user_id)
+    db.session.commit()
+
+    for user_id, cart in carts.items():
+        if user_id in failed:
+            backend.quarantine(user_id, cart["version"])
+        else:
+            backend.clean(user_id, cart["version"])
+    return len(user_ids)
+
+
+def flush(limit=None, wait=0):
+    """
+    Guarda en la BD hasta `limit` carritos sucios; devuelve cuántos se
+    procesaron. Si otro flusher (de este u otro worker) tiene el candado,
+    espera hasta `wait` segundos y si no, no hace nada.
+    """
+    backend = get_backend()
+    limit = limit or current_app.config.get("CART_FLUSH_BATCH", 200)
+    with backend.flush_lock(wait) as acquired:
+        if not acquired:
+            return 0
+        return _flush_batch(backend, limit)
+
+
+def flush_all(wait=0):
+    """
+    Vacía lo pendiente en a lo más CART_FLUSH_MAX_PASSES lotes (un carrito
+    que cambia sin parar no lo alarga) y compacta el diario.
+    """
+    total = 0
+    for _ in range(current_app.config.get("CART_FLUSH_MAX_PASSES", 10)):
+        flushed = flush(wait=wait)
+        total += flushed
+        if not flushed:
+            break
+    get_backend().compact()
+    return total
+
+
+def retry_failed():
+    """Vuelve a marcar como sucios los carritos en cuarentena."""
+    return get_backend().retry_failed()
+
+
+def _parse(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _flush_loop(app):
+    interval = app.config.get("CART_FLUSH_INTERVAL", 2)
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                flush_all()
+            except Exception:
+                db.session.rollback()
+                logger.exception("No se pudieron guardar los carritos; se reintenta en %ss", interval)
+
+
+def init_app(app):
+    """Recupera lo pendiente de una caída y arranca el hilo de escritura diferida."""
+    if app.config.get("CART_STORE", "db") == "db":
+        return
+    with app.app_context():
+        pending = get_backend().recover()
+        if pending:
+            logger.warning("Recuperando %s carritos sin guardar", pending)
+            flush_all()
+    threading.Thread(target=_flush_loop, args=(app,), name="cart-flush", daemon=True).start()
+
+    def _flush_on_exit():
+        with app.app_context():
+            try:
+                flush_all(wait=10)
+            except Exception:
+                logger.exception("No se pudieron guardar los carritos al salir")
+    atexit.register(_flush_on_exit)
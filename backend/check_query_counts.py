@@ -0,0 +1,99 @@
+"""
+Regresión de cantidad de consultas (N+1) por endpoint.
+
+Carga la app sobre un SQLite en memoria, la llena con dos tamaños de datos
+y compara cuántas consultas SQL hace cada endpoint. Si algún endpoint hace
+más consultas con más filas, termina con código 1. La misma comparación
+corre en las pruebas (tests/test_query_counts.py); este script imprime la tabla.
+
+Uso: python check_query_counts.py
+"""
+import os
+import sys
+import uuid
+
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["CACHE_BACKEND"] = "none"
+os.environ.setdefault("JWT_SECRET_KEY", "check-query-counts-secret-key-0123456789")
+
+from flask_jwt_extended import create_access_token
+from app import app
+from database import db
+from models import User, Invoice
+from query_counter import count_queries
+import crud
+
+SMALL, LARGE = 3, 12
+
+ENDPOINTS = [
+    "/products/",
+    "/products/?limit=50&fields=id,name,price",
+    "/products/brands",
+    "/categories/",
+    "/cart_items/",
+    "/orders/",
+    "/order_items/",
+    "/invoices/",
+    "/invoices/mine",
+]
+
+
+def seed(size):
+    db.drop_all()
+    db.create_all()
+    user = User(id=str(uuid.uuid4()), email="cliente@pcdos2.pe", password_hash="x", full_name="Cliente")
+    db.session.add(user)
+    db.session.commit()
+    category = crud.create_category({"name": "Tarjetas de video"})
+    products = [
+        crud.create_product({
+            "product_code": f"GPU-{i}", "name": f"GPU {i}", "price": 1000 + i, "stock": 100,
+            "category_id": category.id, "brand": f"Marca {i % 3}",
+        })
+        for i in range(size)
+    ]
+    for product in products:
+        crud.add_product_to_cart(user.id, product.id, 1)
+    for product in products:
+        order = crud.create_order({
+            "user_id": user.id,
+            "payment_method": "tarjeta",
+            "items": [{"product_id": product.id, "quantity": 1, "price": 1180.0}],
+        })
+        db.session.add(Invoice(
+            id=str(uuid.uuid4()), order_id=order.id, invoice_number=f"INV-{order.id[:8]}",
+            customer_name="Cliente", customer_dni="12345678", pdf_data=b"%PDF-1.4",
+        ))
+    db.session.commit()
+    return create_access_token(identity=user.id, additional_claims={"role": "admin"})
+
+
+def measure(size):
+    with app.app_context():
+        token = seed(size)
+        client = app.test_client()
+        headers = {"Authorization": f"Bearer {token}"}
+        counts = {}
+        for url in ENDPOINTS:
+            db.session.expunge_all()
+            with count_queries(db.engine) as log:
+                response = client.get(url, headers=headers)
+            if response.status_code != 200:
+                raise SystemExit(f"{url} respondió {response.status_code}")
+            counts[url] = log.count
+        return counts
+
+
+def main():
+    small, large = measure(SMALL), measure(LARGE)
+    failed = False
+    print(f"{'endpoint':45} {SMALL:>4} {LARGE:>4}")
+    for url in ENDPOINTS:
+        mark = "" if large[url] <= small[url] else "  <-- crece con el resultado"
+        failed = failed or bool(mark)
+        print(f"{url:45} {small[url]:>4} {large[url]:>4}{mark}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
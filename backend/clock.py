@@ -0,0 +1,15 @@
+"""
+Hora de Lima. Las fechas se guardan sin zona en hora de Lima (ver
+http_cache.to_http_datetime), y los updated_at que sirven de versión para los
+ETag se marcan todos con este mismo reloj: mezclarlo con el de la base (que
+puede estar en UTC) deja ediciones "más antiguas" que el MAX(updated_at)
+vigente y el ETag no cambia.
+"""
+from datetime import datetime
+import pytz
+
+LIMA = pytz.timezone("America/Lima")
+
+
+def now_lima():
+    return datetime.now(LIMA)
@@ -1,5 +1,146 @@
 import os
+from replicas import bind_keys
+
+
+def _engine_options(url):
+    """
+    Pool de conexiones del engine. Con MySQL (QueuePool) hasta
+    DB_POOL_SIZE + DB_MAX_OVERFLOW conexiones por proceso; una petición que
+    no consigue conexión espera DB_POOL_TIMEOUT segundos y falla. Con SQLite
+    se deja el pool por defecto de SQLAlchemy.
+    """
+    if not url or url.startswith("sqlite"):
+        return {}
+    from pool_metrics import TimedQueuePool
+    return {
+        "poolclass": TimedQueuePool,  # mide la espera de cada checkout (ver pool_metrics)
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        # Menor que wait_timeout de MySQL (8 h) y que los cortes de proxies/firewalls
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "False"),
+        "pool_use_lifo": os.getenv("DB_POOL_LIFO", "0") in ("1", "true", "True"),
+        "connect_args": {
+            "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "10")),
+        },
+    }
+
 
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # Réplicas de lectura (URLs separadas por comas; ver replicas.py). Una
+    # réplica con más de REPLICA_MAX_LAG segundos de retraso sale de la
+    # rotación; tras escribir, el mismo cliente lee del primario durante
+    # REPLICA_STICKY_SECONDS (0 = sin esa regla). Esa marca vive en la caché
+    # (CACHE_BACKEND): con más de un worker hace falta "redis"; con "local" la
+    # siguiente petición del cliente puede caer en otro worker y leer de una
+    # réplica atrasada lo que acaba de escribir.
+    DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+    SQLALCHEMY_BINDS = bind_keys(DATABASE_REPLICA_URLS)
+    REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+    REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+    REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
+    # Índice de búsqueda de productos: "memory" (por proceso) o "sqlite" (FTS5).
+    # Con "sqlite" y una ruta de archivo, varios workers comparten el mismo índice.
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "memory")
+    SEARCH_SQLITE_PATH = os.getenv("SEARCH_SQLITE_PATH", ":memory:")
+    # Resultados como mucho por búsqueda (los más relevantes): un prefijo corto
+    # no arma un IN con todo el catálogo. 0 = sin tope
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "1000"))
+    # Índices en memoria (búsqueda y filtros de /products/facets): cada worker
+    # compara la marca de products antes de usarlos, como mucho cada
+    # INDEX_SYNC_INTERVAL segundos (0 = siempre), y trae los cambios de los
+    # otros workers; cada INDEX_REBUILD_INTERVAL segundos se reconstruyen
+    # enteros (ver index_sync.py)
+    INDEX_SYNC_INTERVAL = float(os.getenv("INDEX_SYNC_INTERVAL", "0"))
+    INDEX_REBUILD_INTERVAL = float(os.getenv("INDEX_REBUILD_INTERVAL", "600"))
+
+    # Búsqueda en GET /orders/: "prefix" (LIKE 'texto%' sobre índices normales) o
+    # "ngram" (solo MySQL: índices FULLTEXT con parser ngram, migración 009; busca
+    # también en medio del número de orden, del correo o del nombre).
+    ORDER_SEARCH = os.getenv("ORDER_SEARCH", "prefix")
+
+    # Contraseñas: método y factor de trabajo de werkzeug ("scrypt:32768:8:1",
+    # "pbkdf2:sha256:600000", ...); los hashes con otro se renuevan en el login.
+    # Se calculan en un pool de PASSWORD_WORKERS procesos (0 = en línea) con
+    # como mucho PASSWORD_QUEUE_SIZE en espera; si no hay lugar, 503.
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+    PASSWORD_QUEUE_SIZE = int(os.getenv("PASSWORD_QUEUE_SIZE", "16"))
+    PASSWORD_TIMEOUT = float(os.getenv("PASSWORD_TIMEOUT", "5"))
+    # Intentos por minuto y por IP (0 = sin límite)
+    LOGIN_RATE_PER_MINUTE = int(os.getenv("LOGIN_RATE_PER_MINUTE", "10"))
+    REGISTER_RATE_PER_MINUTE = int(os.getenv("REGISTER_RATE_PER_MINUTE", "5"))
+
+    # Tokens JWT ya verificados que se guardan por proceso (claims hasta su exp,
+    # como mucho AUTH_TOKEN_CACHE_TTL segundos). AUTH_TOKEN_CACHE_SIZE=0 la desactiva.
+    AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    AUTH_TOKEN_CACHE_TTL = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+
+    # /metrics (Prometheus): sin METRICS_TOKEN queda abierto (restringirlo en el
+    # proxy). Las peticiones más lentas que SLOW_REQUEST_MS (0 = nunca) se
+    # escriben en el logger "slow_requests" con sus consultas más lentas.
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "500"))
+
+    # Caché de lecturas de productos/categorías/marcas: "local", "redis" o "none".
+    # "redis" requiere el paquete redis y se comparte entre workers.
+    # Con "local" cada worker tiene su copia y una invalidación solo llega al
+    # worker que hizo el cambio: los demás pueden servir el producto anterior
+    # (GET /products/<id>, nombre y stock que muestra el carrito) hasta
+    # CACHE_TTL segundos; el precio y el stock que valida el carrito se leen
+    # siempre de la fila (crud.get_product_for_cart). Con más
+    # de un worker usar "redis" (o un CACHE_TTL corto). Los índices en
+    # memoria de búsqueda y filtros no dependen de esto: se sincronizan con la
+    # BD (INDEX_SYNC_INTERVAL).
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # Filas por contador del panel (admin_stats.py): cada transacción suma en una
+    # al azar, así los checkouts concurrentes no hacen fila tras el mismo bloqueo
+    ADMIN_STATS_SHARDS = int(os.getenv("ADMIN_STATS_SHARDS", "16"))
+
+    # Minutos que el carrito aparta stock al agregar productos (0 = sin reservas,
+    # el stock solo se descuenta al crear la orden)
+    STOCK_HOLD_MINUTES = int(os.getenv("STOCK_HOLD_MINUTES", "0"))
+
+    # Carritos activos: "db" (cada clic va a carts/cart_items), "memory" (dict
+    # del proceso; solo con un worker) o "redis" (compartido, requiere redis).
+    # Con memory/redis los cambios se guardan en la BD cada CART_FLUSH_INTERVAL
+    # segundos, CART_FLUSH_BATCH carritos por commit. CART_JOURNAL_PATH (solo
+    # memory) es el diario para no perder carritos si el proceso cae.
+    CART_STORE = os.getenv("CART_STORE", "db")
+    CART_REDIS_URL = os.getenv("CART_REDIS_URL", os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+    CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "2"))
+    CART_FLUSH_BATCH = int(os.getenv("CART_FLUSH_BATCH", "200"))
+    # Lotes por pasada del flusher; lo que quede sigue en la próxima
+    CART_FLUSH_MAX_PASSES = int(os.getenv("CART_FLUSH_MAX_PASSES", "10"))
+    CART_JOURNAL_PATH = os.getenv("CART_JOURNAL_PATH") or None
+    CART_JOURNAL_FSYNC = os.getenv("CART_JOURNAL_FSYNC", "0") in ("1", "true", "True")
+    # GET /cart/user/<id>/full se cachea por versión del carrito; como los datos
+    # del producto (stock, nombre) no invalidan la vista, viven a lo más CART_VIEW_TTL s
+    CART_VIEW_TTL = int(os.getenv("CART_VIEW_TTL", "30"))
+
+    # Boletas: el PDF se genera en un pool de procesos fuera de la petición.
+    # INVOICE_ASYNC=0 lo genera en línea (útil en desarrollo).
+    INVOICE_ASYNC = os.getenv("INVOICE_ASYNC", "1") not in ("0", "false", "False")
+    INVOICE_WORKERS = int(os.getenv("INVOICE_WORKERS", "2"))
+
+    # Almacén de PDFs de boletas: "fs" (carpeta local) o "s3" (requiere boto3).
+    # Con nginx, BLOB_ACCEL_REDIRECT_PREFIX apunta a una location internal sobre
+    # BLOB_STORE_PATH y las descargas salen por X-Accel-Redirect.
+    BLOB_STORE = os.getenv("BLOB_STORE", "fs")
+    BLOB_STORE_PATH = os.getenv(
+        "BLOB_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "storage", "invoices")
+    )
+    BLOB_ACCEL_REDIRECT_PREFIX = os.getenv("BLOB_ACCEL_REDIRECT_PREFIX")
+    BLOB_S3_BUCKET = os.getenv("BLOB_S3_BUCKET")
+    BLOB_S3_PREFIX = os.getenv("BLOB_S3_PREFIX", "invoices/")
+    BLOB_S3_ENDPOINT_URL = os.getenv("BLOB_S3_ENDPOINT_URL")
@@ -1,15 +1,28 @@
 from models import db, User, Category, Product, Cart, CartItem, Order, OrderItem, Invoice
-from datetime import datetime
-from werkzeug.security import generate_password_hash
-from sqlalchemy import or_
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, insert, func
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, load_only, defer
 import uuid
 import random
 import string
-import pytz
-
-# Función helper para la hora de Lima
-def now_lima():
-    return datetime.now(pytz.timezone('America/Lima'))
+import search_index
+import facet_index
+import cache
+import stock
+import blob_store
+from pagination import keyset_paginate
+import admin_stats
+import sales_analytics
+import replicas
+import passwords
+import cart_store
+import http_cache
+
+# Hora de Lima (en clock.py para que models y stock la usen sin importar crud)
+from clock import now_lima
 
 # ------------------------- USERS -------------------------
 def get_all_users():
@@ -26,12 +39,14 @@ def create_user(data):
     user = User(
         id=str(uuid.uuid4()),
         email=data.get("email"),
-        password_hash=generate_password_hash(password),
+        # En el pool de passwords.py; lanza PasswordBusy si está saturado
+        password_hash=passwords.hash_password(password),
         full_name=data.get("full_name"),
         role=data.get("role", "customer"),
         created_at=now_lima(),
     )
     db.session.add(user)
+    admin_stats.user_added()
     db.session.commit()
     return user
 
@@ -48,8 +63,12 @@ def update_user(user_id, data):
 def delete_user(user_id):
     user = get_user_by_id(user_id)
     if user:
+        admin_stats.user_removed(user_id)
+        sales_analytics.mark_user_orders_dirty(user_id)
         db.session.delete(user)
         db.session.commit()
+        cart_store.forget(user_id)
+        _on_cart_changed(user_id)
     return user
 
 # --------------------- CATEGORIES ------------------------
@@ -59,6 +78,19 @@ def get_all_categories():
 def get_category_by_id(category_id):
     return Category.query.get(category_id)
 
+# Lecturas cacheadas (dicts listos para jsonify); se invalidan en cada escritura
+def get_categories_data():
+    return cache.get_or_load(cache.CATEGORIES_KEY, lambda: [c.to_dict() for c in get_all_categories()])
+
+def get_category_data(category_id):
+    def load():
+        category = get_category_by_id(category_id)
+        return category.to_dict() if category else None
+    return cache.get_or_load(cache.category_key(category_id), load)
+
+def _on_category_changed(category_id):
+    cache.invalidate(cache.CATEGORIES_KEY, cache.category_key(category_id))
+
 def create_category(data):
     cat = Category(
         id=data.get("id", str(uuid.uuid4())),
@@ -70,6 +102,7 @@ def create_category(data):
     )
     db.session.add(cat)
     db.session.commit()
+    _on_category_changed(cat.id)
     return cat
 
 def update_category(category_id, data):
@@ -78,24 +111,70 @@ def update_category(category_id, data):
         for key in ['name', 'description', 'is_active', 'sort_order']:
             if key in data:
                 setattr(category, key, data[key])
-        category.updated_at = now_lima()
         db.session.commit()
+        _on_category_changed(category_id)
     return category
 
 def delete_category(category_id):
     category = get_category_by_id(category_id)
     if category:
+        # El cascade borra también sus productos
+        product_ids = [p.id for p in category.products]
+        admin_stats.products_removed(category.products)
         db.session.delete(category)
         db.session.commit()
+        _on_category_changed(category_id)
+        for product_id in product_ids:
+            _on_product_deleted(product_id)
     return category
 
 # ---------------------- PRODUCTS -------------------------
+# Mantienen al día los índices derivados de productos tras cada commit
+def _on_product_saved(product):
+    cache.invalidate(cache.product_key(product.id), cache.BRANDS_KEY)
+    search_index.index_product(product)
+    facet_index.index_product(product)
+
+def _on_product_deleted(product_id):
+    cache.invalidate(cache.product_key(product_id), cache.BRANDS_KEY)
+    search_index.remove_product(product_id)
+    facet_index.remove_product(product_id)
+
+# Tras mover stock solo cambian el producto cacheado y los filtros, no el texto indexado
+def _on_stock_changed(product_ids):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    cache.invalidate(*[cache.product_key(pid) for pid in product_ids])
+    for product in Product.query.filter(Product.id.in_(product_ids)).all():
+        facet_index.index_product(product)
+
+def release_expired_holds():
+    """Devuelve al stock las reservas de carrito vencidas (job periódico)."""
+    product_ids = stock.release_expired_holds()
+    db.session.commit()
+    _on_stock_changed(product_ids)
+    return product_ids
+
 def get_all_products():
     return Product.query.all()
 
 def get_product_by_id(product_id):
     return Product.query.get(product_id)
 
+# Lectura cacheada para vistas y validaciones; para modificar usar get_product_by_id
+def get_product_data(product_id):
+    def load():
+        product = get_product_by_id(product_id)
+        return product.to_dict() if product else None
+    return cache.get_or_load(cache.product_key(product_id), load)
+
+def get_brands():
+    def load():
+        brands = Product.query.with_entities(Product.brand).filter(Product.is_active == True).distinct().all()
+        return [b[0] for b in brands if b[0]]
+    return cache.get_or_load(cache.BRANDS_KEY, load)
+
 def create_product(data):
     product = Product(
         id=data.get("id", str(uuid.uuid4())),
@@ -104,7 +183,7 @@ def create_product(data):
         description=data.get("description"),
         long_description=data.get("long_description"),
         price=data.get("price"),
-        stock=data.get("stock"),
+        stock=data.get("stock") or 0,
         min_stock=data.get("min_stock", 5),
         category_id=data.get("category_id"),
         brand=data.get("brand"),
@@ -120,31 +199,41 @@ def create_product(data):
         created_at=now_lima(),
     )
     db.session.add(product)
+    admin_stats.product_added(product)
     db.session.commit()
+    _on_product_saved(product)
     return product
 
 def update_product(product_id, data):
     product = get_product_by_id(product_id)
     if product:
+        was_low = admin_stats.is_low(product.stock, product.min_stock)
         for key in [
             'product_code', 'name', 'description', 'long_description', 'price', 'stock', 'min_stock',
             'category_id', 'brand', 'model', 'image_url', 'image_urls', 'specifications', 'features',
             'is_active', 'weight', 'dimensions', 'warranty_months'
         ]:
             if key in data:
-                setattr(product, key, data[key])
-        product.updated_at = now_lima()
+                # stock es NOT NULL: vacío es 0, como en el alta
+                setattr(product, key, (data[key] or 0) if key == 'stock' else data[key])
+        admin_stats.product_changed(was_low, product)
         db.session.commit()
+        _on_product_saved(product)
     return product
 
 def delete_product(product_id):
     product = get_product_by_id(product_id)
     if product:
+        admin_stats.products_removed([product])
         db.session.delete(product)
         db.session.commit()
+        _on_product_deleted(product_id)
     return product
 
 # ----------------------- CARTS ---------------------------
+# Los precios del carrito se guardan con IGV (18 %)
+IGV = 1.18
+
 def get_all_carts():
     return Cart.query.all()
 
@@ -159,21 +248,27 @@ def create_cart(data):
     )
     db.session.add(cart)
     db.session.commit()
+    _on_cart_changed(cart.user_id)
     return cart
 
 def update_cart(cart_id, updates):
     cart = get_cart_by_id(cart_id)
     if cart and 'user_id' in updates:
+        previous_user_id = cart.user_id
         cart.user_id = updates['user_id']
         cart.updated_at = now_lima()
         db.session.commit()
+        _on_cart_changed(previous_user_id, cart.user_id)
     return cart
 
 def delete_cart(cart_id):
     cart = get_cart_by_id(cart_id)
     if cart:
+        user_id = cart.user_id
         db.session.delete(cart)
         db.session.commit()
+        cart_store.forget(user_id)
+        _on_cart_changed(user_id)
     return cart
 
 def get_cart_by_user_id(user_id):
@@ -185,14 +280,107 @@ def get_or_create_cart_by_user(user_id):
         cart = Cart(id=str(uuid.uuid4()), user_id=user_id, created_at=now_lima())
         db.session.add(cart)
         db.session.commit()
+        _on_cart_changed(user_id)
     return cart
 
+# Vista completa del carrito (GET /cart/user/<id>/full), cacheada por versión
+def _on_cart_changed(*user_ids):
+    cache.invalidate(*[cache.cart_view_key(uid) for uid in user_ids if uid])
+
+def cart_totals(items):
+    """Los precios del carrito ya incluyen IGV: se desglosa, no se vuelve a sumar."""
+    total = sum((item["price"] * item["quantity"] for item in items if item["price"] is not None), 0.0)
+    igv = total - total / IGV
+    return {
+        "item_count": sum(item["quantity"] for item in items),
+        "subtotal": round(total - igv, 2),
+        "igv": round(igv, 2),
+        "total": round(total, 2),
+    }
+
+def build_cart_view(cart, items, version):
+    """Carrito (como Cart.to_dict) con sus ítems (como CartItem.to_dict), totales y versión."""
+    return {**cart, "version": version, "items": items, **cart_totals(items)}
+
+def _load_cart_view(user_id):
+    # Una sola consulta: carrito, ítems y solo las columnas del producto que se muestran
+    rows = (
+        db.session.query(
+            Cart.id.label("cart_id"), Cart.created_at.label("cart_created_at"),
+            Cart.updated_at.label("cart_updated_at"),
+            CartItem.id.label("item_id"), CartItem.product_id, CartItem.quantity,
+            CartItem.price, CartItem.created_at.label("item_created_at"),
+            Product.name, Product.image_url, Product.stock,
+        )
+        .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+        .outerjoin(Product, Product.id == CartItem.product_id)
+        .filter(Cart.user_id == user_id)
+        .order_by(Cart.created_at, CartItem.created_at, CartItem.id)
+        .all()
+    )
+    if not rows:
+        return None
+    first = rows[0]
+    cart = {
+        "id": first.cart_id,
+        "user_id": user_id,
+        "created_at": first.cart_created_at.isoformat() if first.cart_created_at else None,
+        "updated_at": first.cart_updated_at.isoformat() if first.cart_updated_at else None,
+    }
+    items = [
+        {
+            "id": row.item_id,
+            "cart_id": row.cart_id,
+            "product_id": row.product_id,
+            "quantity": row.quantity,
+            "price": float(row.price) if row.price is not None else None,
+            "created_at": row.item_created_at.isoformat() if row.item_created_at else None,
+            "name": row.name,
+            "image_url": row.image_url,
+            "stock": row.stock,
+        }
+        for row in rows if row.item_id is not None and row.cart_id == first.cart_id
+    ]
+    version = http_cache.make_etag(
+        cart["id"], cart["updated_at"], *[(i["id"], i["quantity"], i["price"]) for i in items]
+    )
+    return build_cart_view(cart, items, version)
+
+def get_cart_view(user_id):
+    """
+    Vista completa del carrito del usuario (lo crea si no tiene). Solo se
+    cachea con una caché compartida (CACHE_BACKEND=redis), hasta el próximo
+    cambio del carrito; el stock mostrado puede tener hasta CART_VIEW_TTL
+    segundos. Con la caché local la invalidación llegaría solo al worker que
+    hizo el cambio y otro podría devolver el carrito anterior: se lee siempre
+    (una consulta).
+    """
+    def load():
+        if not cache.is_shared():
+            return _load_cart_view(user_id)
+        ttl = current_app.config.get("CART_VIEW_TTL", 30)
+        return cache.get_or_load(cache.cart_view_key(user_id), lambda: _load_cart_view(user_id), ttl)
+    view = load()
+    if view is None:
+        get_or_create_cart_by_user(user_id)
+        view = load()
+    return view
+
 # --------------------- CART ITEMS ------------------------
-def get_all_cart_items():
-    return CartItem.query.all()
+# Carga del producto en el mismo SELECT (solo lo que usa CartItem.to_dict)
+def _with_product_snippet(query):
+    return query.options(
+        joinedload(CartItem.product).load_only(Product.name, Product.image_url, Product.stock)
+    )
+
+def get_all_cart_items(cart_id=None):
+    query = _with_product_snippet(CartItem.query)
+    if cart_id:
+        query = query.filter(CartItem.cart_id == cart_id)
+    return query.all()
 
 def get_cart_item_by_id(cart_item_id):
-    return CartItem.query.get(cart_item_id)
+    return _with_product_snippet(CartItem.query).filter(CartItem.id == cart_item_id).first()
 
 def create_cart_item(data):
     cart_item = CartItem(
@@ -205,40 +393,81 @@ def create_cart_item(data):
     )
     db.session.add(cart_item)
     db.session.commit()
-    return cart_item
+    _on_cart_changed(db.session.query(Cart.user_id).filter(Cart.id == cart_item.cart_id).scalar())
+    return get_cart_item_by_id(cart_item.id)
 
 def update_cart_item(cart_item_id, updates):
     cart_item = get_cart_item_by_id(cart_item_id)
     if cart_item:
+        held = 'quantity' in updates and stock.hold_minutes()
+        try:
+            if held:
+                stock.set_hold(cart_item.cart.user_id, cart_item.product_id, int(updates['quantity']))
+        except ValueError:
+            db.session.rollback()
+            raise
         for key in ['quantity', 'price']:
             if key in updates:
                 setattr(cart_item, key, updates[key])
         cart_item.updated_at = now_lima()
+        user_id = cart_item.cart.user_id
         db.session.commit()
+        if held:
+            _on_stock_changed([cart_item.product_id])
+        _on_cart_changed(user_id)
+        # El commit expiró el ítem: se relee con su producto en un solo SELECT
+        cart_item = get_cart_item_by_id(cart_item_id)
     return cart_item
 
 def delete_cart_item(cart_item_id):
     cart_item = get_cart_item_by_id(cart_item_id)
     if cart_item:
+        held = stock.hold_minutes()
+        if held:
+            stock.set_hold(cart_item.cart.user_id, cart_item.product_id, 0)
+        user_id = cart_item.cart.user_id
         db.session.delete(cart_item)
         db.session.commit()
+        if held:
+            _on_stock_changed([cart_item.product_id])
+        _on_cart_changed(user_id)
     return cart_item
 
 def get_cart_item_by_cart_and_product(cart_id, product_id):
     return CartItem.query.filter_by(cart_id=cart_id, product_id=product_id).first()
 
+def get_product_for_cart(product_id):
+    """
+    Precio y stock actuales de la fila, no de la caché de lecturas: con
+    CACHE_BACKEND=local la copia de este worker puede no haber visto el cambio
+    de precio o la venta que hizo otro, y el carrito cotizaría o aceptaría
+    unidades con datos viejos.
+    """
+    return (
+        db.session.query(Product.id, Product.name, Product.image_url, Product.price, Product.stock)
+        .filter(Product.id == product_id)
+        .first()
+    )
+
 def add_product_to_cart(user_id, product_id, quantity):
     cart = get_or_create_cart_by_user(user_id)
     item = get_cart_item_by_cart_and_product(cart.id, product_id)
-    product = get_product_by_id(product_id)
+    product = get_product_for_cart(product_id)
     if not product:
         raise ValueError("Producto no encontrado")
-    if product.stock is None:
-        raise ValueError("Producto sin stock definido")
     new_quantity = quantity if not item else item.quantity + quantity
-    if new_quantity > product.stock:
+    held = stock.hold_minutes()
+    if held:
+        # Con reservas, lo que ya tiene el carrito está descontado: se valida solo
+        # la diferencia, de forma atómica al reservar
+        try:
+            stock.set_hold(user_id, product_id, new_quantity)
+        except ValueError:
+            db.session.rollback()
+            raise
+    elif new_quantity > product.stock:
         raise ValueError(f"Sólo quedan {product.stock} unidades disponibles")
-    price_with_igv = float(product.price) * 1.18
+    price_with_igv = float(product.price) * IGV
     if item:
         item.quantity = new_quantity
         item.price = price_with_igv
@@ -253,51 +482,211 @@ def add_product_to_cart(user_id, product_id, quantity):
             created_at=now_lima(),
         )
         db.session.add(item)
+    item_id = item.id
+    db.session.commit()
+    if held:
+        _on_stock_changed([product_id])
+    _on_cart_changed(user_id)
+    # El commit expiró el ítem: se relee con su producto en un solo SELECT
+    return get_cart_item_by_id(item_id)
+
+# Operaciones en lote sobre el carrito (PATCH /cart/user/<id>/items)
+CART_OPERATIONS = ('add', 'set', 'remove')
+MAX_CART_OPERATIONS = 100
+
+def plan_cart_operations(quantities, operations):
+    """
+    Cantidades finales por producto tras aplicar `operations` en orden sobre
+    `quantities` ({product_id: cantidad en el carrito}); 0 = fuera del carrito.
+    Cada operación es {"op": "add"|"set"|"remove", "product_id", "quantity"}.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("Se requiere una lista de operaciones")
+    if len(operations) > MAX_CART_OPERATIONS:
+        raise ValueError(f"Máximo {MAX_CART_OPERATIONS} operaciones por petición")
+    planned = dict(quantities)
+    for position, operation in enumerate(operations, start=1):
+        if not isinstance(operation, dict):
+            raise ValueError(f"Operación {position}: formato inválido")
+        op, product_id = operation.get('op'), operation.get('product_id')
+        if op not in CART_OPERATIONS:
+            raise ValueError(f"Operación {position}: 'op' debe ser add, set o remove")
+        if not product_id:
+            raise ValueError(f"Operación {position}: falta product_id")
+        if op == 'remove':
+            planned[product_id] = 0
+            continue
+        try:
+            quantity = int(operation.get('quantity', 1 if op == 'add' else None))
+        except (TypeError, ValueError):
+            raise ValueError(f"Operación {position}: cantidad inválida")
+        if quantity < 0:
+            raise ValueError(f"Operación {position}: la cantidad no puede ser negativa")
+        planned[product_id] = planned.get(product_id, 0) + quantity if op == 'add' else quantity
+    return {pid: quantity for pid, quantity in planned.items() if quantity != quantities.get(pid, 0)}
+
+def check_cart_stock(quantities):
+    """
+    Productos de `quantities` en una sola consulta (solo las columnas que usa
+    el carrito). Valida que existan y, sin reservas, que alcance el stock;
+    con reservas lo valida stock.set_hold al apartar.
+    """
+    wanted = [pid for pid, quantity in quantities.items() if quantity > 0]
+    products = {
+        row.id: row for row in
+        db.session.query(Product.id, Product.name, Product.price, Product.stock)
+        .filter(Product.id.in_(wanted))
+    } if wanted else {}
+    held = stock.hold_minutes()
+    for product_id in wanted:
+        product = products.get(product_id)
+        if product is None:
+            raise ValueError(f"Producto no encontrado: {product_id}")
+        if not held and quantities[product_id] > product.stock:
+            raise ValueError(f"Sólo quedan {product.stock} unidades de {product.name}")
+    return products
+
+def hold_cart_quantities(user_id, quantities):
+    """Con reservas, aparta las cantidades nuevas; si alguna falla no se aparta ninguna."""
+    try:
+        for product_id, quantity in quantities.items():
+            stock.set_hold(user_id, product_id, quantity)
+    except ValueError:
+        db.session.rollback()
+        raise
+
+def apply_cart_operations(user_id, operations):
+    """
+    Aplica las operaciones al carrito del usuario en una transacción: o se
+    aplican todas o ninguna (ValueError). Devuelve (carrito, ítems).
+    """
+    cart = get_cart_by_user_id(user_id)
+    items = {i.product_id: i for i in CartItem.query.filter_by(cart_id=cart.id)} if cart else {}
+    changed = plan_cart_operations({pid: i.quantity for pid, i in items.items()}, operations)
+    products = check_cart_stock(changed)
+    held = stock.hold_minutes()
+    if held:
+        hold_cart_quantities(user_id, changed)
+    now = now_lima()
+    if not cart:
+        cart = Cart(id=str(uuid.uuid4()), user_id=user_id, created_at=now)
+        db.session.add(cart)
+    for product_id, quantity in changed.items():
+        item = items.get(product_id)
+        if quantity <= 0:
+            if item:
+                db.session.delete(item)
+            continue
+        price_with_igv = float(products[product_id].price) * IGV
+        if item:
+            item.quantity = quantity
+            item.price = price_with_igv
+        else:
+            db.session.add(CartItem(
+                id=str(uuid.uuid4()),
+                cart_id=cart.id,
+                product_id=product_id,
+                quantity=quantity,
+                price=price_with_igv,
+                created_at=now,
+            ))
+    if changed:
+        cart.updated_at = now
     db.session.commit()
-    return item
+    if held and changed:
+        _on_stock_changed(changed)
+    if changed:
+        _on_cart_changed(user_id)
+    # El carrito completo, con los datos del producto en el mismo SELECT
+    return cart, _with_product_snippet(CartItem.query.filter_by(cart_id=cart.id)).all()
 
 # ----------------------- ORDERS --------------------------
-def get_all_orders(search=None, status=None, payment_method=None, date_from=None, date_to=None):
-    # Empieza el query
-    query = Order.query
-
-    # Join con usuario para buscar nombre/email si search está definido
-    if search:
-        search = search.strip().lower()
-        query = query.join(User, Order.user_id == User.id)
-        like_pattern = f"%{search}%"
-        query = query.filter(
-            or_(
-                Order.order_number.ilike(like_pattern),
-                User.full_name.ilike(like_pattern),
-                User.email.ilike(like_pattern),
-            )
+# Tope del conteo de resultados en el listado paginado: por encima se informa "más de N"
+ORDER_COUNT_CAP = 10000
+# Máximo de usuarios (por nombre/correo) que aporta una búsqueda de órdenes
+ORDER_SEARCH_MAX_USERS = 1000
+
+def _order_search_criterion(term):
+    """Número de orden, o nombre/correo del usuario, que empiece por `term` (o lo contenga, con ngram)."""
+    ngram = current_app.config.get("ORDER_SEARCH") == "ngram" and db.engine.dialect.name == "mysql"
+    if ngram:
+        phrase = '"' + term.replace('"', ' ') + '"'
+        order_match = mysql_match(Order.order_number, against=phrase).in_boolean_mode()
+        user_match = mysql_match(User.full_name, User.email, against=phrase).in_boolean_mode()
+    else:
+        order_match = Order.order_number.startswith(term, autoescape=True)
+        user_match = or_(
+            User.email.startswith(term, autoescape=True),
+            User.full_name.startswith(term, autoescape=True),
         )
+    # Los usuarios se resuelven aparte: así cada condición usa su propio índice
+    # en vez de un JOIN con OR que obliga a recorrer todas las órdenes
+    user_ids = [
+        row.id for row in
+        db.session.query(User.id).filter(user_match).limit(ORDER_SEARCH_MAX_USERS)
+    ]
+    return or_(order_match, Order.user_id.in_(user_ids)) if user_ids else order_match
+
+def order_criteria(search=None, status=None, payment_method=None, date_from=None, date_to=None):
+    criteria = []
+    if search and search.strip():
+        criteria.append(_order_search_criterion(search.strip()))
     # Filtro por status
     if status:
-        query = query.filter(Order.status == status)
+        criteria.append(Order.status == status)
     # Filtro por payment_method
     if payment_method:
-        query = query.filter(Order.payment_method == payment_method)
+        criteria.append(Order.payment_method == payment_method)
     # Filtro por fecha de inicio
     if date_from:
         try:
-            date_from_dt = datetime.strptime(date_from, "%Y-%m-%d")
-            query = query.filter(Order.created_at >= date_from_dt)
-        except Exception:
+            criteria.append(Order.created_at >= datetime.strptime(date_from, "%Y-%m-%d"))
+        except ValueError:
             pass
-    # Filtro por fecha de fin
+    # Filtro por fecha de fin (incluye todo ese día)
     if date_to:
         try:
-            date_to_dt = datetime.strptime(date_to, "%Y-%m-%d")
-            # Incluye todo ese día hasta las 23:59:59
-            date_to_dt = date_to_dt.replace(hour=23, minute=59, second=59)
-            query = query.filter(Order.created_at <= date_to_dt)
-        except Exception:
+            criteria.append(Order.created_at < datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1))
+        except ValueError:
             pass
+    return criteria
 
-    query = query.order_by(Order.created_at.desc())
-    return query.all()
+@replicas.reads
+def get_all_orders(search=None, status=None, payment_method=None, date_from=None, date_to=None):
+    criteria = order_criteria(search, status, payment_method, date_from, date_to)
+    return Order.query.filter(*criteria).order_by(Order.created_at.desc(), Order.id.desc()).all()
+
+@replicas.reads
+def get_orders_page(limit, cursor=None, **filters):
+    """Una página del listado, más recientes primero. Devuelve (órdenes, next_cursor)."""
+    query = Order.query.filter(*order_criteria(**filters))
+    return keyset_paginate(
+        query, [Order.created_at, Order.id], True, limit, "orders",
+        cursor=cursor, key=lambda o: [o.created_at, o.id],
+    )
+
+@replicas.reads
+def count_orders(search=None, status=None, payment_method=None, date_from=None, date_to=None):
+    """
+    Total de órdenes del listado: (total, exacto). Sin filtros, o solo por
+    status o medio de pago, sale de admin_stats; si no, se cuenta hasta
+    ORDER_COUNT_CAP y por encima se informa el tope como estimación.
+    """
+    if not (search or date_from or date_to) and not (status and payment_method):
+        if status:
+            total = admin_stats.count(admin_stats.BY_STATUS, status)
+        elif payment_method:
+            total = admin_stats.count(admin_stats.BY_PAYMENT_METHOD, payment_method)
+        else:
+            total = admin_stats.count(admin_stats.ORDERS)
+        if total is not None:
+            return total, True
+    criteria = order_criteria(search, status, payment_method, date_from, date_to)
+    capped = Order.query.with_entities(Order.id).filter(*criteria).limit(ORDER_COUNT_CAP + 1).subquery()
+    total = db.session.query(func.count()).select_from(capped).scalar()
+    if total > ORDER_COUNT_CAP:
+        return ORDER_COUNT_CAP, False
+    return total, True
 
 def get_order_by_id(order_id):
     return Order.query.get(order_id)
@@ -305,21 +694,33 @@ def get_order_by_id(order_id):
 def get_order_items_by_order_id(order_id):
     return OrderItem.query.filter_by(order_id=order_id).all()
 
-def generate_tracking_number():
-    today = now_lima().strftime("%Y%m%d")
+def generate_tracking_number(now=None):
+    today = (now or now_lima()).strftime("%Y%m%d")
     random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=7))
     return f"PCDOS2-{today}-{random_part}"
 
-def create_order(data):
-    items = data.pop('items', [])
+def _load_order_products(items):
+    """Todos los productos referenciados en una sola consulta IN."""
+    product_ids = {item['product_id'] for item in items}
+    if not product_ids:
+        return {}
+    products = (
+        Product.query
+        .options(load_only(Product.id, Product.product_code, Product.name, Product.stock))
+        .filter(Product.id.in_(product_ids))
+        .all()
+    )
+    return {p.id: p for p in products}
+
+def _build_order(data, items, now):
     payment_method = data.get("payment_method", None)
 
-    today = now_lima().strftime("%Y%m%d")
+    today = now.strftime("%Y%m%d")
     order_number = f"ORD-{today}-{str(uuid.uuid4())[:8]}"
 
     tracking_number = data.get("tracking_number")
     if not tracking_number:
-        tracking_number = generate_tracking_number()
+        tracking_number = generate_tracking_number(now)
 
     total_amount = data.get("total_amount")
     if not total_amount:
@@ -335,7 +736,7 @@ def create_order(data):
         else:
             status = "pending"
 
-    order = Order(
+    return Order(
         id=data.get("id", str(uuid.uuid4())),
         order_number=order_number,
         user_id=data.get("user_id"),
@@ -345,46 +746,126 @@ def create_order(data):
         shipping_address=data.get("shipping_address"),
         tracking_number=tracking_number,
         notes=data.get("notes"),
-        created_at=now_lima(),
+        created_at=now,
     )
+
+def _insert_order(data, products, available, now):
+    """
+    Inserta una orden con sus ítems dentro de la transacción actual.
+    `available` es el stock conocido en memoria ({product_id: stock}); se valida
+    ahí primero y luego se descuenta en la BD con un UPDATE atómico.
+    Los productos inexistentes se omiten. Devuelve (orden, ids de productos tocados).
+    """
+    items = data.pop('items', [])
+    order = _build_order(data, items, now)
+    lines = [item for item in items if item['product_id'] in products]
+
+    # --- Validación de stock en memoria (sin ir a la BD) ---
+    # Con reservas de carrito el stock visible ya excluye lo apartado: decide el UPDATE
+    requested = {}
+    for item in lines:
+        requested[item['product_id']] = requested.get(item['product_id'], 0) + item['quantity']
+    if not stock.hold_minutes():
+        for product_id, quantity in requested.items():
+            if available.get(product_id) is not None and quantity > available[product_id]:
+                raise stock.InsufficientStock(product_id, products[product_id].name, available[product_id])
+
     db.session.add(order)
-    db.session.flush()  # Para obtener order.id antes del commit
+    db.session.flush()  # Para obtener order.id antes de insertar los ítems
+
+    # --- Descuento de stock (atómico, ver stock.py) y alta de OrderItems en bloque ---
+    stock.reserve([(item['product_id'], item['quantity']) for item in lines], user_id=order.user_id)
+    if lines:
+        db.session.execute(insert(OrderItem), [
+            {
+                "id": str(uuid.uuid4()),
+                "order_id": order.id,
+                "product_id": item['product_id'],
+                "product_code": products[item['product_id']].product_code,
+                "product_name": products[item['product_id']].name,
+                "quantity": item['quantity'],
+                "unit_price": item['price'],
+                "total_price": item['price'] * item['quantity'],
+                "created_at": now,
+            }
+            for item in lines
+        ])
+    admin_stats.order_added(order)
+    sales_analytics.mark_dirty(order.created_at)
+    for product_id, quantity in requested.items():
+        if available.get(product_id) is not None:
+            available[product_id] -= quantity
+    return order, set(requested)
 
-    # --- Descuento de stock y creación de OrderItems ---
-    for item in items:
-        product = Product.query.get(item['product_id'])
-        if not product:
-            continue
-        # Descuento de stock automático
-        if product.stock is not None:
-            new_stock = product.stock - item['quantity']
-            if new_stock < 0:
-                raise ValueError(f"No hay suficiente stock para el producto {product.name}. Quedan {product.stock}.")
-            product.stock = new_stock
-            product.updated_at = now_lima()
-        order_item = OrderItem(
-            id=str(uuid.uuid4()),
-            order_id=order.id,
-            product_id=product.id,
-            product_code=product.product_code,
-            product_name=product.name,
-            quantity=item['quantity'],
-            unit_price=item['price'],
-            total_price=item['price'] * item['quantity'],
-            created_at=now_lima(),
-        )
-        db.session.add(order_item)
+def create_order(data):
+    now = now_lima()
+    products = _load_order_products(data.get('items', []))
+    available = {pid: p.stock for pid, p in products.items()}
+    try:
+        order, touched = _insert_order(data, products, available, now)
+    except ValueError:
+        db.session.rollback()
+        raise
     db.session.commit()
-    
+    _on_stock_changed(touched)
+
     return order
 
+def create_orders_bulk(orders, chunk_size=100):
+    """
+    Alta masiva (importaciones de marketplace, sincronización de POS).
+    Se procesa por bloques: un IN para los productos del bloque y un commit
+    por bloque; cada orden va en su propio savepoint, así una orden inválida
+    no tumba a las demás. Devuelve un resultado por orden, en el mismo orden.
+    """
+    results = []
+    for start in range(0, len(orders), chunk_size):
+        chunk = orders[start:start + chunk_size]
+        now = now_lima()
+        items = [
+            item for data in chunk if isinstance(data, dict)
+            for item in data.get('items') or [] if isinstance(item, dict) and 'product_id' in item
+        ]
+        products = _load_order_products(items)
+        available = {pid: p.stock for pid, p in products.items()}
+        touched = set()
+        for offset, data in enumerate(chunk):
+            index = start + offset
+            snapshot = dict(available)
+            savepoint = db.session.begin_nested()
+            try:
+                if not isinstance(data, dict):
+                    raise ValueError("Cada orden debe ser un objeto")
+                order, product_ids = _insert_order(dict(data), products, available, now)
+                savepoint.commit()
+            except (ValueError, KeyError, TypeError, SQLAlchemyError) as e:
+                savepoint.rollback()
+                available.clear()
+                available.update(snapshot)
+                message = f"Falta el campo {e}" if isinstance(e, KeyError) else str(e)
+                results.append({"index": index, "status": "error", "error": message})
+                continue
+            touched |= product_ids
+            results.append({
+                "index": index,
+                "status": "created",
+                "order_id": order.id,
+                "order_number": order.order_number,
+            })
+        db.session.commit()
+        _on_stock_changed(touched)
+    return results
+
 def update_order(order_id, data):
     order = get_order_by_id(order_id)
     if order:
+        before = admin_stats.order_snapshot(order)
         for key in ['total_amount', 'status', 'payment_method', 'tracking_number', 'shipping_address', 'notes']:
             if key in data and data[key] is not None:
                 setattr(order, key, data[key])
         order.updated_at = now_lima()
+        admin_stats.order_changed(before, order)
+        sales_analytics.mark_dirty(order.created_at)
         db.session.commit()
     return order
 
@@ -392,13 +873,13 @@ def delete_order(order_id):
     order = get_order_by_id(order_id)
     if order:
         # --- Devuelve stock antes de eliminar la orden ---
-        for item in order.order_items:
-            product = Product.query.get(item.product_id)
-            if product and product.stock is not None:
-                product.stock = product.stock + item.quantity
-                product.updated_at = now_lima()
+        lines = [(item.product_id, item.quantity) for item in order.order_items if item.product_id]
+        stock.restock(lines)
+        admin_stats.order_removed(order)
+        sales_analytics.mark_dirty(order.created_at)
         db.session.delete(order)
         db.session.commit()
+        _on_stock_changed({product_id for product_id, _ in lines})
     return order
 
 # -------------------- ORDER ITEMS ------------------------
@@ -421,6 +902,7 @@ def create_order_item(data):
         created_at=now_lima(),
     )
     db.session.add(order_item)
+    sales_analytics.mark_order_dirty(order_item.order_id)
     db.session.commit()
     return order_item
 
@@ -431,12 +913,14 @@ def update_order_item(order_item_id, data):
             if key in data:
                 setattr(order_item, key, data[key])
         order_item.updated_at = now_lima()
+        sales_analytics.mark_order_dirty(order_item.order_id)
         db.session.commit()
     return order_item
 
 def delete_order_item(order_item_id):
     order_item = get_order_item_by_id(order_item_id)
     if order_item:
+        sales_analytics.mark_order_dirty(order_item.order_id)
         db.session.delete(order_item)
         db.session.commit()
     return order_item
@@ -446,17 +930,24 @@ def get_all_invoices():
     return Invoice.query.all()
 
 def get_invoice_by_id(invoice_id):
-    return Invoice.query.get(invoice_id)
+    return Invoice.query.options(defer(Invoice.pdf_data)).get(invoice_id)
 
 def create_invoice(data):
+    # Si llega el PDF ya generado, se guarda en el almacén y no en la fila
+    pdf_key = pdf_size = None
+    if data.get("pdf_data"):
+        pdf_key = blob_store.get_blob_store().put(data["pdf_data"])
+        pdf_size = len(data["pdf_data"])
     invoice = Invoice(
         id=data.get("id", str(uuid.uuid4())),
         order_id=data.get("order_id"),
         invoice_number=data.get("invoice_number"),
         customer_name=data.get("customer_name"),
         customer_dni=data.get("customer_dni"),
-        pdf_data=data.get("pdf_data"),  # ESTA LÍNEA ES LA CLAVE QUE FALTABA
-        created_at=now_lima(),
+        pdf_key=pdf_key,
+        pdf_size=pdf_size,
+        status=data.get("status", "ready"),
+        created_at=data.get("created_at", now_lima()),
     )
     db.session.add(invoice)
     db.session.commit()
@@ -469,13 +960,16 @@ def update_invoice(invoice_id, data):
         for key in ['total']:
             if key in data:
                 setattr(invoice, key, data[key])
-        invoice.updated_at = now_lima()
         db.session.commit()
     return invoice
 
 def delete_invoice(invoice_id):
     invoice = get_invoice_by_id(invoice_id)
     if invoice:
+        pdf_key = invoice.pdf_key
         db.session.delete(invoice)
         db.session.commit()
+        # El almacén es por contenido: solo se borra si ninguna otra boleta lo usa
+        if pdf_key and not Invoice.query.filter_by(pdf_key=pdf_key).first():
+            blob_store.get_blob_store().delete(pdf_key)
     return invoice
@@ -1,3 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession: los SELECT de lectura pueden ir a réplicas (ver replicas.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
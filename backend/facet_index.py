@@ -0,0 +1,173 @@
+import threading
+from collections import namedtuple
+from index_sync import IndexSync
+
+# Rangos de precio (S/) del filtro del catálogo; el último no tiene tope
+PRICE_BUCKETS = [(0, 100), (100, 300), (300, 600), (600, 1200), (1200, None)]
+
+FacetRecord = namedtuple("FacetRecord", "brand category_id price_bucket in_stock is_active")
+
+# Dimensiones que se cuentan; cada una ignora su propio filtro al contar
+# (así el usuario ve cuántos productos obtendría al cambiar esa opción)
+DIMENSIONS = ("brand", "category_id", "price_bucket", "in_stock")
+
+
+def bucket_key(low, high):
+    return f"{low}-{high}" if high is not None else f"{low}+"
+
+
+def price_bucket(price):
+    if price is None:
+        return None
+    value = float(price)
+    for low, high in PRICE_BUCKETS:
+        if value >= low and (high is None or value < high):
+            return bucket_key(low, high)
+    return None
+
+
+def product_record(product):
+    return FacetRecord(
+        brand=product.brand or None,
+        category_id=product.category_id,
+        price_bucket=price_bucket(product.price),
+        in_stock=product.stock > 0,
+        is_active=bool(product.is_active),
+    )
+
+
+class FacetIndex:
+    """Registro compacto por producto con los atributos de los filtros del catálogo."""
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def add(self, product_id, record):
+        with self._lock:
+            self._records[product_id] = record
+
+    def remove(self, product_id):
+        with self._lock:
+            self._records.pop(product_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._records = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def counts(self, product_ids=None, is_active=None, **filters):
+        """
+        Cuenta en una sola pasada. `filters` admite brand, category_id,
+        price_bucket e in_stock; `product_ids` restringe a un resultado de búsqueda.
+        """
+        brand = filters.get("brand")
+        wanted = {
+            "brand": brand.lower() if brand else None,
+            "category_id": filters.get("category_id"),
+            "price_bucket": filters.get("price_bucket"),
+            "in_stock": filters.get("in_stock"),
+        }
+        active = [d for d in DIMENSIONS if wanted[d] is not None]
+        counters = {d: {} for d in DIMENSIONS}
+        total = 0
+
+        with self._lock:
+            if product_ids is None:
+                records = list(self._records.values())
+            else:
+                records = [self._records[pid] for pid in product_ids if pid in self._records]
+
+        for record in records:
+            if is_active is not None and record.is_active != is_active:
+                continue
+            failed = None
+            for dim in active:
+                value = getattr(record, dim)
+                if dim == "brand":
+                    value = value.lower() if value else None
+                if value != wanted[dim]:
+                    if failed is not None:
+                        break
+                    failed = dim
+            else:
+                if failed is None:
+                    total += 1
+                    dims = DIMENSIONS
+                else:
+                    # Solo falla un filtro: cuenta únicamente para esa dimensión
+                    dims = (failed,)
+                for dim in dims:
+                    value = getattr(record, dim)
+                    if value is not None:
+                        counters[dim][value] = counters[dim].get(value, 0) + 1
+
+        return {
+            "total": total,
+            "brands": _as_list(counters["brand"]),
+            "categories": _as_list(counters["category_id"]),
+            "price_ranges": [
+                {
+                    "key": bucket_key(low, high),
+                    "min": low,
+                    "max": high,
+                    "count": counters["price_bucket"].get(bucket_key(low, high), 0),
+                }
+                for low, high in PRICE_BUCKETS
+            ],
+            "stock": {
+                "in_stock": counters["in_stock"].get(True, 0),
+                "out_of_stock": counters["in_stock"].get(False, 0),
+            },
+        }
+
+
+def _as_list(counter):
+    return [
+        {"value": value, "count": count}
+        for value, count in sorted(counter.items(), key=lambda kv: (-kv[1], str(kv[0])))
+    ]
+
+
+_index = None
+_index_lock = threading.Lock()
+# El stock cambia en cada checkout (y mueve updated_at): con INDEX_SYNC_INTERVAL=0
+# los conteos ven lo mismo que el listado filtrado en SQL
+_sync = IndexSync(
+    lambda Product: [Product.brand, Product.category_id, Product.price, Product.stock, Product.is_active],
+    product_record,
+)
+
+
+def get_facet_index():
+    """Índice del proceso: se construye en el primer uso y se sincroniza antes de cada uno."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = FacetIndex()
+                _sync.build(index)
+                _index = index
+                return _index
+    _sync.sync(_index)
+    return _index
+
+
+# Hooks llamados desde crud tras cada escritura de productos
+def index_product(product):
+    if _index is not None:
+        _index.add(product.id, product_record(product))
+
+
+def remove_product(product_id):
+    if _index is not None:
+        _index.remove(product_id)
+
+
+def reset():
+    global _index, _sync
+    with _index_lock:
+        _index = None
+        _sync = IndexSync(_sync._columns, _sync._value)
@@ -0,0 +1,65 @@
+import hashlib
+from datetime import datetime
+import pytz
+from flask import request, make_response
+from sqlalchemy import func
+from clock import LIMA
+from database import db
+
+
+def to_http_datetime(value):
+    """Las fechas se guardan sin zona en hora de Lima; HTTP las necesita en UTC."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = LIMA.localize(value)
+    return value.astimezone(pytz.utc).replace(microsecond=0)
+
+
+def watermark(column, *criteria):
+    """
+    (MAX(columna), COUNT(*)) de una tabla: cambia con cualquier alta,
+    edición o baja sin leer las filas. Con un índice sobre la columna es barato.
+    Sirve para el ETag de listados; no como Last-Modified, porque una baja
+    no mueve el máximo. La columna debe tener microsegundos (PreciseDateTime
+    en models.py): con DATETIME de segundos, dos ediciones en el mismo
+    segundo dejan el mismo máximo y el cliente recibe un 304 con datos viejos.
+    """
+    query = db.session.query(func.max(column), func.count()).filter(*criteria)
+    latest, count = query.one()
+    return latest, count
+
+
+def make_etag(*parts):
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def conditional_response(etag, last_modified, build):
+    """
+    Responde 304 si el cliente ya tiene la versión actual (If-None-Match o
+    If-Modified-Since); si no, llama a `build()` y le agrega ETag y Last-Modified.
+    `build` solo se ejecuta cuando hay que enviar el cuerpo.
+    """
+    last_modified = to_http_datetime(last_modified)
+
+    not_modified = False
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        not_modified = last_modified <= request.if_modified_since
+
+    if not_modified:
+        response = make_response("", 304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Obliga a revalidar siempre: el 304 es barato y evita datos viejos
+    response.headers["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,94 @@
+"""
+Índices en memoria por worker (search_index.py, facet_index.py) al día con
+la BD.
+
+Los hooks de crud solo llegan al worker que hizo la escritura; para ver las
+de los demás, cada índice recuerda la marca de products con la que quedó,
+(MAX(updated_at), COUNT(*)), la misma del ETag del catálogo (http_cache.py).
+Antes de usarlo, como mucho cada INDEX_SYNC_INTERVAL segundos (0 = en cada
+uso), se compara con la marca actual:
+
+  - si no cambió, no se hace nada más;
+  - si cambió, se vuelven a indexar los productos con updated_at desde la
+    marca anterior (menos SYNC_OVERLAP: una transacción larga puede hacer
+    commit después con un updated_at anterior a la marca);
+  - si aun así el índice no tiene COUNT(*) productos (bajas hechas en otro
+    worker), se reconstruye entero.
+
+Además, cada INDEX_REBUILD_INTERVAL segundos se reconstruye entero por si
+algún cambio se escapó (p. ej. una transacción más larga que SYNC_OVERLAP).
+"""
+import threading
+import time
+from datetime import timedelta
+from flask import current_app
+import http_cache
+import replicas
+
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class IndexSync:
+    """
+    Estado de sincronización de un índice. `columns(Product)` da las columnas
+    a cargar y `value(product)` lo que se guarda con index.add(id, valor); el
+    índice necesita add, clear y len.
+    """
+
+    def __init__(self, columns, value):
+        self._columns = columns
+        self._value = value
+        self._lock = threading.Lock()
+        self.mark = None
+        self.checked_at = None
+        self.built_at = None
+
+    def _query(self):
+        from models import Product
+        from sqlalchemy.orm import load_only
+        return Product.query.options(load_only(Product.id, Product.updated_at, *self._columns(Product)))
+
+    @replicas.primary
+    def build(self, index):
+        from models import Product
+        mark = http_cache.watermark(Product.updated_at)
+        index.clear()
+        for product in self._query().yield_per(1000):
+            index.add(product.id, self._value(product))
+        self.mark = mark
+        self.checked_at = self.built_at = time.monotonic()
+
+    @replicas.primary
+    def _catch_up(self, index):
+        from models import Product
+        # La marca se toma antes de leer: lo que cambie mientras tanto entra en la próxima
+        mark = http_cache.watermark(Product.updated_at)
+        if mark == self.mark:
+            return
+        since = self.mark[0] if self.mark else None
+        query = self._query()
+        if since is not None:
+            query = query.filter(Product.updated_at >= since - SYNC_OVERLAP)
+        for product in query.yield_per(1000):
+            index.add(product.id, self._value(product))
+        if len(index) != mark[1]:
+            self.build(index)
+            return
+        self.mark = mark
+
+    def sync(self, index):
+        config = current_app.config
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < config.get("INDEX_SYNC_INTERVAL", 0):
+            return
+        # Un solo hilo sincroniza; los demás usan el índice como está
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.checked_at = now
+            if self.built_at is None or now - self.built_at >= config.get("INDEX_REBUILD_INTERVAL", 600):
+                self.build(index)
+            else:
+                self._catch_up(index)
+        finally:
+            self._lock.release()
@@ -0,0 +1,361 @@
+"""
+Exportación masiva de boletas (contabilidad pide un mes a la vez).
+
+Todo se genera de forma perezosa: las boletas se leen por lotes (sin el PDF),
+cada PDF se lee del almacén recién cuando toca escribirlo y la respuesta sale
+en trozos. En memoria solo hay un PDF a la vez, sin importar cuántas boletas
+abarque la exportación.
+
+- stream_zip: un ZIP (sin compresión, los PDF ya vienen comprimidos) escrito
+  sobre un flujo sin seek, con descriptores de datos por entrada.
+- stream_merged_pdf: un solo PDF con todas las páginas. Solo se combinan PDF
+  como los de pdf_generator (ReportLab: PDF <= 1.4, una sola revisión, tabla
+  xref clásica, árbol de páginas plano): se concatenan renumerando sus
+  objetos y el contenido de los streams se copia sin tocar. Cualquier otro
+  (object streams, xref streams, actualizaciones incrementales, ...) se
+  rechaza y la boleta queda fuera, con un aviso en el log y en una página
+  final de faltantes, en vez de salir corrupta en el combinado.
+"""
+import logging
+import re
+import zipfile
+from datetime import datetime, timedelta
+from io import BytesIO
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from sqlalchemy import tuple_
+from models import Invoice
+import blob_store
+import invoice_jobs
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+CHUNK_SIZE = blob_store.CHUNK_SIZE
+
+
+def parse_filters(args):
+    """
+    Filtros desde query string o JSON: from/to (YYYY-MM-DD, ambos inclusive)
+    u order_ids (lista o texto separado por comas). Lanza ValueError si faltan
+    o no son válidos.
+    """
+    order_ids = args.get("order_ids")
+    if isinstance(order_ids, str):
+        order_ids = [o.strip() for o in order_ids.split(",") if o.strip()]
+    date_from = args.get("from")
+    date_to = args.get("to")
+    if not order_ids and not date_from and not date_to:
+        raise ValueError("Indica un rango de fechas (from/to) u order_ids")
+    try:
+        start = datetime.strptime(date_from, "%Y-%m-%d") if date_from else None
+        end = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1) if date_to else None
+    except (TypeError, ValueError):
+        raise ValueError("Las fechas deben tener formato YYYY-MM-DD")
+    return {"order_ids": order_ids or None, "start": start, "end": end}
+
+
+def _base_query(start=None, end=None):
+    query = Invoice.query.with_entities(
+        Invoice.id, Invoice.invoice_number, Invoice.pdf_key, Invoice.created_at, Invoice.status,
+    )
+    if start:
+        query = query.filter(Invoice.created_at >= start)
+    if end:
+        query = query.filter(Invoice.created_at < end)
+    return query
+
+
+def iter_invoices(order_ids=None, start=None, end=None, batch_size=BATCH_SIZE):
+    """Filas livianas de boletas (sin pdf_data), por lotes y en orden estable."""
+    if order_ids:
+        order_ids = list(dict.fromkeys(order_ids))
+        for i in range(0, len(order_ids), batch_size):
+            chunk = order_ids[i:i + batch_size]
+            yield from (
+                _base_query(start, end)
+                .filter(Invoice.order_id.in_(chunk))
+                .order_by(Invoice.created_at, Invoice.id)
+                .all()
+            )
+        return
+
+    # Keyset por (created_at, id): cada lote es una consulta corta por índice
+    last = None
+    while True:
+        query = _base_query(start, end)
+        if last:
+            query = query.filter(tuple_(Invoice.created_at, Invoice.id) > last)
+        rows = query.order_by(Invoice.created_at, Invoice.id).limit(batch_size).all()
+        if not rows:
+            return
+        yield from rows
+        last = (rows[-1].created_at, rows[-1].id)
+
+
+def _legacy_pdf(invoice_id):
+    return (
+        Invoice.query.with_entities(Invoice.pdf_data)
+        .filter(Invoice.id == invoice_id)
+        .scalar()
+    )
+
+
+def _iter_pdf_chunks(row):
+    """Trozos del PDF de la boleta, o nada si no tiene PDF."""
+    if row.pdf_key:
+        body = blob_store.get_blob_store().open(row.pdf_key)
+        try:
+            while True:
+                chunk = body.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+        return
+    data = _legacy_pdf(row.id)
+    if data:
+        yield data
+
+
+def _read_pdf(row):
+    return b"".join(_iter_pdf_chunks(row))
+
+
+class _ChunkWriter:
+    """Destino sin seek para ZipFile: acumula lo escrito hasta que se drene."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_zip(rows):
+    writer = _ChunkWriter()
+    skipped = []
+    with zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for row in rows:
+            if row.status != invoice_jobs.READY:
+                skipped.append(f"{row.invoice_number}\t{row.status}")
+                continue
+            info = zipfile.ZipInfo(f"boleta-{row.invoice_number}.pdf", row.created_at.timetuple()[:6]
+                                   if row.created_at else (1980, 1, 1, 0, 0, 0))
+            wrote = False
+            with archive.open(info, "w") as entry:
+                for chunk in _iter_pdf_chunks(row):
+                    entry.write(chunk)
+                    wrote = True
+                    data = writer.drain()
+                    if data:
+                        yield data
+            if not wrote:
+                skipped.append(f"{row.invoice_number}\tsin PDF")
+            data = writer.drain()
+            if data:
+                yield data
+        if skipped:
+            archive.writestr("faltantes.txt", "\n".join(skipped) + "\n")
+    yield writer.drain()
+
+
+# --- Concatenación de PDF ---
+
+_REF = re.compile(rb"(\d+) 0 R")
+_OBJ_HEADER = re.compile(rb"\s*(\d+)\s+0\s+obj\s*")
+_STREAM = re.compile(rb"stream\r?\n")
+_LENGTH = re.compile(rb"/Length (\d+)(?!\s+\d+\s+R)")
+_VERSION = re.compile(rb"%PDF-1\.([0-4])\s")
+# Estructuras que el renumerado por regex no sabe leer
+_UNSUPPORTED = re.compile(rb"/Type\s*/(?:ObjStm|XRef)\b")
+_UNSUPPORTED_TRAILER = re.compile(rb"/(?:Prev|XRefStm|Encrypt)\b")
+# Atributos heredables del árbol de páginas que se perderían al reemplazarlo
+_INHERITED = re.compile(rb"/(?:Resources|MediaBox|CropBox|Rotate)\b")
+
+
+class _PdfSource:
+    """
+    Objetos de un PDF con xref clásica (como los que genera ReportLab).
+    Lanza ValueError si el PDF tiene algo que no se puede copiar así.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        if not _VERSION.match(data):
+            raise ValueError("versión de PDF no soportada")
+        if data.count(b"%%EOF") != 1 or data.count(b"startxref") != 1:
+            raise ValueError("PDF con actualizaciones incrementales")
+        if _UNSUPPORTED.search(data):
+            raise ValueError("PDF con object streams o xref streams")
+        startxref = int(data[data.rindex(b"startxref") + 9:].split()[0])
+        if not data.startswith(b"xref", startxref):
+            raise ValueError("PDF sin tabla xref clásica")
+        trailer = data[data.index(b"trailer", startxref):]
+        if _UNSUPPORTED_TRAILER.search(trailer):
+            raise ValueError("PDF con revisiones previas o cifrado")
+        self.root = int(re.search(rb"/Root (\d+) 0 R", trailer).group(1))
+        info = re.search(rb"/Info (\d+) 0 R", trailer)
+        self.info = int(info.group(1)) if info else None
+
+        self.offsets = {}
+        lines = data[startxref:data.index(b"trailer", startxref)].split(b"\n")[1:]
+        number = 0
+        for line in lines:
+            parts = line.split()
+            if len(parts) == 2:
+                number = int(parts[0])
+            elif len(parts) == 3:
+                if parts[2] == b"n":
+                    self.offsets[number] = int(parts[0])
+                number += 1
+
+        self.pages = int(re.search(rb"/Pages (\d+) 0 R", self.header(self.root)).group(1))
+        pages = self.header(self.pages)
+        if _INHERITED.search(pages):
+            raise ValueError("árbol de páginas con atributos heredados")
+        kids = re.search(rb"/Kids \[([^\]]*)\]", pages).group(1)
+        self.kids = [int(n) for n in _REF.findall(kids)]
+        if any(re.search(rb"/Type\s*/Pages\b", self.header(kid)) for kid in self.kids):
+            raise ValueError("árbol de páginas anidado")
+
+    def _span(self, number):
+        """(inicio del cuerpo, fin del diccionario, fin del objeto)."""
+        start = _OBJ_HEADER.match(self.data, self.offsets[number]).end()
+        end = self.data.index(b"endobj", start)
+        stream = _STREAM.search(self.data, start, end)
+        if not stream:
+            return start, end, end
+        length = _LENGTH.search(self.data, start, stream.start())
+        if not length:
+            raise ValueError("stream sin /Length directo")
+        length = int(length.group(1))
+        end = self.data.index(b"endobj", stream.end() + length)
+        return start, stream.start(), end
+
+    def header(self, number):
+        start, dict_end, _ = self._span(number)
+        return self.data[start:dict_end]
+
+    def objects(self):
+        """(número, diccionario, resto en bruto) de todo salvo catálogo, info y páginas."""
+        for number in sorted(self.offsets):
+            if number in (self.root, self.info, self.pages):
+                continue
+            start, dict_end, end = self._span(number)
+            yield number, self.data[start:dict_end], self.data[dict_end:end]
+
+
+def _summary_pdf(skipped):
+    """Página(s) finales del combinado con las boletas que quedaron fuera."""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    y = 0
+    for line in skipped:
+        if y < 50:
+            if y:
+                c.showPage()
+            c.setFont("Helvetica-Bold", 14)
+            c.drawString(40, height - 50, "Boletas no incluidas")
+            c.setFont("Helvetica", 10)
+            y = height - 80
+        c.drawString(40, y, line)
+        y -= 14
+    c.save()
+    return buffer.getvalue()
+
+
+def _copy_objects(source, first_number):
+    """
+    Objetos de `source` renumerados desde first_number, en memoria (una sola
+    boleta). Lanza ValueError si alguna referencia apunta a un objeto que no
+    está en su xref: no se inventa un destino.
+    """
+    mapping = {number: first_number + i for i, number in enumerate(sorted(source.offsets))}
+    mapping[source.pages] = 2
+
+    def renumber(match):
+        number = int(match.group(1))
+        if number not in mapping:
+            raise ValueError(f"referencia al objeto {number}, que no existe")
+        return b"%d 0 R" % mapping[number]
+
+    objects = [
+        (mapping[number], b"%d 0 obj\n" % mapping[number] + _REF.sub(renumber, header) + rest + b"endobj\n")
+        for number, header, rest in source.objects()
+    ]
+    kids = [mapping[k] for k in source.kids]
+    return objects, kids, first_number + len(source.offsets)
+
+
+def stream_merged_pdf(rows):
+    """
+    Un solo PDF con las páginas de todas las boletas. Las que no se pueden
+    incluir (sin generar, sin PDF o con un PDF que no se sabe combinar) se
+    listan en una página final, como faltantes.txt en el ZIP.
+    """
+    # Objetos 1 (catálogo) y 2 (árbol de páginas) se escriben al final
+    offsets = {}
+    kids = []
+    skipped = []
+    position = 0
+    next_number = 3
+
+    def emit(data):
+        nonlocal position
+        position += len(data)
+        return data
+
+    def append(data):
+        # Una boleta se renumera entera antes de escribir nada: si falla no queda a medias
+        nonlocal next_number
+        objects, page_refs, next_number = _copy_objects(_PdfSource(data), next_number)
+        for number, body in objects:
+            offsets[number] = position
+            yield emit(body)
+        kids.extend(page_refs)
+
+    yield emit(b"%PDF-1.4\n%\x93\x8c\x8b\x9e\n")
+    for row in rows:
+        if row.status != invoice_jobs.READY:
+            skipped.append(f"{row.invoice_number}: {row.status}")
+            continue
+        data = _read_pdf(row)
+        if not data:
+            skipped.append(f"{row.invoice_number}: sin PDF")
+            continue
+        try:
+            yield from append(data)
+        except (ValueError, AttributeError, KeyError) as e:
+            logger.warning("La boleta %s no se pudo incluir en el PDF combinado: %s", row.invoice_number, e)
+            skipped.append(f"{row.invoice_number}: PDF no combinable ({e})")
+    if skipped:
+        yield from append(_summary_pdf(skipped))
+
+    offsets[1] = position
+    yield emit(b"1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+    offsets[2] = position
+    refs = b" ".join(b"%d 0 R" % k for k in kids)
+    yield emit(b"2 0 obj\n<< /Type /Pages /Count %d /Kids [ %s ] >>\nendobj\n" % (len(kids), refs))
+
+    # Tabla xref: los números que quedaron sin usar (catálogos, info) van como libres
+    size = next_number
+    xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+    for number in range(1, size):
+        if number in offsets:
+            xref.append(b"%010d 00000 n \n" % offsets[number])
+        else:
+            xref.append(b"0000000000 65535 f \n")
+    xref.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, position))
+    yield b"".join(xref)
@@ -0,0 +1,130 @@
+"""
+Generación de boletas en segundo plano.
+
+POST /invoices/ crea la fila con status "pending" y encola el render del PDF
+en un pool de procesos (ReportLab es CPU puro y no debe ocupar al worker que
+atiende la petición). Al terminar, el PDF se guarda y el status pasa a
+"ready" (o "failed"). El id de la boleta es el id del trabajo.
+
+El pool usa el contexto "spawn": se crea tarde, cuando ya corren otros hilos
+(chequeo de réplicas, flusher de carritos), y un fork copiaría sus locks
+tomados. Guardar el resultado (blob + UPDATE) no se hace en el callback del
+future, que corre en el hilo que administra el pool, sino en un hilo aparte.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy.orm import defer
+from models import db, Invoice, Order
+from pdf_generator import generar_boleta_pdf
+import blob_store
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+_executor = None
+_storer = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _storer
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = current_app.config.get("INVOICE_WORKERS", 2)
+                _storer = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="invoice-store")
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _executor
+
+
+def build_render_data(invoice, order):
+    """Datos que necesita generar_boleta_pdf, a partir de la boleta y su orden."""
+    # Ítems CON IGV (directamente como están guardados)
+    items = [
+        {
+            'code': item.product_code,
+            'name': item.product_name,
+            'quantity': item.quantity,
+            'price': float(item.unit_price),  # ya incluye IGV
+        }
+        for item in order.order_items
+    ]
+    return {
+        'invoiceNumber': invoice.invoice_number,
+        'date': invoice.created_at.strftime('%Y-%m-%d %H:%M') if invoice.created_at else '',
+        'customerName': invoice.customer_name,
+        'customerDni': invoice.customer_dni,
+        'customerEmail': order.user.email if order.user else '',
+        'customerPhone': (order.shipping_address or {}).get('phone', ''),
+        'items': items,
+    }
+
+
+def _store_result(invoice_id, pdf_bytes=None, error=None):
+    if error is None:
+        key = blob_store.get_blob_store().put(pdf_bytes)
+        values = {"status": READY, "pdf_key": key, "pdf_size": len(pdf_bytes)}
+    else:
+        values = {"status": FAILED}
+    Invoice.query.filter_by(id=invoice_id).update(values, synchronize_session=False)
+    db.session.commit()
+    if error is not None:
+        logger.error("No se pudo generar la boleta %s: %s", invoice_id, error)
+
+
+def _on_done(app, invoice_id, future):
+    # Corre en un hilo de _storer: necesita su propio contexto de app (y sesión)
+    with app.app_context():
+        try:
+            error = future.exception()
+            _store_result(invoice_id, None if error else future.result(), error)
+        except Exception:
+            logger.exception("Error guardando la boleta %s", invoice_id)
+
+
+def submit(invoice_id, render_data):
+    """Encola el render; con INVOICE_ASYNC=False lo hace en línea (desarrollo)."""
+    app = current_app._get_current_object()
+    if not app.config.get("INVOICE_ASYNC", True):
+        render_now(invoice_id, render_data)
+        return
+    future = _get_executor().submit(generar_boleta_pdf, render_data)
+    # El callback solo encola: el hilo que administra el pool no hace I/O
+    future.add_done_callback(lambda f: _storer.submit(_on_done, app, invoice_id, f))
+
+
+def render_now(invoice_id, render_data):
+    try:
+        pdf_bytes = generar_boleta_pdf(render_data)
+    except Exception as e:
+        _store_result(invoice_id, error=e)
+        return False
+    _store_result(invoice_id, pdf_bytes)
+    return True
+
+
+def requeue_pending():
+    """
+    Vuelve a generar las boletas que quedaron en "pending" o "failed"
+    (p. ej. si el proceso se reinició con trabajos en cola). Corre en línea.
+    """
+    invoices = (
+        Invoice.query
+        .options(defer(Invoice.pdf_data))
+        .filter(Invoice.status.in_([PENDING, FAILED]))
+        .all()
+    )
+    done = 0
+    for invoice in invoices:
+        order = Order.query.get(invoice.order_id)
+        if order and render_now(invoice.id, build_render_data(invoice, order)):
+            done += 1
+    return done, len(invoices)
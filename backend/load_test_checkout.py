@@ -0,0 +1,93 @@
+"""
+Prueba de carga del descuento de stock: muchas compras simultáneas del mismo
+producto. Verifica que no haya sobreventa (vendidas == stock inicial cuando
+hay más compradores que unidades) y que el stock nunca quede negativo.
+
+Usa la base de datos configurada en DATABASE_URL (crea y luego borra un
+producto de prueba y sus órdenes por crud, así los contadores del panel y
+los rollups de ventas quedan como estaban).
+
+Uso: python load_test_checkout.py [compras] [stock_inicial] [hilos]
+     python load_test_checkout.py 300 50 64
+"""
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from app import app
+from database import db
+from models import Product, OrderItem
+from stock import InsufficientStock
+import crud
+
+
+def checkout(product_id):
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            order = crud.create_order({
+                "payment_method": "tarjeta",
+                "notes": "load_test_checkout",
+                "items": [{"product_id": product_id, "quantity": 1, "price": 1.0}],
+            })
+            return "ok", order.id, time.perf_counter() - started
+        except InsufficientStock:
+            return "sin_stock", None, time.perf_counter() - started
+        except Exception as e:
+            db.session.rollback()
+            return f"error: {type(e).__name__}: {e}", None, time.perf_counter() - started
+
+
+def main(orders=300, initial_stock=50, threads=64):
+    with app.app_context():
+        product = crud.create_product({
+            "product_code": f"LOADTEST-{uuid.uuid4().hex[:8]}",
+            "name": "Producto de prueba de carga",
+            "price": 1,
+            "stock": initial_stock,
+            "is_active": False,
+        })
+        product_id = product.id
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(checkout, [product_id] * orders))
+    elapsed = time.perf_counter() - started
+
+    outcomes = {}
+    for outcome, _, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    latencies = sorted(r[2] for r in results)
+    order_ids = [r[1] for r in results if r[1]]
+
+    with app.app_context():
+        final_stock = db.session.query(Product.stock).filter_by(id=product_id).scalar()
+        sold = db.session.query(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)) \
+            .filter(OrderItem.product_id == product_id).scalar()
+
+        print(f"compras: {orders}  stock inicial: {initial_stock}  hilos: {threads}")
+        print(f"tiempo total: {elapsed:.2f}s  ({orders / elapsed:.0f} compras/s)")
+        print(f"latencia p50: {latencies[len(latencies) // 2] * 1000:.1f} ms  "
+              f"p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms  "
+              f"máx: {latencies[-1] * 1000:.1f} ms")
+        for outcome, count in sorted(outcomes.items()):
+            print(f"  {outcome}: {count}")
+        print(f"vendidas: {sold}  stock final: {final_stock}")
+
+        ok = final_stock is not None and final_stock >= 0 and sold + final_stock == initial_stock
+        ok = ok and sold == outcomes.get("ok", 0)
+        errors = any(o.startswith("error") for o in outcomes)
+        if orders >= initial_stock and not errors:
+            ok = ok and final_stock == 0
+        print("OK: sin sobreventa" if ok else "FALLA: el stock no cuadra")
+
+        # Limpieza por crud: pasa por admin_stats y marca los días de ventas a recalcular
+        for order_id in order_ids:
+            crud.delete_order(order_id)
+        crud.delete_product(product_id)
+    return ok
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:4]]
+    sys.exit(0 if main(*args) else 1)
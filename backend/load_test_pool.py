@@ -0,0 +1,90 @@
+"""
+Prueba de carga del pool de conexiones: rondas con cada vez más hilos que
+toman una conexión, ejecutan una consulta y la retienen `hold_ms` (simula
+una petición con trabajo en la base). Muestra, por ronda, el rendimiento,
+la espera de checkout (pool_metrics), el pico de conexiones en uso y los
+timeouts, para ver dónde se satura DB_POOL_SIZE + DB_MAX_OVERFLOW.
+
+Usa la base de datos y la configuración del pool del entorno (DATABASE_URL,
+DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, ...). No escribe nada.
+
+Uso: python load_test_pool.py [peticiones_por_hilo] [hold_ms] [hilos,...]
+     DB_POOL_SIZE=5 DB_MAX_OVERFLOW=5 DB_POOL_TIMEOUT=2 python load_test_pool.py 20 50 5,10,20,40
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from app import app
+from database import db
+import pool_metrics
+
+
+def request_like(hold_seconds):
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            db.session.execute(text("SELECT 1"))
+            time.sleep(hold_seconds)
+            return "ok", time.perf_counter() - started
+        except Exception as e:
+            return type(e).__name__, time.perf_counter() - started
+        finally:
+            db.session.remove()
+
+
+def run_round(threads, per_thread, hold_seconds):
+    pool_metrics.reset()
+    total = threads * per_thread
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(request_like, [hold_seconds] * total))
+    elapsed = time.perf_counter() - started
+
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    latencies = sorted(latency for _, latency in results)
+    metrics = pool_metrics.snapshot()
+    # Sin TimedQueuePool (p. ej. SQLite) la espera de checkout no se mide
+    timed = any(bucket["count"] for bucket in metrics["wait_buckets"])
+    wait = (
+        f"{metrics['wait_seconds_avg'] * 1000:>9.1f} {metrics['wait_seconds_max'] * 1000:>9.1f}"
+        if timed else f"{'n/d':>9} {'n/d':>9}"
+    )
+    print(
+        f"{threads:>6} {total / elapsed:>8.0f} "
+        f"{latencies[len(latencies) // 2] * 1000:>8.1f} {latencies[int(len(latencies) * 0.99) - 1] * 1000:>8.1f} "
+        f"{wait} "
+        f"{metrics['max_checked_out']:>6} {metrics['checkout_timeouts']:>8}  "
+        + ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items()) if k != "ok")
+    )
+    return metrics
+
+
+def main(per_thread=20, hold_ms=50, thread_counts=None):
+    with app.app_context():
+        engine = db.engine
+    pool = engine.pool
+    capacity = None
+    if hasattr(pool, "size"):
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        print(f"pool: {type(pool).__name__} size={pool.size()} max_overflow={pool._max_overflow} "
+              f"timeout={pool.timeout()}s  capacidad={capacity}")
+    if not thread_counts:
+        base = capacity or 10
+        thread_counts = sorted({max(base // 2, 1), base, base * 2, base * 4})
+
+    print(f"{'hilos':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'espera ms':>9} {'máx ms':>9} "
+          f"{'pico':>6} {'timeouts':>8}")
+    for threads in thread_counts:
+        run_round(threads, per_thread, hold_ms / 1000)
+    # Por encima de la capacidad el rendimiento deja de subir y la espera de
+    # checkout crece con los hilos; con DB_POOL_TIMEOUT corto aparecen timeouts.
+
+
+if __name__ == "__main__":
+    per_thread = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    hold_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    threads = [int(t) for t in sys.argv[3].split(",")] if len(sys.argv) > 3 else None
+    main(per_thread, hold_ms, threads)
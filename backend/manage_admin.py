@@ -2,7 +2,7 @@ import sys
 import uuid
 from app import app, db
 from models import User
-from werkzeug.security import generate_password_hash
+import passwords
 
 def create_admin(email, password, full_name="Administrador", role="admin"):
     with app.app_context():
@@ -12,7 +12,7 @@ def create_admin(email, password, full_name="Administrador", role="admin"):
         user = User(
             id=str(uuid.uuid4()),  # Genera un UUID
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=passwords.hash_password(password),
             full_name=full_name,
             role=role
         )
@@ -37,7 +37,7 @@ def update_admin(email, new_password=None, new_name=None):
             print("No se encontró un admin con ese email.")
             return
         if new_password:
-            user.password_hash = generate_password_hash(new_password)
+            user.password_hash = passwords.hash_password(new_password)
             print("Contraseña actualizada.")
         if new_name:
             user.full_name = new_name
@@ -1,10 +1,35 @@
 from database import db
-from sqlalchemy.dialects.mysql import JSON, LONGBLOB
+from sqlalchemy.dialects.mysql import DATETIME, JSON, LONGBLOB
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import FunctionElement
+from datetime import datetime
+from decimal import Decimal
 import uuid
+from clock import now_lima
+
+# Marcas de versión (ETag por watermark, ver http_cache.py): con microsegundos
+# en MySQL, dos cambios en el mismo segundo no dejan el mismo MAX(updated_at).
+# Altas y ediciones las marca el ORM con clock.now_lima (un solo reloj); el
+# server_default solo cubre inserciones hechas fuera de la app
+PreciseDateTime = db.DateTime().with_variant(DATETIME(fsp=6), 'mysql')
+
+class precise_now(FunctionElement):
+    """NOW(6) en MySQL; CURRENT_TIMESTAMP en los demás motores."""
+    type = db.DateTime()
+    inherit_cache = True
+
+@compiles(precise_now)
+def _precise_now(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+@compiles(precise_now, 'mysql')
+def _precise_now_mysql(element, compiler, **kw):
+    return "NOW(6)"
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (db.Index('ix_users_full_name', 'full_name'),)
     id = db.Column(db.String(36), primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
@@ -27,13 +52,14 @@ class User(db.Model):
 
 class Category(db.Model):
     __tablename__ = 'categories'
+    __table_args__ = (db.Index('ix_categories_updated_at', 'updated_at'),)
     id = db.Column(db.String(36), primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
     sort_order = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, server_default=func.now())
-    updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
+    updated_at = db.Column(PreciseDateTime, default=now_lima, onupdate=now_lima, server_default=precise_now())
     products = db.relationship("Product", back_populates="category", cascade="all, delete-orphan")
 
     def to_dict(self):
@@ -49,13 +75,22 @@ class Category(db.Model):
 
 class Product(db.Model):
     __tablename__ = 'products'
+    # Índices para la paginación por cursor de GET /products/ (orden + id de desempate)
+    __table_args__ = (
+        db.Index('ix_products_name_id', 'name', 'id'),
+        db.Index('ix_products_price_id', 'price', 'id'),
+        db.Index('ix_products_stock_id', 'stock', 'id'),
+        db.Index('ix_products_created_at_id', 'created_at', 'id'),
+        # MAX(updated_at) para los ETag del catálogo
+        db.Index('ix_products_updated_at', 'updated_at'),
+    )
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     product_code = db.Column(db.String(50), unique=True, nullable=False)
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
     long_description = db.Column(db.Text)
     price = db.Column(db.Numeric(10, 2), nullable=False)
-    stock = db.Column(db.Integer, default=0)
+    stock = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     min_stock = db.Column(db.Integer, default=5)
     category_id = db.Column(db.String(36), db.ForeignKey('categories.id'))
     brand = db.Column(db.String(100))
@@ -69,12 +104,32 @@ class Product(db.Model):
     dimensions = db.Column(db.String(100))
     warranty_months = db.Column(db.Integer, default=12)
     created_at = db.Column(db.DateTime, server_default=func.now())
-    updated_at = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
+    updated_at = db.Column(PreciseDateTime, default=now_lima, onupdate=now_lima, server_default=precise_now())
     category = db.relationship("Category", back_populates="products")
     cart_items = db.relationship("CartItem", back_populates="product")
     order_items = db.relationship("OrderItem", back_populates="product")
 
-    def to_dict(self):
+    # Campos que se pueden pedir con ?fields= en el listado de productos
+    FIELDS = (
+        "id", "product_code", "name", "description", "long_description", "price", "stock",
+        "min_stock", "category_id", "brand", "model", "image_url", "image_urls", "specifications",
+        "features", "is_active", "weight", "dimensions", "warranty_months", "created_at", "updated_at",
+    )
+
+    def to_dict(self, fields=None):
+        if fields is not None:
+            # Solo toca los atributos pedidos para no disparar cargas de columnas diferidas
+            data = {}
+            for field in fields:
+                value = getattr(self, field)
+                if isinstance(value, Decimal):
+                    value = float(value)
+                elif isinstance(value, datetime):
+                    value = value.isoformat()
+                elif value is None and field in ("description", "long_description"):
+                    value = ""
+                data[field] = value
+            return data
         return {
             "id": self.id,
             "product_code": self.product_code,
@@ -140,8 +195,70 @@ class CartItem(db.Model):
             "stock": self.product.stock if self.product else None,       # stock actual del producto
         }
 
+class StockHold(db.Model):
+    """Unidades apartadas para el carrito de un usuario hasta expires_at (ver stock.py)."""
+    __tablename__ = 'stock_holds'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='uq_stock_holds_user_product'),
+        db.Index('ix_stock_holds_product_expires', 'product_id', 'expires_at'),
+        db.Index('ix_stock_holds_expires_at', 'expires_at'),
+    )
+    id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    product_id = db.Column(db.String(36), db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=func.now())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "product_id": self.product_id,
+            "quantity": self.quantity,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+class AdminStat(db.Model):
+    """Contador agregado del panel (ver admin_stats.py): total y monto por métrica, dimensión y shard."""
+    __tablename__ = 'admin_stats'
+    metric = db.Column(db.String(30), primary_key=True)
+    dimension = db.Column(db.String(50), primary_key=True, default='')
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0, autoincrement=False)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class SalesRollup(db.Model):
+    """Ventas agregadas por periodo (hour/day/month) y dimensión (ver sales_analytics.py)."""
+    __tablename__ = 'sales_rollups'
+    __table_args__ = (
+        db.Index('ix_sales_rollups_top', 'granularity', 'dimension', 'bucket_start', 'dim_key'),
+    )
+    granularity = db.Column(db.String(5), primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)
+    # Id de producto/categoría o marca: tan ancho como Product.brand
+    dim_key = db.Column(db.String(100), primary_key=True, default='')
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class SalesDirtyDay(db.Model):
+    """Días con órdenes modificadas cuyo rollup falta recalcular."""
+    __tablename__ = 'sales_dirty_days'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    day = db.Column(db.DateTime, nullable=False)
+
 class Order(db.Model):
     __tablename__ = 'orders'
+    # Filtros del listado de órdenes; todos terminan en (created_at, id) para la paginación por cursor
+    __table_args__ = (
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_orders_payment_method_created_at', 'payment_method', 'created_at', 'id'),
+        db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at', 'id'),
+    )
     id = db.Column(db.String(36), primary_key=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'))
@@ -201,13 +318,21 @@ class OrderItem(db.Model):
 
 class Invoice(db.Model):
     __tablename__ = 'invoices'
+    __table_args__ = (db.Index('ix_invoices_order_id_created_at', 'order_id', 'created_at'),)
     id = db.Column(db.String(36), primary_key=True)
     order_id = db.Column(db.String(36), db.ForeignKey('orders.id'))
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)
     customer_name = db.Column(db.String(255))
     customer_dni = db.Column(db.String(20))
-    pdf_data = db.Column(LONGBLOB)
+    # Legado: los PDF nuevos van al almacén de blobs (pdf_key = SHA-256 del archivo)
+    pdf_data = db.Column(db.LargeBinary().with_variant(LONGBLOB, 'mysql'))
+    pdf_key = db.Column(db.String(64), index=True)
+    pdf_size = db.Column(db.Integer)
+    # Estado del PDF: pending (en cola), ready o failed (ver invoice_jobs.py)
+    status = db.Column(db.String(20), nullable=False, default='ready', server_default='ready')
     created_at = db.Column(db.DateTime, server_default=func.now())
+    # Cambia con el status y el pdf_key: versión para los ETag de /invoices
+    updated_at = db.Column(PreciseDateTime, default=now_lima, onupdate=now_lima, server_default=precise_now(), index=True)
     order = db.relationship("Order", back_populates="invoices")
 
     def to_dict(self):
@@ -217,6 +342,7 @@ class Invoice(db.Model):
             "invoice_number": self.invoice_number,
             "customer_name": self.customer_name,
             "customer_dni": self.customer_dni,
+            "status": self.status,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
 
@@ -0,0 +1,92 @@
+"""
+Exportación de órdenes y líneas de orden en CSV o NDJSON, en streaming.
+
+Las filas salen de un SELECT de columnas (sin objetos ORM ni to_dict) leído
+con yield_per, que en MySQL usa un cursor del lado del servidor: en memoria
+solo hay un lote a la vez y la cabecera se envía antes de ejecutar la
+consulta. Los filtros son los mismos de GET /orders/ (crud.order_criteria).
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import select
+from models import db, Order, OrderItem
+import crud
+
+MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+YIELD_PER = 1000
+
+ORDER_COLUMNS = [
+    Order.id, Order.order_number, Order.user_id, Order.total_amount, Order.status,
+    Order.payment_method, Order.shipping_address, Order.tracking_number, Order.notes,
+    Order.created_at, Order.updated_at,
+]
+
+LINE_COLUMNS = [
+    OrderItem.id, OrderItem.order_id,
+    Order.order_number, Order.status, Order.payment_method,
+    Order.created_at.label("order_created_at"),
+    OrderItem.product_id, OrderItem.product_code, OrderItem.product_name,
+    OrderItem.quantity, OrderItem.unit_price, OrderItem.total_price,
+]
+
+
+def orders_statement(filters):
+    return (
+        select(*ORDER_COLUMNS)
+        .where(*crud.order_criteria(**filters))
+        .order_by(Order.created_at, Order.id)
+    )
+
+
+def lines_statement(filters):
+    # Se recorre orders por su índice (created_at, id) y se buscan sus líneas por order_id
+    return (
+        select(*LINE_COLUMNS)
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(*crud.order_criteria(**filters))
+        .order_by(Order.created_at, Order.id)
+    )
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def stream(statement, export_format):
+    """Genera el archivo por trozos: la cabecera y luego un trozo por lote de filas."""
+    statement = statement.execution_options(yield_per=YIELD_PER)
+    names = [column.name for column in statement.selected_columns]
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        yield buffer.getvalue()
+        for rows in db.session.execute(statement).partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_csv_value(v) for v in row] for row in rows)
+            yield buffer.getvalue()
+    else:
+        yield ""  # la respuesta arranca antes de la consulta, igual que con CSV
+        for rows in db.session.execute(statement).partitions():
+            yield "".join(
+                json.dumps({name: _json_value(v) for name, v in zip(names, row)}, ensure_ascii=False) + "\n"
+                for row in rows
+            )
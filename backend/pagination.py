@@ -0,0 +1,90 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import and_, or_
+
+# Tamaño de página por defecto y máximo para los listados paginados
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$dec": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+        if "$dec" in value:
+            return Decimal(value["$dec"])
+    return value
+
+
+def encode_cursor(sort_mode, values):
+    """Empaqueta el modo de orden y las claves de la última fila en un token opaco."""
+    payload = {"s": sort_mode, "k": [_encode_value(v) for v in values]}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, sort_mode):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        values = [_decode_value(v) for v in payload["k"]]
+    except Exception:
+        raise InvalidCursor("Cursor inválido")
+    if payload.get("s") != sort_mode:
+        raise InvalidCursor("El cursor no corresponde al orden solicitado")
+    return values
+
+
+def parse_limit(value):
+    if value is None or value == "":
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit debe ser un número entero")
+    if limit < 1:
+        raise ValueError("limit debe ser mayor que 0")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def keyset_paginate(query, columns, descending, limit, sort_mode, cursor=None, key=None):
+    """
+    Paginación por clave (keyset) sobre `columns`, que debe terminar en una
+    columna única (el id) para que el orden sea total y estable.
+    `key(row)` devuelve los valores de esas columnas para una fila.
+    Devuelve (filas, next_cursor); next_cursor es None en la última página.
+    """
+    if cursor:
+        values = decode_cursor(cursor, sort_mode)
+        if len(values) != len(columns):
+            raise InvalidCursor("Cursor inválido")
+        # (c1, c2, ...) > (v1, v2, ...) expandido para que el motor use el índice
+        conditions = []
+        for i, column in enumerate(columns):
+            prefix = [columns[j] == values[j] for j in range(i)]
+            step = column < values[i] if descending else column > values[i]
+            conditions.append(and_(*prefix, step))
+        query = query.filter(or_(*conditions))
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort_mode, key(rows[-1]))
+    return rows, next_cursor
@@ -0,0 +1,116 @@
+"""
+Hash y verificación de contraseñas fuera del worker que atiende la petición.
+
+scrypt/pbkdf2 son lentos a propósito: una ráfaga de logins en línea ocupa
+todos los workers y el catálogo, los health checks, etc. quedan en cola.
+Aquí corren en un pool de procesos propio (como las boletas, invoice_jobs)
+de PASSWORD_WORKERS procesos, con control de admisión: como mucho
+PASSWORD_WORKERS + PASSWORD_QUEUE_SIZE operaciones en curso o en cola; la
+siguiente recibe PasswordBusy al instante (503 con Retry-After) en vez de
+esperar. Una operación que no termina en PASSWORD_TIMEOUT segundos también.
+
+PASSWORD_HASH_METHOD es el método y factor de trabajo de werkzeug (p. ej.
+"scrypt:32768:8:1" o "pbkdf2:sha256:600000"). Al hacer login con un hash de
+otro método, el mismo trabajo del pool genera el hash nuevo (rehash-on-login).
+
+El pool se crea en el primer uso, con otros hilos ya corriendo (chequeo de
+réplicas, flusher de carritos): usa "spawn" para no heredar sus locks.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+_methods = {}
+
+
+class PasswordBusy(RuntimeError):
+    """No hay capacidad para hashear ahora; reintentar en `retry_after` segundos."""
+
+    def __init__(self, retry_after=1):
+        self.retry_after = retry_after
+        super().__init__("Servicio de autenticación ocupado, intenta de nuevo en unos segundos")
+
+
+def _get_executor():
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                config = current_app.config
+                workers = config.get("PASSWORD_WORKERS", 2)
+                _slots = threading.BoundedSemaphore(workers + config.get("PASSWORD_QUEUE_SIZE", 16))
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _executor
+
+
+def method_of(password_hash):
+    """Método con parámetros de un hash de werkzeug ("scrypt:32768:8:1$sal$hash")."""
+    return password_hash.split("$", 1)[0]
+
+
+def configured_method():
+    """PASSWORD_HASH_METHOD con los parámetros por defecto de werkzeug completos."""
+    method = current_app.config.get("PASSWORD_HASH_METHOD", "scrypt")
+    if method not in _methods:
+        _methods[method] = method_of(generate_password_hash("", method=method))
+    return _methods[method]
+
+
+def needs_rehash(password_hash):
+    return method_of(password_hash) != configured_method()
+
+
+# --- Trabajo que corre en el pool (funciones de módulo: se envían por pickle) ---
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(password_hash, password, rehash_method):
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if rehash_method is None:
+        return True, None
+    return True, generate_password_hash(password, method=rehash_method)
+
+
+def _run(fn, *args):
+    config = current_app.config
+    if not config.get("PASSWORD_WORKERS", 2):
+        # Sin pool (desarrollo, scripts): en línea
+        return fn(*args)
+    executor = _get_executor()
+    if not _slots.acquire(blocking=False):
+        raise PasswordBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    # El cupo se libera al terminar el trabajo, aunque la petición ya no espere
+    future.add_done_callback(lambda f: _slots.release())
+    try:
+        return future.result(timeout=config.get("PASSWORD_TIMEOUT", 5))
+    except FutureTimeout:
+        raise PasswordBusy()
+
+
+def hash_password(password):
+    return _run(_hash, password, configured_method())
+
+
+def verify_password(password_hash, password):
+    """
+    (válida, hash_nuevo): hash_nuevo viene si la contraseña es válida y el
+    hash guardado usa otro método o factor de trabajo; hay que guardarlo.
+    """
+    method = configured_method()
+    rehash_method = method if method_of(password_hash) != method else None
+    return _run(_verify, password_hash, password, rehash_method)
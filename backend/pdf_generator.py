@@ -1,70 +1,125 @@
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle, Paragraph
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.lib.enums import TA_LEFT
+from reportlab.platypus import Table, TableStyle
+from reportlab.lib.utils import simpleSplit
 from io import BytesIO
 from datetime import datetime
 import pytz
 
-def generar_boleta_pdf(data):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # COLORES CORPORATIVOS
-    azul = colors.Color(59/255, 130/255, 246/255)
-    verde = colors.Color(34/255, 197/255, 94/255)
-    gris_oscuro = colors.Color(55/255, 65/255, 81/255)
-    gris_claro = colors.Color(243/255, 244/255, 246/255)
-    blanco = colors.white
-
-    MARGIN_LEFT = 30
-    HEADER_HEIGHT = 120
-
+# --- Recursos estáticos: se crean una sola vez por proceso, no por boleta ---
+
+# COLORES CORPORATIVOS
+azul = colors.Color(59/255, 130/255, 246/255)
+verde = colors.Color(34/255, 197/255, 94/255)
+gris_oscuro = colors.Color(55/255, 65/255, 81/255)
+gris_claro = colors.Color(243/255, 244/255, 246/255)
+blanco = colors.white
+
+WIDTH, HEIGHT = A4
+MARGIN_LEFT = 30
+HEADER_HEIGHT = 120
+COL_WIDTHS = [90, 200, 50, 90, 90]  # Aumentamos ancho de "Código" y "Producto"
+TABLE_HEADER = ["Código", "Producto", "Cantidad", "Precio Unit", "Total (s/IGV)"]
+
+# La tabla no baja de aquí (encima del pie de página)
+TABLE_BOTTOM = 90
+# Alto que ocupan los totales debajo de la tabla
+TOTALS_HEIGHT = 90
+
+# Texto largo: se parte en líneas una sola vez al armar la fila (con Paragraph
+# la tabla volvía a medir cada celda en cada wrap/split/draw)
+CELL_FONT = "Helvetica"
+CELL_FONT_SIZE = 10
+CELL_PADDING = 6  # padding izquierdo/derecho por defecto de Table
+# Una fila nunca supera este número de líneas; el resto sigue en filas de
+# continuación (una fila más alta que la página no se podría partir)
+MAX_CELL_LINES = 30
+
+# Estilo de tabla
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), azul),
+    ('TEXTCOLOR', (0, 0), (-1, 0), blanco),
+    ('ALIGN', (2, 1), (-1, -1), 'CENTER'),
+    ('ALIGN', (0, 1), (1, -1), 'LEFT'),
+    ('GRID', (0, 0), (-1, -1), 0.3, colors.lightgrey),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+])
+
+# Nombres de los form XObjects: la parte fija de la página se dibuja una vez
+# por documento y cada página solo la referencia
+HEADER_FORM = "boleta_header"
+FOOTER_FORM = "boleta_footer"
+
+
+def _define_forms(c):
     # --- HEADER azul
+    c.beginForm(HEADER_FORM)
     c.setFillColor(azul)
-    c.rect(0, height-HEADER_HEIGHT, width, HEADER_HEIGHT, fill=1, stroke=0)
+    c.rect(0, HEIGHT-HEADER_HEIGHT, WIDTH, HEADER_HEIGHT, fill=1, stroke=0)
     c.setFillColor(verde)
-    c.rect(0, height-HEADER_HEIGHT-10, width, 20, fill=1, stroke=0)
+    c.rect(0, HEIGHT-HEADER_HEIGHT-10, WIDTH, 20, fill=1, stroke=0)
 
     # Ícono PC
     c.setFillColor(blanco)
-    c.roundRect(22, height-HEADER_HEIGHT+35, 40, 30, 5, fill=1)
+    c.roundRect(22, HEIGHT-HEADER_HEIGHT+35, 40, 30, 5, fill=1)
     c.setFillColor(azul)
-    c.rect(35, height-HEADER_HEIGHT+32, 18, 4, fill=1)
+    c.rect(35, HEIGHT-HEADER_HEIGHT+32, 18, 4, fill=1)
 
     # Empresa
     c.setFont("Helvetica-Bold", 32)
     c.setFillColor(blanco)
-    c.drawString(80, height-HEADER_HEIGHT+60, "PCDos2")
+    c.drawString(80, HEIGHT-HEADER_HEIGHT+60, "PCDos2")
     c.setFont("Helvetica", 15)
-    c.drawString(80, height-HEADER_HEIGHT+35, "Componentes de PC")
-    c.drawString(80, height-HEADER_HEIGHT+18, "RUC: 20123456789")
+    c.drawString(80, HEIGHT-HEADER_HEIGHT+35, "Componentes de PC")
+    c.drawString(80, HEIGHT-HEADER_HEIGHT+18, "RUC: 20123456789")
 
     # Boleta de venta
     c.setFillColor(verde)
-    c.rect(width-180, height-HEADER_HEIGHT+60, 150, 36, fill=1, stroke=0)
+    c.rect(WIDTH-180, HEIGHT-HEADER_HEIGHT+60, 150, 36, fill=1, stroke=0)
     c.setFont("Helvetica-Bold", 15)
     c.setFillColor(blanco)
-    c.drawCentredString(width-105, height-HEADER_HEIGHT+80, "BOLETA DE VENTA")
+    c.drawCentredString(WIDTH-105, HEIGHT-HEADER_HEIGHT+80, "BOLETA DE VENTA")
+    c.endForm()
+
+    # Footer
+    c.beginForm(FOOTER_FORM)
+    c.setFont("Helvetica-Bold", 13)
+    c.setFillColor(verde)
+    c.drawCentredString(WIDTH/2, 70, "¡Gracias por tu compra!")
+    c.setFont("Helvetica", 10)
+    c.setFillColor(gris_oscuro)
+    c.drawCentredString(WIDTH/2, 55, "PCDos2 - Tu tienda de confianza para componentes de PC")
+    c.endForm()
+
+
+def _start_page(c, data, fecha, page):
+    """Parte fija + bloque de número/fecha. Devuelve la altura donde sigue el contenido."""
+    c.doForm(HEADER_FORM)
+    c.doForm(FOOTER_FORM)
 
     # --- Boleta Nº y Fecha
-    block_y = height-HEADER_HEIGHT-65
-    lima_now = datetime.now(pytz.timezone("America/Lima")).strftime("%Y-%m-%d %H:%M")
+    block_y = HEIGHT-HEADER_HEIGHT-65
     c.setFillColor(gris_claro)
-    c.rect(MARGIN_LEFT, block_y, width - 2*MARGIN_LEFT, 48, fill=1, stroke=0)
+    c.rect(MARGIN_LEFT, block_y, WIDTH - 2*MARGIN_LEFT, 48, fill=1, stroke=0)
     c.setFillColor(gris_oscuro)
     c.setFont("Helvetica-Bold", 14)
     c.drawString(MARGIN_LEFT + 20, block_y + 30, f"Boleta N°: {data['invoiceNumber']}")
-    c.drawString(MARGIN_LEFT + 20, block_y + 12, f"Fecha: {lima_now}")
+    c.drawString(MARGIN_LEFT + 20, block_y + 12, f"Fecha: {fecha}")
+    if page > 1:
+        c.setFont("Helvetica", 11)
+        c.drawRightString(WIDTH - MARGIN_LEFT - 20, block_y + 12, f"Página {page} (continuación)")
+    return block_y - 50
 
-    current_y = block_y - 50
 
+def _draw_customer(c, data, current_y):
     # --- Datos del cliente
     c.setFillColor(azul)
-    c.rect(MARGIN_LEFT, current_y, width - 2*MARGIN_LEFT, 22, fill=1, stroke=0)
+    c.rect(MARGIN_LEFT, current_y, WIDTH - 2*MARGIN_LEFT, 22, fill=1, stroke=0)
     c.setFont("Helvetica-Bold", 13)
     c.setFillColor(blanco)
     c.drawString(MARGIN_LEFT + 12, current_y + 7, "DATOS DEL CLIENTE")
@@ -73,76 +128,64 @@ def generar_boleta_pdf(data):
     c.setFillColor(gris_oscuro)
     c.setFont("Helvetica", 11)
     c.drawString(MARGIN_LEFT + 20, current_y + 16, f"Nombre: {data.get('customerName', '')}")
-    c.drawString(width/2 + 25, current_y + 16, f"DNI: {data.get('customerDni', '')}")
+    c.drawString(WIDTH/2 + 25, current_y + 16, f"DNI: {data.get('customerDni', '')}")
     current_y -= 17
     c.drawString(MARGIN_LEFT + 20, current_y + 16, f"Correo: {data.get('customerEmail', '')}")
     phone = data.get('customerPhone')
     if phone:
-        c.drawString(width/2 + 25, current_y + 16, f"Teléfono: {phone}")
+        c.drawString(WIDTH/2 + 25, current_y + 16, f"Teléfono: {phone}")
     current_y -= 38
 
     # --- Detalle de productos
     c.setFillColor(verde)
-    c.rect(MARGIN_LEFT, current_y, width - 2*MARGIN_LEFT, 22, fill=1, stroke=0)
+    c.rect(MARGIN_LEFT, current_y, WIDTH - 2*MARGIN_LEFT, 22, fill=1, stroke=0)
     c.setFont("Helvetica-Bold", 13)
     c.setFillColor(blanco)
     c.drawString(MARGIN_LEFT + 12, current_y + 7, "DETALLE DE PRODUCTOS")
-    current_y -= 30
+    return current_y - 8
+
 
-    # Estilo para texto largo
-    styles = getSampleStyleSheet()
-    style_left = ParagraphStyle('left', parent=styles['Normal'], fontName='Helvetica', fontSize=10, alignment=TA_LEFT)
+def _wrap_cell(text, col):
+    width = COL_WIDTHS[col] - 2 * CELL_PADDING
+    lines = simpleSplit(str(text), CELL_FONT, CELL_FONT_SIZE, width) or [""]
+    return ["\n".join(lines[i:i + MAX_CELL_LINES]) for i in range(0, len(lines), MAX_CELL_LINES)]
 
-    # Cabecera de tabla
-    table_data = [
-        ["Código", "Producto", "Cantidad", "Precio Unit", "Total (s/IGV)"]
-    ]
 
+def _build_rows(items):
+    rows = [TABLE_HEADER]
     subtotal = 0.0
-    for item in data["items"]:
-        code = Paragraph(item.get("code", ""), style_left)
-        name = Paragraph(item.get("name", ""), style_left)
+    for item in items:
+        code = _wrap_cell(item.get("code", ""), 0)
+        name = _wrap_cell(item.get("name", ""), 1)
         qty = int(item.get("quantity", 1))
         price_con_igv = float(item.get("price", 0.0))
         price_sin_igv = round(price_con_igv / 1.18, 2)
         total_sin_igv = round(price_sin_igv * qty, 2)
         subtotal += total_sin_igv
 
-        table_data.append([
-            code,
-            name,
+        rows.append([
+            code[0],
+            name[0],
             str(qty),
             f"S/{price_sin_igv:.2f}",
             f"S/{total_sin_igv:.2f}",
         ])
+        for i in range(1, max(len(code), len(name))):
+            rows.append([
+                code[i] if i < len(code) else "",
+                name[i] if i < len(name) else "",
+                "", "", "",
+            ])
+    return rows, subtotal
 
-    # Estilo de tabla
-    col_widths = [90, 200, 50, 90, 90]  # Aumentamos ancho de "Código" y "Producto"
-    table = Table(table_data, colWidths=col_widths)
-    style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), azul),
-        ('TEXTCOLOR', (0, 0), (-1, 0), blanco),
-        ('ALIGN', (2, 1), (-1, -1), 'CENTER'),
-        ('ALIGN', (0, 1), (1, -1), 'LEFT'),
-        ('GRID', (0, 0), (-1, -1), 0.3, colors.lightgrey),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-    ])
-    table.setStyle(style)
-    table.wrapOn(c, width, height)
-
-    table_y = current_y - len(table_data) * 24
-    table.drawOn(c, MARGIN_LEFT, table_y)
 
+def _draw_totals(c, subtotal, table_y):
     # Totales
     igv = round(subtotal * 0.18, 2)
     total_final = round(subtotal + igv, 2)
 
     totales_y = table_y - 110
-    box_x = width - 215
+    box_x = WIDTH - 215
     rect_y = totales_y + 28
     rect_height = 40
 
@@ -158,13 +201,50 @@ def generar_boleta_pdf(data):
     c.setFillColor(blanco)
     c.drawCentredString(box_x + 90, rect_y + rect_height/2 + 4, f"TOTAL: S/{total_final:.2f}")
 
-    # Footer
-    c.setFont("Helvetica-Bold", 13)
-    c.setFillColor(verde)
-    c.drawCentredString(width/2, 70, "¡Gracias por tu compra!")
-    c.setFont("Helvetica", 10)
-    c.setFillColor(gris_oscuro)
-    c.drawCentredString(width/2, 55, "PCDos2 - Tu tienda de confianza para componentes de PC")
+
+def generar_boleta_pdf(data):
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    _define_forms(c)
+    # Fecha de emisión (invoice_jobs.build_render_data): un render en cola o
+    # reintentado no debe imprimir la hora en que se generó el PDF
+    fecha = data.get("date") or datetime.now(pytz.timezone("America/Lima")).strftime("%Y-%m-%d %H:%M")
+
+    page = 1
+    current_y = _draw_customer(c, data, _start_page(c, data, fecha, page))
+
+    rows, subtotal = _build_rows(data["items"])
+    # repeatRows=1: la cabecera se repite en cada página si la tabla se parte
+    remaining = Table(rows, colWidths=COL_WIDTHS, repeatRows=1)
+    remaining.setStyle(TABLE_STYLE)
+    avail_width = WIDTH - 2*MARGIN_LEFT
+
+    while True:
+        _, table_height = remaining.wrapOn(c, avail_width, HEIGHT)
+        avail_height = current_y - TABLE_BOTTOM
+        if table_height <= avail_height:
+            table_y = current_y - table_height
+            remaining.drawOn(c, MARGIN_LEFT, table_y)
+            break
+        parts = remaining.split(avail_width, avail_height)
+        if len(parts) >= 2:
+            first, remaining = parts[0], parts[1]
+            _, first_height = first.wrapOn(c, avail_width, avail_height)
+            first.drawOn(c, MARGIN_LEFT, current_y - first_height)
+        elif page > 1:
+            # Ni en una página nueva entra una fila: no seguir agregando páginas
+            raise ValueError("Una fila de la boleta no entra en una página")
+        # No cabe más en esta página: sigue en la siguiente
+        c.showPage()
+        page += 1
+        current_y = _start_page(c, data, fecha, page)
+
+    # Los totales van en la última página; si no entran, en una nueva
+    if table_y - TOTALS_HEIGHT < TABLE_BOTTOM:
+        c.showPage()
+        page += 1
+        table_y = _start_page(c, data, fecha, page)
+    _draw_totals(c, subtotal, table_y)
 
     c.showPage()
     c.save()
@@ -0,0 +1,127 @@
+"""
+Métricas del pool de conexiones del engine (por proceso).
+
+  - espera de checkout: cuánto tarda una petición en conseguir conexión
+    (histograma, suma y máximo); sube cuando el pool está saturado;
+  - conexiones en uso, en reposo y overflow (leídas del pool al consultar);
+  - pico de conexiones en uso, timeouts de checkout, conexiones nuevas,
+    cerradas e invalidadas (pre-ping fallido, error de conexión).
+
+La espera solo se mide con TimedQueuePool (config._engine_options lo usa
+con MySQL); los contadores por eventos sirven con cualquier pool.
+"""
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+# Límites superiores (segundos) del histograma de espera de checkout
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+_lock = threading.Lock()
+_installed = set()
+_engines = []
+
+
+def _empty():
+    return {
+        "checkouts": 0,
+        "checkout_timeouts": 0,
+        "wait_seconds_sum": 0.0,
+        "wait_seconds_max": 0.0,
+        "wait_buckets": [0] * (len(WAIT_BUCKETS) + 1),
+        "max_checked_out": 0,
+        "connects": 0,
+        "closes": 0,
+        "invalidations": 0,
+        "soft_invalidations": 0,
+    }
+
+
+_counters = _empty()
+
+
+def _record_wait(elapsed, timed_out=False):
+    with _lock:
+        if timed_out:
+            _counters["checkout_timeouts"] += 1
+        _counters["wait_seconds_sum"] += elapsed
+        _counters["wait_seconds_max"] = max(_counters["wait_seconds_max"], elapsed)
+        index = next((i for i, limit in enumerate(WAIT_BUCKETS) if elapsed <= limit), len(WAIT_BUCKETS))
+        _counters["wait_buckets"][index] += 1
+
+
+def _count(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que registra la espera de cada checkout (incluye el pre-ping)."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeout:
+            _record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        _record_wait(time.perf_counter() - started)
+        return connection
+
+
+def _on_checkout(engine):
+    pool = engine.pool
+    checked_out = pool.checkedout() if isinstance(pool, QueuePool) else 0
+    with _lock:
+        _counters["checkouts"] += 1
+        _counters["max_checked_out"] = max(_counters["max_checked_out"], checked_out)
+
+
+def install(engine):
+    """Registra los listeners una sola vez por engine (como query_counter)."""
+    if id(engine) in _installed:
+        return
+    event.listen(engine, "checkout", lambda *args: _on_checkout(engine))
+    event.listen(engine, "connect", lambda *args: _count("connects"))
+    event.listen(engine, "close", lambda *args: _count("closes"))
+    event.listen(engine, "invalidate", lambda *args: _count("invalidations"))
+    event.listen(engine, "soft_invalidate", lambda *args: _count("soft_invalidations"))
+    _installed.add(id(engine))
+    _engines.append(engine)
+
+
+def reset():
+    """Pone los contadores en cero (entre rondas de load_test_pool.py)."""
+    global _counters
+    with _lock:
+        _counters = _empty()
+
+
+def snapshot():
+    with _lock:
+        data = {key: list(value) if isinstance(value, list) else value for key, value in _counters.items()}
+    buckets = data["wait_buckets"]
+    data["wait_buckets"] = [
+        {"le": limit, "count": count}
+        for limit, count in zip(WAIT_BUCKETS + ("+Inf",), buckets)
+    ]
+    timed = sum(buckets)
+    data["wait_seconds_avg"] = data["wait_seconds_sum"] / timed if timed else 0.0
+    data["pools"] = []
+    for engine in _engines:
+        pool = engine.pool
+        entry = {"url": engine.url.render_as_string(hide_password=True), "class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                # Negativo mientras el pool todavía no abrió pool_size conexiones
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            })
+        data["pools"].append(entry)
+    return data
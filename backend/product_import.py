@@ -0,0 +1,363 @@
+"""
+Importación masiva de productos (listas de precios de proveedores).
+
+El archivo (CSV con cabecera o JSONL, un objeto por línea) se lee en
+streaming y se procesa por lotes de CHUNK_SIZE filas, cada uno en su propia
+transacción:
+
+  - una consulta trae (con FOR UPDATE) los productos del lote ya existentes
+    por product_code;
+  - los códigos nuevos se insertan con un INSERT multi-fila que ignora el
+    choque con otro alta del mismo código (ON DUPLICATE KEY UPDATE id = id en
+    MySQL); esas filas se bloquean y se actualizan como las existentes, así
+    no se cuentan como creadas;
+  - los existentes se actualizan con un UPDATE por id en executemany, y solo
+    las columnas que trae la fila (una lista de precios puede traer solo
+    product_code y price).
+
+Tras el commit de cada lote se invalidan la caché y los índices en memoria
+una sola vez para todo el lote, no producto por producto.
+
+Una celda CSV vacía significa "no cambiar"; en JSONL, null borra el valor.
+Las filas inválidas (stock negativo, categoría inexistente, bytes que no
+son UTF-8, ...) no frenan la importación: se cuentan como fallidas y se
+informan con su número de línea.
+"""
+import csv
+import json
+import re
+import uuid
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Product, Category
+import admin_stats
+import cache
+import crud
+import facet_index
+import search_index
+
+CHUNK_SIZE = 500
+MAX_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("csv", "jsonl")
+
+# Columnas que se pueden importar (id y fechas las maneja el servidor)
+COLUMNS = tuple(f for f in Product.FIELDS if f not in ("id", "created_at", "updated_at"))
+INT_COLUMNS = {"stock", "min_stock", "warranty_months"}
+DECIMAL_COLUMNS = {"price", "weight"}
+JSON_COLUMNS = {"image_urls", "specifications", "features"}
+BOOL_COLUMNS = {"is_active"}
+NOT_NULL_COLUMNS = {"product_code", "name", "price", "stock"}
+# Valores por defecto de un alta, como en crud.create_product
+NEW_DEFAULTS = {"stock": 0, "min_stock": 5, "is_active": True, "warranty_months": 12}
+
+# Bytes no UTF-8 que deja errors="surrogateescape" al decodificar
+UNDECODABLE = re.compile("[\udc80-\udcff]")
+
+TRUE_VALUES = {"1", "true", "si", "sí", "yes", "y"}
+FALSE_VALUES = {"0", "false", "no", "n"}
+
+
+class RowError(ValueError):
+    pass
+
+
+def format_from_filename(filename):
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    return "csv" if extension == "csv" else None
+
+
+def read_rows(stream, format):
+    """
+    Itera (línea, dict) desde un stream de texto. Una línea JSONL ilegible
+    o con bytes que no son UTF-8 se entrega como (línea, RowError) para
+    reportarla sin cortar el archivo; para eso el stream se abre con
+    errors="surrogateescape" (con "strict" el primer byte inválido corta la
+    lectura a mitad de la importación).
+    """
+    if format == "csv":
+        # Filas cortas: las celdas que faltan cuentan como vacías ("no cambiar")
+        reader = csv.DictReader(stream, restval="")
+        header = [(name or "").strip() for name in reader.fieldnames or []]
+        if any(UNDECODABLE.search(name) for name in header):
+            raise ValueError("La cabecera no es UTF-8 válido")
+        unknown = [name for name in header if name not in COLUMNS]
+        if unknown:
+            raise ValueError(f"Columnas no válidas: {', '.join(unknown)}")
+        if "product_code" not in header:
+            raise ValueError("Falta la columna product_code")
+        reader.fieldnames = header
+        for row in reader:
+            # line_num es la línea física: sirve también con celdas multilínea
+            cells = [v for v in row.values() if isinstance(v, str)] + (row.get(None) or [])
+            if any(UNDECODABLE.search(cell) for cell in cells):
+                yield reader.line_num, RowError("La fila no es UTF-8 válido")
+                continue
+            if None in row:
+                yield reader.line_num, RowError("La fila tiene más columnas que la cabecera")
+                continue
+            yield reader.line_num, row
+    elif format == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            if UNDECODABLE.search(line):
+                yield line_number, RowError("La línea no es UTF-8 válido")
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, RowError("JSON inválido")
+                continue
+            if not isinstance(row, dict):
+                yield line_number, RowError("Cada línea debe ser un objeto JSON")
+                continue
+            yield line_number, row
+    else:
+        raise ValueError("format debe ser 'csv' o 'jsonl'")
+
+
+def _convert(column, value):
+    if column in INT_COLUMNS:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise RowError(f"{column} debe ser un entero")
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise RowError(f"{column} debe ser un entero")
+        if value < 0:
+            raise RowError(
+                "El stock no puede ser negativo." if column == "stock" else f"{column} no puede ser negativo"
+            )
+        return value
+    if column in DECIMAL_COLUMNS:
+        try:
+            value = Decimal(str(value))
+        except InvalidOperation:
+            raise RowError(f"{column} debe ser un número")
+        if not value.is_finite() or value < 0:
+            raise RowError(f"{column} debe ser un número mayor o igual a 0")
+        return value.quantize(Decimal("0.01"))
+    if column in BOOL_COLUMNS:
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+        raise RowError(f"{column} debe ser verdadero o falso")
+    if column in JSON_COLUMNS:
+        if isinstance(value, str):
+            # En CSV las listas y objetos vienen como texto JSON
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise RowError(f"{column} debe ser JSON válido")
+        return value
+    if not isinstance(value, str):
+        value = str(value)
+    limit = getattr(Product.__table__.c[column].type, "length", None)
+    if limit and len(value) > limit:
+        raise RowError(f"{column} supera los {limit} caracteres")
+    return value
+
+
+def clean_row(raw, categories):
+    """
+    Valida y convierte una fila. `categories` mapea id y nombre (en
+    minúsculas) de cada categoría a su id.
+    """
+    unknown = [key for key in raw if key not in COLUMNS]
+    if unknown:
+        raise RowError(f"Columnas no válidas: {', '.join(unknown)}")
+    values = {}
+    for column, value in raw.items():
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "":
+                continue
+        if value is None:
+            if column in NOT_NULL_COLUMNS:
+                raise RowError(f"{column} no puede ser nulo")
+            values[column] = None
+            continue
+        values[column] = _convert(column, value)
+
+    if not values.get("product_code"):
+        raise RowError("Falta product_code")
+    category = values.get("category_id")
+    if category is not None:
+        category_id = categories.get(category) or categories.get(category.lower())
+        if category_id is None:
+            raise RowError(f"La categoría {category} no existe")
+        values["category_id"] = category_id
+    return values
+
+
+def _load_categories():
+    categories = {}
+    for category_id, name in db.session.query(Category.id, Category.name):
+        if name:
+            categories.setdefault(name.strip().lower(), category_id)
+        categories[category_id] = category_id
+    return categories
+
+
+def _lock_existing(codes):
+    return {
+        row.product_code: row
+        for row in (
+            db.session.query(Product.id, Product.product_code, Product.stock, Product.min_stock)
+            .filter(Product.product_code.in_(codes))
+            .with_for_update()
+        )
+    }
+
+
+def _insert_new(groups):
+    """
+    INSERT multi-fila por grupo; una fila cuyo código apareció entre tanto
+    (otro alta concurrente) no se inserta. Devuelve los ids insertados.
+    """
+    table = Product.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "mysql":
+        statement = mysql.insert(table)
+        # No cambia nada de la fila existente (IGNORE callaría también otros errores)
+        statement = statement.on_duplicate_key_update({"id": table.c.id})
+    elif dialect == "sqlite":
+        statement = sqlite.insert(table).on_conflict_do_nothing(index_elements=[table.c.product_code])
+    else:
+        statement = insert(table)
+    ids = []
+    for rows in groups:
+        db.session.execute(statement, rows)
+        ids.extend(row["id"] for row in rows)
+    return {product_id for (product_id,) in db.session.query(Product.id).filter(Product.id.in_(ids))}
+
+
+def _update_values(values, current, now):
+    """Valores del UPDATE de un producto existente y su cambio de stock bajo."""
+    was_low = admin_stats.is_low(current.stock, current.min_stock)
+    values = {**values, "id": current.id, "updated_at": now}
+    low_delta = int(admin_stats.is_low(
+        values.get("stock", current.stock), values.get("min_stock", current.min_stock),
+    )) - int(was_low)
+    return values, low_delta
+
+
+def _import_chunk(rows, result):
+    """Procesa [(línea, valores)] en una transacción. Devuelve los ids tocados."""
+    existing = _lock_existing([values["product_code"] for _, values in rows])
+    now = crud.now_lima()
+    inserts, updates, new, ok = {}, {}, [], []
+    low_delta = 0
+    for line, values in rows:
+        current = existing.get(values["product_code"])
+        if current is None:
+            missing = [c for c in ("name", "price") if values.get(c) is None]
+            if missing:
+                _fail(result, line, values["product_code"], f"Faltan datos obligatorios: {', '.join(missing)}")
+                continue
+            row = {**NEW_DEFAULTS, **values, "id": str(uuid.uuid4()), "created_at": now, "updated_at": now}
+            new.append((values, row))
+            # executemany necesita las mismas columnas en todas las filas del grupo
+            inserts.setdefault(tuple(sorted(row)), []).append(row)
+        else:
+            values, delta = _update_values(values, current, now)
+            low_delta += delta
+            updates.setdefault(tuple(sorted(values)), []).append(values)
+            ok.append(values["id"])
+
+    inserted = _insert_new(inserts.values()) if inserts else set()
+    lost = [values for values, row in new if row["id"] not in inserted]
+    if lost:
+        # Otro alta ganó la carrera: se actualizan sobre lo que dejó
+        existing = _lock_existing([values["product_code"] for values in lost])
+        for values in lost:
+            values, delta = _update_values(values, existing[values["product_code"]], now)
+            low_delta += delta
+            updates.setdefault(tuple(sorted(values)), []).append(values)
+            ok.append(values["id"])
+    for values, row in new:
+        if row["id"] in inserted:
+            low_delta += int(admin_stats.is_low(row["stock"], row["min_stock"]))
+            ok.append(row["id"])
+    added = len(inserted)
+
+    for group in updates.values():
+        # UPDATE ... WHERE id = ? por cada fila, en un executemany
+        db.session.execute(update(Product), group)
+    admin_stats.products_imported(added, low_delta)
+    db.session.commit()
+    result["created"] += added
+    result["updated"] += len(ok) - added
+    return ok
+
+
+def _fail(result, line, product_code, message):
+    result["failed"] += 1
+    if len(result["errors"]) < MAX_REPORTED_ERRORS:
+        result["errors"].append({"line": line, "product_code": product_code, "error": message})
+
+
+def _after_chunk(product_ids):
+    """Caché e índices: una invalidación y una consulta por lote."""
+    if not product_ids:
+        return
+    cache.invalidate(*[cache.product_key(i) for i in product_ids], cache.BRANDS_KEY)
+    for product in Product.query.filter(Product.id.in_(product_ids)):
+        search_index.index_product(product)
+        facet_index.index_product(product)
+
+
+def import_products(stream, format, chunk_size=CHUNK_SIZE):
+    """
+    Importa un stream de texto en CSV o JSONL. Devuelve
+    {"created", "updated", "failed", "errors": [{"line", "product_code", "error"}]}.
+    Lanza ValueError si el formato o la cabecera CSV no son válidos.
+    """
+    chunk_size = min(max(int(chunk_size), 1), MAX_CHUNK_SIZE)
+    result = {"created": 0, "updated": 0, "failed": 0, "errors": []}
+    categories = _load_categories()
+    chunk, lines_by_code = [], {}  # lines_by_code: código -> primera línea
+
+    def flush():
+        if not chunk:
+            return
+        try:
+            product_ids = _import_chunk(chunk, result)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            message = f"Error al guardar el lote: {e.__class__.__name__}"
+            for line, values in chunk:
+                _fail(result, line, values["product_code"], message)
+            product_ids = []
+        _after_chunk(product_ids)
+        chunk.clear()
+
+    for line, raw in read_rows(stream, format):
+        product_code = raw.get("product_code") if isinstance(raw, dict) else None
+        try:
+            if isinstance(raw, RowError):
+                raise raw
+            values = clean_row(raw, categories)
+        except RowError as e:
+            _fail(result, line, product_code, str(e))
+            continue
+        code = values["product_code"]
+        if code in lines_by_code:
+            # Dos filas con el mismo código: vale la primera
+            _fail(result, line, code, f"product_code repetido en el archivo (línea {lines_by_code[code]})")
+            continue
+        lines_by_code[code] = line
+        chunk.append((line, values))
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    return result
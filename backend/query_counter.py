@@ -0,0 +1,72 @@
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+
+_local = threading.local()
+_installed = set()
+
+
+class QueryLog(list):
+    """Sentencias ejecutadas dentro de un bloque: [(sql, segundos), ...]."""
+
+    @property
+    def count(self):
+        return len(self)
+
+    @property
+    def total_time(self):
+        return sum(elapsed for _, elapsed in self)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    for log in getattr(_local, "logs", ()):
+        log.append((statement, elapsed))
+
+
+def install(engine):
+    """Registra los listeners una sola vez por engine."""
+    if id(engine) in _installed:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    _installed.add(id(engine))
+
+
+def start(*engines):
+    """Empieza a registrar las consultas del hilo actual; cerrar con stop(log)."""
+    for engine in engines:
+        install(engine)
+    log = QueryLog()
+    _local.__dict__.setdefault("logs", []).append(log)
+    return log
+
+
+def stop(log):
+    logs = getattr(_local, "logs", [])
+    # Por identidad: dos QueryLog con las mismas consultas son iguales como listas
+    for i, other in enumerate(logs):
+        if other is log:
+            del logs[i]
+            break
+
+
+@contextmanager
+def count_queries(engine):
+    """
+    Registra las consultas que el hilo actual ejecuta dentro del bloque:
+
+        with count_queries(db.engine) as log:
+            client.get("/products/")
+        log.count, log.total_time
+    """
+    log = start(engine)
+    try:
+        yield log
+    finally:
+        stop(log)
@@ -0,0 +1,42 @@
+"""
+Límite de intentos por clave (IP) con token bucket, en memoria del proceso.
+
+Cada clave tiene `burst` fichas que se recargan a `per_minute` por minuto;
+cada intento gasta una. Las claves se guardan en un OrderedDict acotado (LRU)
+para que una lluvia de IPs distintas no agote la memoria. Con varios workers
+cada uno lleva su cuenta: el límite efectivo es por worker.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+MAX_KEYS = 100000
+
+_buckets = OrderedDict()
+_lock = threading.Lock()
+
+
+def hit(key, per_minute, burst=None):
+    """Gasta un intento. Devuelve 0 si se permite o los segundos hasta el próximo."""
+    if not per_minute:
+        return 0
+    burst = burst or per_minute
+    rate = per_minute / 60.0
+    now = time.monotonic()
+    with _lock:
+        tokens, updated = _buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0
+        else:
+            wait = (1 - tokens) / rate
+        _buckets[key] = (tokens, now)
+        while len(_buckets) > MAX_KEYS:
+            _buckets.popitem(last=False)
+    return wait
+
+
+def reset():
+    with _lock:
+        _buckets.clear()
@@ -0,0 +1,262 @@
+"""
+Lecturas en réplicas de la base de datos.
+
+Las réplicas se configuran con DATABASE_REPLICA_URLS (binds replica_1,
+replica_2, ... de Flask-SQLAlchemy). La sesión de `db` es RoutingSession:
+mientras una petición está marcada como de lectura, cada SELECT simple va a
+una réplica sana (por turnos) y todo lo demás al primario:
+
+  - INSERT/UPDATE/DELETE, flush y SELECT ... FOR UPDATE van siempre al
+    primario, y desde ese momento el resto de la petición también lee del
+    primario (lee lo que acaba de escribir); text() va al primario;
+  - route_reads(blueprint) marca los GET de un blueprint; @reads marca una
+    función de crud donde sea que se llame;
+  - tras un commit con escrituras, el mismo cliente (token o IP) lee del
+    primario durante REPLICA_STICKY_SECONDS (marca en la caché, compartida
+    entre workers con CACHE_BACKEND=redis);
+  - lo que se guarda en la caché o en los índices en memoria se lee del
+    primario (@primary), aunque la petición use réplicas;
+  - una réplica con más de REPLICA_MAX_LAG segundos de retraso, sin
+    replicación o que no responde sale de la rotación hasta el siguiente
+    chequeo; sin réplicas sanas todo va al primario. El chequeo corre en un
+    hilo aparte: ninguna petición espera el connect_timeout de una réplica
+    caída.
+
+Sin DATABASE_REPLICA_URLS nada cambia: no hay binds y todo va al primario.
+"""
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+import cache
+
+BIND_PREFIX = "replica_"
+
+log = logging.getLogger(__name__)
+
+
+def bind_keys(urls):
+    """{"replica_1": url, ...} para SQLALCHEMY_BINDS."""
+    return {f"{BIND_PREFIX}{i}": url for i, url in enumerate(urls, start=1)}
+
+
+class _Health:
+    """Estado de una réplica; se revisa como mucho cada REPLICA_CHECK_INTERVAL, en segundo plano."""
+
+    def __init__(self):
+        self.healthy = True
+        self.lag = None
+        self.checked_at = None
+        self.checking = False
+
+
+_health = {}
+_health_lock = threading.Lock()
+_turn = itertools.count()
+
+
+def _lag_seconds(engine):
+    """Retraso de replicación en segundos; None si la replicación está detenida."""
+    with engine.connect() as connection:
+        if engine.dialect.name != "mysql":
+            # SQLite y otros (pruebas con dos bases locales): solo se verifica la conexión
+            connection.execute(text("SELECT 1"))
+            return 0
+        try:
+            row = connection.execute(text("SHOW REPLICA STATUS")).mappings().first()
+            column = "Seconds_Behind_Source"
+        except Exception:
+            # MySQL < 8.0.22
+            row = connection.execute(text("SHOW SLAVE STATUS")).mappings().first()
+            column = "Seconds_Behind_Master"
+    if row is None:
+        # No es réplica (p. ej. el mismo servidor en desarrollo)
+        return 0
+    return row[column]
+
+
+def _check(app, key, engine, health):
+    with app.app_context():
+        _run_check(key, engine, health)
+
+
+def _run_check(key, engine, health):
+    config = current_app.config
+    try:
+        lag = _lag_seconds(engine)
+        healthy, reason = lag is not None and lag <= config.get("REPLICA_MAX_LAG", 5), f"retraso: {lag}"
+    except Exception as e:
+        lag, healthy, reason = None, False, f"no disponible: {e}"
+    with _health_lock:
+        if healthy != health.healthy:
+            # Solo los cambios de estado, no cada chequeo
+            log.warning("Réplica %s %s (%s)", key, "vuelve a la rotación" if healthy else "fuera de rotación", reason)
+        health.healthy, health.lag = healthy, lag
+        health.checked_at = time.monotonic()
+        health.checking = False
+
+
+def _healthy_engines(engines):
+    interval = current_app.config.get("REPLICA_CHECK_INTERVAL", 5)
+    now = time.monotonic()
+    healthy = []
+    for key, engine in engines:
+        with _health_lock:
+            health = _health.setdefault(key, _Health())
+            due = not health.checking and (health.checked_at is None or now - health.checked_at >= interval)
+            if due:
+                health.checking = True
+        if due:
+            # Un solo chequeo a la vez, en otro hilo; mientras tanto (y para
+            # esta misma petición) vale el último estado conocido
+            threading.Thread(
+                target=_check, args=(current_app._get_current_object(), key, engine, health),
+                name=f"replica-check-{key}", daemon=True,
+            ).start()
+        if health.healthy:
+            healthy.append(engine)
+    return healthy
+
+
+def mark_unhealthy(key):
+    """Saca una réplica de la rotación hasta el próximo chequeo."""
+    with _health_lock:
+        health = _health.setdefault(key, _Health())
+        health.healthy = False
+        health.checked_at = time.monotonic()
+
+
+def pick():
+    """Engine de una réplica sana (por turnos) o None para usar el primario."""
+    engines = sorted(
+        (key, engine) for key, engine in current_app.extensions["sqlalchemy"].engines.items()
+        if key and key.startswith(BIND_PREFIX)
+    )
+    if not engines:
+        return None
+    healthy = _healthy_engines(engines)
+    if not healthy:
+        return None
+    return healthy[next(_turn) % len(healthy)]
+
+
+def status():
+    with _health_lock:
+        return {
+            key: {"healthy": h.healthy, "lag": h.lag}
+            for key, h in sorted(_health.items())
+        }
+
+
+# --- Lecturas del primario para quien acaba de escribir ---
+
+def _client_key():
+    if not has_request_context():
+        return None
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        # El token identifica al usuario sin decodificarlo
+        return "replica-sticky:t:" + hashlib.sha256(header[7:].encode()).hexdigest()[:32]
+    return f"replica-sticky:ip:{request.remote_addr}"
+
+
+def _stick():
+    seconds = current_app.config.get("REPLICA_STICKY_SECONDS", 0)
+    key = _client_key()
+    if seconds and key:
+        cache.get_cache().set(key, True, ttl=seconds)
+
+
+def _is_sticky():
+    if "replica_sticky" not in g:
+        key = _client_key()
+        sticky = bool(key) and current_app.config.get("REPLICA_STICKY_SECONDS", 0) > 0
+        g.replica_sticky = sticky and cache.get_cache().get(key) is True
+    return g.replica_sticky
+
+
+# --- Qué se lee de réplicas ---
+
+def _reading():
+    return has_app_context() and g.get("read_replica", False) and not _is_sticky()
+
+
+def route_reads(blueprint):
+    """Los GET/HEAD del blueprint leen de réplicas. Llamar antes de registrarlo."""
+    @blueprint.before_request
+    def _route_reads():
+        g.read_replica = request.method in ("GET", "HEAD")
+
+
+def _route(fn, read_replica):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not has_app_context():
+            return fn(*args, **kwargs)
+        previous = g.get("read_replica", False)
+        g.read_replica = read_replica
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            g.read_replica = previous
+    return wrapper
+
+
+def reads(fn):
+    """Marca una función de solo lectura (crud) para que use réplicas."""
+    return _route(fn, True)
+
+
+def primary(fn):
+    """
+    Lecturas que se guardan (caché, índices en memoria): siempre del
+    primario, si no una réplica atrasada dejaría el dato viejo hasta el TTL.
+    """
+    return _route(fn, False)
+
+
+class RoutingSession(Session):
+    """Sesión de Flask-SQLAlchemy que envía los SELECT de lectura a réplicas."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and clause is not None and not self.info.get("wrote"):
+            if getattr(clause, "is_dml", False) or getattr(clause, "_for_update_arg", None) is not None:
+                # Escritura o bloqueo: primario desde aquí hasta el fin de la sesión
+                self.info["wrote"] = True
+            elif getattr(clause, "is_select", False) and not self._flushing and _reading():
+                engine = pick()
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    if session.info.get("wrote") and has_app_context():
+        _stick()
+
+
+def install(db):
+    """Saca de la rotación una réplica que pierde la conexión en medio de una consulta."""
+    if current_app.config.get("SQLALCHEMY_BINDS") and current_app.config.get("REPLICA_STICKY_SECONDS", 0) \
+            and current_app.config.get("CACHE_BACKEND", "local") != "redis":
+        log.warning(
+            "Réplicas con CACHE_BACKEND=%s: la marca de leer-lo-escrito no se comparte entre "
+            "workers; con más de uno usar CACHE_BACKEND=redis",
+            current_app.config.get("CACHE_BACKEND", "local"),
+        )
+    for key, engine in db.engines.items():
+        if key and key.startswith(BIND_PREFIX):
+            event.listen(engine, "handle_error", lambda context, key=key: (
+                mark_unhealthy(key) if context.is_disconnect else None
+            ))
@@ -0,0 +1,228 @@
+"""
+Métricas por endpoint en formato Prometheus (GET /metrics) y log de
+peticiones lentas.
+
+Por cada petición se registra, con etiquetas blueprint/endpoint/método:
+  - latencia (histograma) y peticiones por código de estado (errores = 5xx);
+  - cantidad y tiempo de consultas SQL (listeners de query_counter, en todos
+    los engines, réplicas incluidas);
+  - bytes de respuesta (las respuestas en streaming no tienen largo conocido
+    y su latencia solo cubre hasta que empieza el envío).
+
+Si una petición tarda más de SLOW_REQUEST_MS se escribe una línea JSON en el
+logger "slow_requests" con sus consultas más lentas.
+
+Los valores son por proceso (como pool_metrics y cache.stats): con varios
+workers Prometheus debe raspar cada uno o agregarlos con su etiqueta.
+"""
+import json
+import logging
+import threading
+import time
+from flask import g, request
+import query_counter
+
+# Límites superiores (segundos) del histograma de latencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TOP_QUERIES = 5
+MAX_SQL_LENGTH = 500
+
+slow_log = logging.getLogger("slow_requests")
+
+_lock = threading.Lock()
+# (blueprint, endpoint, method) -> contadores
+_endpoints = {}
+
+
+def _empty():
+    return {
+        "statuses": {},
+        "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+        "seconds": 0.0,
+        "count": 0,
+        "queries": 0,
+        "query_seconds": 0.0,
+        "response_bytes": 0,
+    }
+
+
+def _labels(endpoint):
+    if endpoint is None:
+        # Rutas inexistentes: una sola serie, no una por URL
+        return "", "<sin ruta>"
+    blueprint, _, _ = endpoint.rpartition(".")
+    return blueprint, endpoint
+
+
+def record(endpoint, method, status, seconds, queries, query_seconds, response_bytes):
+    blueprint, endpoint = _labels(endpoint)
+    index = next((i for i, limit in enumerate(LATENCY_BUCKETS) if seconds <= limit), len(LATENCY_BUCKETS))
+    with _lock:
+        data = _endpoints.setdefault((blueprint, endpoint, method), _empty())
+        data["statuses"][status] = data["statuses"].get(status, 0) + 1
+        data["buckets"][index] += 1
+        data["seconds"] += seconds
+        data["count"] += 1
+        data["queries"] += queries
+        data["query_seconds"] += query_seconds
+        data["response_bytes"] += response_bytes
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+
+
+def top_queries(log, limit=TOP_QUERIES):
+    """Consultas agrupadas por texto, las de más tiempo total primero."""
+    grouped = {}
+    for statement, elapsed in log:
+        entry = grouped.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+    ranked = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+    return [
+        {"sql": " ".join(statement.split())[:MAX_SQL_LENGTH], "count": count, "ms": round(elapsed * 1000, 2)}
+        for statement, (count, elapsed) in ranked
+    ]
+
+
+def install(app, engines):
+    """Registra los hooks de petición; `engines`: todos los de db (primario y réplicas)."""
+    engines = list(engines)
+    for engine in engines:
+        query_counter.install(engine)
+
+    @app.before_request
+    def _start_request_metrics():
+        g.request_started = time.perf_counter()
+        g.request_queries = query_counter.start()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        started = g.pop("request_started", None)
+        log = g.pop("request_queries", None)
+        if started is None or log is None:
+            return response
+        query_counter.stop(log)
+        elapsed = time.perf_counter() - started
+        length = response.content_length if not response.is_streamed else None
+        record(
+            request.endpoint, request.method, response.status_code, elapsed,
+            log.count, log.total_time, length or 0,
+        )
+        threshold = app.config.get("SLOW_REQUEST_MS", 500)
+        if threshold and elapsed * 1000 >= threshold:
+            slow_log.warning(json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "endpoint": request.endpoint,
+                "status": response.status_code,
+                "ms": round(elapsed * 1000, 1),
+                "queries": log.count,
+                "query_ms": round(log.total_time * 1000, 1),
+                "top_queries": top_queries(log),
+            }, ensure_ascii=False))
+        return response
+
+    @app.teardown_request
+    def _stop_request_metrics(exc):
+        # Si after_request no corrió, no dejar el log colgado del hilo
+        log = g.pop("request_queries", None)
+        if log is not None:
+            query_counter.stop(log)
+
+
+# --- Exposición en formato de texto de Prometheus ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _histogram(lines, name, buckets, limits, total, count, **labels):
+    cumulative = 0
+    for limit, bucket in zip(limits + ("+Inf",), buckets):
+        cumulative += bucket
+        lines.append(f"{name}_bucket{_format_labels(**labels, le=limit)} {cumulative}")
+    lines.append(f"{name}_sum{_format_labels(**labels) if labels else ''} {total}")
+    lines.append(f"{name}_count{_format_labels(**labels) if labels else ''} {count}")
+
+
+def render(pool=None, cache_stats=None):
+    """Texto para /metrics: peticiones, más el pool de conexiones y la caché si se pasan."""
+    with _lock:
+        snapshot = {
+            key: {**data, "statuses": dict(data["statuses"]), "buckets": list(data["buckets"])}
+            for key, data in _endpoints.items()
+        }
+    lines = [
+        "# HELP http_requests_total Peticiones atendidas por endpoint y código de estado.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (blueprint, endpoint, method), data in sorted(snapshot.items()):
+        for status, count in sorted(data["statuses"].items()):
+            labels = _format_labels(blueprint=blueprint, endpoint=endpoint, method=method, status=status)
+            lines.append(f"http_requests_total{labels} {count}")
+    lines += [
+        "# HELP http_request_errors_total Respuestas 5xx por endpoint.",
+        "# TYPE http_request_errors_total counter",
+    ]
+    for (blueprint, endpoint, method), data in sorted(snapshot.items()):
+        errors = sum(count for status, count in data["statuses"].items() if status >= 500)
+        lines.append(f"http_request_errors_total{_format_labels(blueprint=blueprint, endpoint=endpoint, method=method)} {errors}")
+    lines += [
+        "# HELP http_request_duration_seconds Latencia de las peticiones.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (blueprint, endpoint, method), data in sorted(snapshot.items()):
+        _histogram(
+            lines, "http_request_duration_seconds", data["buckets"], LATENCY_BUCKETS,
+            data["seconds"], data["count"], blueprint=blueprint, endpoint=endpoint, method=method,
+        )
+    for name, key, help_text in (
+        ("http_request_queries_total", "queries", "Consultas SQL ejecutadas por las peticiones."),
+        ("http_request_query_seconds_total", "query_seconds", "Tiempo en consultas SQL de las peticiones."),
+        ("http_response_bytes_total", "response_bytes", "Bytes de respuesta (sin las respuestas en streaming)."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (blueprint, endpoint, method), data in sorted(snapshot.items()):
+            labels = _format_labels(blueprint=blueprint, endpoint=endpoint, method=method)
+            lines.append(f"{name}{labels} {data[key]}")
+
+    if pool is not None:
+        lines += [
+            "# HELP db_pool_checkout_wait_seconds Espera para obtener una conexión del pool.",
+            "# TYPE db_pool_checkout_wait_seconds histogram",
+        ]
+        buckets = [b["count"] for b in pool["wait_buckets"]]
+        limits = tuple(b["le"] for b in pool["wait_buckets"][:-1])
+        _histogram(lines, "db_pool_checkout_wait_seconds", buckets, limits, pool["wait_seconds_sum"], sum(buckets))
+        for name, key in (
+            ("db_pool_checkouts_total", "checkouts"),
+            ("db_pool_checkout_timeouts_total", "checkout_timeouts"),
+            ("db_pool_connects_total", "connects"),
+            ("db_pool_invalidations_total", "invalidations"),
+        ):
+            lines += [f"# TYPE {name} counter", f"{name} {pool[key]}"]
+        for name, key in (
+            ("db_pool_checked_out", "checked_out"),
+            ("db_pool_checked_in", "checked_in"),
+            ("db_pool_overflow", "overflow"),
+            ("db_pool_size", "size"),
+        ):
+            lines.append(f"# TYPE {name} gauge")
+            for entry in pool["pools"]:
+                if key in entry:
+                    lines.append(f"{name}{_format_labels(url=entry['url'])} {entry[key]}")
+
+    if cache_stats is not None:
+        lines.append("# TYPE cache_requests_total counter")
+        for namespace, counters in sorted(cache_stats["namespaces"].items()):
+            for outcome in ("hits", "misses"):
+                lines.append(f"cache_requests_total{_format_labels(namespace=namespace, outcome=outcome)} {counters[outcome]}")
+        lines += ["# TYPE cache_entries gauge", f"cache_entries {cache_stats['size']}"]
+    return "\n".join(lines) + "\n"
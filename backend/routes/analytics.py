@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from flask import Blueprint, jsonify, request
+from auth_utils import admin_required
+import crud
+import sales_analytics
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/admin/analytics')
+
+DEFAULT_RANGE_DAYS = 30
+MAX_TOP = 100
+
+
+def _parse_date(value, end=False):
+    # YYYY-MM-DD (día completo; "to" es inclusive) o fecha-hora ISO (exacta)
+    if len(value) == 10:
+        day = datetime.strptime(value, "%Y-%m-%d")
+        return day + timedelta(days=1) if end else day
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+
+def _parse_range(args):
+    """Rango [from, to) en hora de Lima; por defecto los últimos 30 días."""
+    try:
+        end = _parse_date(args['to'], end=True) if args.get('to') else crud.now_lima().replace(tzinfo=None)
+        start = _parse_date(args['from']) if args.get('from') else end - timedelta(days=DEFAULT_RANGE_DAYS)
+    except ValueError:
+        raise ValueError("Fechas inválidas: usa YYYY-MM-DD o fecha-hora ISO")
+    if start >= end:
+        raise ValueError("'from' debe ser anterior a 'to'")
+    return start, end
+
+
+def _parse_dimension(args, default):
+    dimension = args.get('dimension', default)
+    if dimension not in sales_analytics.DIMENSIONS:
+        raise ValueError(f"dimension debe ser una de: {', '.join(sales_analytics.DIMENSIONS)}")
+    return dimension
+
+
+# Endpoint: /admin/analytics/revenue?from=2025-01-01&to=2025-12-31&interval=month
+#           (&dimension=product&key=<id> para una sola clave)
+@analytics_bp.route('/revenue', methods=['GET'])
+@admin_required
+def get_revenue_series():
+    try:
+        start, end = _parse_range(request.args)
+        dimension = _parse_dimension(request.args, sales_analytics.TOTAL)
+        interval = request.args.get('interval') or sales_analytics.choose_interval(start, end)
+        if interval not in sales_analytics.INTERVALS:
+            raise ValueError("interval debe ser hour, day o month")
+        key = request.args.get('key', '')
+        if dimension != sales_analytics.TOTAL and not key:
+            raise ValueError("Falta 'key' para la dimensión indicada")
+        points = sales_analytics.series(start, end, interval, dimension, key)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'interval': interval,
+        'dimension': dimension,
+        'key': key,
+        'points': points,
+    })
+
+
+# Endpoint: /admin/analytics/top?from=...&to=...&dimension=product&by=revenue&limit=10
+@analytics_bp.route('/top', methods=['GET'])
+@admin_required
+def get_top():
+    try:
+        start, end = _parse_range(request.args)
+        dimension = _parse_dimension(request.args, sales_analytics.PRODUCT)
+        by = request.args.get('by', 'revenue')
+        if by not in ('revenue', 'units', 'orders'):
+            raise ValueError("by debe ser revenue, units u orders")
+        limit = min(max(int(request.args.get('limit', 10)), 1), MAX_TOP)
+        items = sales_analytics.top(start, end, dimension, by, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'dimension': dimension,
+        'by': by,
+        'items': items,
+    })
@@ -1,15 +1,39 @@
 import jwt
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token
-from werkzeug.security import check_password_hash
 from datetime import datetime, timedelta
-from models import User
+from models import db, User
+from passwords import PasswordBusy
 import crud
+import passwords
+import rate_limit
 
 auth_bp = Blueprint("auth", __name__)
 
+
+def _rate_limited(action):
+    """429 si la IP superó {ACTION}_RATE_PER_MINUTE; None si puede seguir."""
+    per_minute = current_app.config.get(f"{action.upper()}_RATE_PER_MINUTE", 0)
+    # remote_addr: detrás de un proxy hay que configurar ProxyFix para ver la IP real
+    wait = rate_limit.hit(f"{action}:{request.remote_addr}", per_minute)
+    if not wait:
+        return None
+    response = jsonify({"message": "Demasiados intentos, espera un momento"})
+    response.headers["Retry-After"] = str(int(wait) + 1)
+    return response, 429
+
+
+def _busy(error):
+    response = jsonify({"message": str(error)})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 503
+
+
 @auth_bp.route("/login", methods=["POST"])
 def login():
+    limited = _rate_limited("login")
+    if limited:
+        return limited
     data = request.json or {}
     email = data.get("email")
     password = data.get("password")
@@ -21,8 +45,17 @@ def login():
     if not user:
         return jsonify({"message": "Usuario no encontrado"}), 401
 
-    if not check_password_hash(user.password_hash, password):
+    # La verificación corre en el pool de passwords.py, no en este worker
+    try:
+        valid, new_hash = passwords.verify_password(user.password_hash, password)
+    except PasswordBusy as e:
+        return _busy(e)
+    if not valid:
         return jsonify({"message": "Contraseña incorrecta"}), 401
+    if new_hash:
+        # Hash con otro método o factor de trabajo: se actualiza al configurado
+        user.password_hash = new_hash
+        db.session.commit()
 
     # Generar JWT con flask-jwt-extended
     additional_claims = {
@@ -44,6 +77,9 @@ def login():
 
 @auth_bp.route("/register", methods=["POST"])
 def register():
+    limited = _rate_limited("register")
+    if limited:
+        return limited
     data = request.json or {}
     # Validación mínima (puedes mejorarla)
     if not data.get("email") or not data.get("password") or not data.get("full_name"):
@@ -57,5 +93,7 @@ def register():
     try:
         user = crud.create_user(data)
         return jsonify(user.to_dict()), 201
+    except PasswordBusy as e:
+        return _busy(e)
     except Exception as e:
         return jsonify({"message": str(e)}), 500
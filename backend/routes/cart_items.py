@@ -1,32 +1,43 @@
 from flask import Blueprint, jsonify, request
 import crud
+import cart_store
 
 cart_items_bp = Blueprint('cart_items', __name__, url_prefix='/cart_items')
 
 @cart_items_bp.route('/', methods=['GET'])
 def get_cart_items():
-    items = crud.get_all_cart_items()
+    cart_id = request.args.get('cart_id')
+    if cart_store.enabled():
+        if cart_id:
+            cart = cart_store.find_cart(cart_id)
+            return jsonify(cart_store.item_dicts(cart) if cart else [])
+        # El listado completo sale de la BD: refleja los carritos del almacén
+        # desde el último flush (CART_FLUSH_INTERVAL)
+    items = crud.get_all_cart_items(cart_id)
     return jsonify([i.to_dict() for i in items])
 
 @cart_items_bp.route('/<cart_item_id>', methods=['GET'])
 def get_cart_item(cart_item_id):
+    if cart_store.enabled():
+        item = cart_store.get_item(cart_item_id)
+        return (jsonify(item), 200) if item else ('', 404)
     item = crud.get_cart_item_by_id(cart_item_id)
     return (jsonify(item.to_dict()), 200) if item else ('', 404)
 
 @cart_items_bp.route('/add', methods=['POST'])
 def add_or_update_cart_item():
     data = request.json
-    print("DEBUG POST /cart_items/add:", data)  # <-- AGREGA ESTO
     user_id = data.get('user_id')
     product_id = data.get('product_id')
     quantity = data.get('quantity', 1)
     if not user_id or not product_id:
         return jsonify({"message": "Falta user_id o product_id"}), 400
     try:
+        if cart_store.enabled():
+            return jsonify(cart_store.add(user_id, product_id, quantity)), 200
         item = crud.add_product_to_cart(user_id, product_id, quantity)
         return jsonify(item.to_dict()), 200
     except Exception as e:
-        print("ERROR en add_or_update_cart_item:", e)  # <-- AGREGA ESTO
         return jsonify({"message": str(e)}), 400
 
 
@@ -36,10 +47,18 @@ def update_cart_item(cart_item_id):
     # Solo acepta fields válidos, y los filtra
     allowed_fields = {'quantity', 'price'}
     updates = {k: v for k, v in data.items() if k in allowed_fields}
-    item = crud.update_cart_item(cart_item_id, updates)
+    try:
+        if cart_store.enabled():
+            item = cart_store.update_item(cart_item_id, updates)
+            return (jsonify(item), 200) if item else ('', 404)
+        item = crud.update_cart_item(cart_item_id, updates)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     return (jsonify(item.to_dict()), 200) if item else ('', 404)
 
 @cart_items_bp.route('/<cart_item_id>', methods=['DELETE'])
 def delete_cart_item(cart_item_id):
+    if cart_store.enabled():
+        return ('', 204) if cart_store.remove_item(cart_item_id) else ('', 404)
     item = crud.delete_cart_item(cart_item_id)
     return ('', 204) if item else ('', 404)
@@ -1,29 +1,63 @@
 from flask import Blueprint, jsonify, request
 import crud
+import cart_store
+import http_cache
 
 carts_bp = Blueprint('cart', __name__, url_prefix='/cart')
 
 @carts_bp.route('/', methods=['GET'])
 def get_carts():
+    # Con CART_STORE=memory|redis el listado sale de la BD: los últimos
+    # cambios aparecen tras el próximo flush (CART_FLUSH_INTERVAL)
     carts = crud.get_all_carts()
     return jsonify([c.to_dict() for c in carts])
 
 @carts_bp.route('/<cart_id>', methods=['GET'])
 def get_cart(cart_id):
+    if cart_store.enabled():
+        cart = cart_store.find_cart(cart_id)
+        return (jsonify(cart_store.cart_dict(cart)), 200) if cart else ('', 404)
     cart = crud.get_cart_by_id(cart_id)
     return (jsonify(cart.to_dict()), 200) if cart else ('', 404)
 
 @carts_bp.route('/user/<user_id>', methods=['GET'])
 def get_cart_by_user(user_id):
+    if cart_store.enabled():
+        return jsonify(cart_store.cart_dict(cart_store.get_cart(user_id))), 200
     cart = crud.get_or_create_cart_by_user(user_id)
     return (jsonify(cart.to_dict()), 200) if cart else ('', 404)
 
+# Carrito, ítems con datos del producto y totales (subtotal, IGV, total) en una
+# petición. El ETag es la versión del carrito: sin cambios responde 304.
+@carts_bp.route('/user/<user_id>/full', methods=['GET'])
+def get_full_cart_by_user(user_id):
+    view = cart_store.cart_view(user_id) if cart_store.enabled() else crud.get_cart_view(user_id)
+    return http_cache.conditional_response(view["version"], None, lambda: jsonify(view))
+
+# Varias operaciones en una petición: {"operations": [{"op": "add"|"set"|"remove",
+# "product_id": ..., "quantity": ...}]}. Se aplican todas o ninguna.
+@carts_bp.route('/user/<user_id>/items', methods=['PATCH'])
+def patch_cart_items(user_id):
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else data
+    try:
+        if cart_store.enabled():
+            cart = cart_store.apply(user_id, operations)
+            return jsonify({**cart_store.cart_dict(cart), 'items': cart_store.item_dicts(cart)}), 200
+        cart, items = crud.apply_cart_operations(user_id, operations)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({**cart.to_dict(), 'items': [i.to_dict() for i in items]}), 200
+
 @carts_bp.route('/', methods=['POST'])
 def add_cart():
     data = request.json
     # Solo permite fields válidos
     allowed_fields = {'id', 'user_id', 'created_at', 'updated_at'}
     safe_data = {k: v for k, v in data.items() if k in allowed_fields}
+    if cart_store.enabled() and safe_data.get('user_id'):
+        # Un carrito por usuario: devuelve el que tenga en el almacén o uno nuevo
+        return jsonify(cart_store.cart_dict(cart_store.get_cart(safe_data['user_id']))), 201
     cart = crud.create_cart(safe_data)
     return jsonify(cart.to_dict()), 201
 
@@ -32,10 +66,23 @@ def update_cart(cart_id):
     data = request.json
     allowed_fields = {'user_id'}
     safe_data = {k: v for k, v in data.items() if k in allowed_fields}
+    if cart_store.enabled() and safe_data.get('user_id'):
+        try:
+            cart = cart_store.move_cart(cart_id, safe_data['user_id'])
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        except RuntimeError as e:
+            return jsonify({"message": str(e)}), 503
+        return (jsonify(cart_store.cart_dict(cart)), 200) if cart else ('', 404)
     cart = crud.update_cart(cart_id, safe_data)
     return (jsonify(cart.to_dict()), 200) if cart else ('', 404)
 
 @carts_bp.route('/<cart_id>', methods=['DELETE'])
 def delete_cart(cart_id):
+    if cart_store.enabled():
+        try:
+            return ('', 204) if cart_store.delete_cart(cart_id) else ('', 404)
+        except RuntimeError as e:
+            return jsonify({"message": str(e)}), 503
     cart = crud.delete_cart(cart_id)
     return ('', 204) if cart else ('', 404)
@@ -1,17 +1,23 @@
 from flask import Blueprint, jsonify, request
 import crud
+import http_cache
+from models import Category
 
 categories_bp = Blueprint('categories', __name__, url_prefix='/categories')
 
 @categories_bp.route('/', methods=['GET'])
 def get_categories():
-    categories = crud.get_all_categories()
-    return jsonify([c.to_dict() for c in categories])
+    latest, count = http_cache.watermark(Category.updated_at)
+    etag = http_cache.make_etag("categories", latest, count)
+    return http_cache.conditional_response(etag, None, lambda: jsonify(crud.get_categories_data()))
 
 @categories_bp.route('/<category_id>', methods=['GET'])
 def get_category(category_id):
-    category = crud.get_category_by_id(category_id)
-    return (jsonify(category.to_dict()), 200) if category else ('', 404)
+    category = crud.get_category_data(category_id)
+    if not category:
+        return '', 404
+    etag = http_cache.make_etag("category", category["id"], category["updated_at"])
+    return http_cache.conditional_response(etag, category["updated_at"], lambda: jsonify(category))
 
 @categories_bp.route('/', methods=['POST'])
 def add_category():
@@ -1,79 +1,120 @@
-from flask import Blueprint, jsonify, request, send_file, abort
+from flask import Blueprint, jsonify, request, send_file, abort, Response, stream_with_context
 from io import BytesIO
+from sqlalchemy import func, or_
+from sqlalchemy.orm import defer, contains_eager
 from models import Invoice, Order
-from pdf_generator import generar_boleta_pdf
+from auth_utils import admin_required, login_required, current_user_id, current_role
 import crud
+import invoice_jobs
+import invoice_export
+import blob_store
+import http_cache
 import uuid
 
-# JWT imports (opcional)
-try:
-    from flask_jwt_extended import jwt_required, get_jwt_identity
-    JWT_ENABLED = True
-except ImportError:
-    JWT_ENABLED = False
-
 invoices_bp = Blueprint('invoices', __name__, url_prefix='/invoices')
 
 @invoices_bp.route('/', methods=['GET'])
 def get_invoices():
     order_id = request.args.get('order_id')
-    if order_id:
-        invoices = Invoice.query.filter_by(order_id=order_id).all()
+    criteria = [Invoice.order_id == order_id] if order_id else []
+    # updated_at se mueve también cuando el PDF pasa a ready/failed
+    latest, count = http_cache.watermark(Invoice.updated_at, *criteria)
+    etag = http_cache.make_etag("invoices", order_id, latest, count)
+
+    def build():
+        # Solo metadatos: el PDF no se lee
+        invoices = Invoice.query.options(defer(Invoice.pdf_data)).filter(*criteria).all()
         return jsonify([i.to_dict() for i in invoices])
-    items = crud.get_all_invoices()
-    return jsonify([i.to_dict() for i in items])
+    return http_cache.conditional_response(etag, None, build)
 
 
 # Endpoint: /invoices/mine (solo boletas del usuario autenticado)
 @invoices_bp.route('/mine', methods=['GET'])
+@login_required
 def get_my_invoices():
-    if JWT_ENABLED:
-        from flask_jwt_extended import jwt_required, get_jwt_identity
-        @jwt_required()
-        def secured():
-            user_id = get_jwt_identity()
-            invoices = (
-                Invoice.query
-                .join(Order)
-                .filter(Order.user_id == user_id)
-                .order_by(Invoice.created_at.desc())
-                .all()
-            )
-            data = []
-            for inv in invoices:
-                order = inv.order
-                data.append({
-                    'invoice_id': inv.id,
-                    'invoice_number': inv.invoice_number,
-                    'customer_name': inv.customer_name,
-                    'customer_dni': inv.customer_dni,
-                    'created_at': inv.created_at.isoformat() if inv.created_at else None,
-                    'pdf_available': bool(inv.pdf_data),
-                    'order_number': order.order_number,
-                    'order_status': order.status,
-                    'payment_method': order.payment_method,
-                    'total_amount': float(order.total_amount),
-                    'items': [
-                        {
-                            'product_name': item.product_name,
-                            'quantity': item.quantity,
-                            'unit_price': float(item.unit_price),
-                            'total_price': float(item.total_price),
-                        }
-                        for item in order.order_items
-                    ]
-                })
-            return jsonify(data)
-        return secured()
+    user_id = current_user_id()
+    # Una consulta para boletas + orden y otra para todos los ítems;
+    # el PDF no se lee, su disponibilidad se calcula en SQL
+    rows = (
+        Invoice.query
+        .join(Order)
+        .filter(Order.user_id == user_id)
+        .options(
+            defer(Invoice.pdf_data),
+            contains_eager(Invoice.order).selectinload(Order.order_items),
+        )
+        .add_columns(or_(
+            Invoice.pdf_key != None,
+            func.coalesce(func.length(Invoice.pdf_data), 0) > 0,
+        ).label('pdf_available'))
+        .order_by(Invoice.created_at.desc())
+        .all()
+    )
+    data = []
+    for inv, pdf_available in rows:
+        order = inv.order
+        data.append({
+            'invoice_id': inv.id,
+            'invoice_number': inv.invoice_number,
+            'customer_name': inv.customer_name,
+            'customer_dni': inv.customer_dni,
+            'created_at': inv.created_at.isoformat() if inv.created_at else None,
+            'pdf_available': bool(pdf_available),
+            'status': inv.status,
+            'order_number': order.order_number,
+            'order_status': order.status,
+            'payment_method': order.payment_method,
+            'total_amount': float(order.total_amount),
+            'items': [
+                {
+                    'product_name': item.product_name,
+                    'quantity': item.quantity,
+                    'unit_price': float(item.unit_price),
+                    'total_price': float(item.total_price),
+                }
+                for item in order.order_items
+            ]
+        })
+    return jsonify(data)
+
+
+# Endpoint: /invoices/export?from=2025-01-01&to=2025-01-31&format=zip|pdf
+# (o order_ids=a,b,c; por POST también acepta los mismos campos en JSON)
+@invoices_bp.route('/export', methods=['GET', 'POST'])
+@admin_required
+def export_invoices():
+    args = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    export_format = args.get('format', 'zip')
+    if export_format not in ('zip', 'pdf'):
+        return jsonify({'error': "format debe ser 'zip' o 'pdf'"}), 400
+    try:
+        filters = invoice_export.parse_filters(args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows = invoice_export.iter_invoices(**filters)
+    if export_format == 'pdf':
+        body, mimetype = invoice_export.stream_merged_pdf(rows), 'application/pdf'
     else:
-        invoices = crud.get_all_invoices()
-        return jsonify([i.to_dict() for i in invoices])
+        body, mimetype = invoice_export.stream_zip(rows), 'application/zip'
+    # stream_with_context: los lotes se consultan mientras se envía la respuesta
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="boletas.{export_format}"'
+    return response
 
 
 @invoices_bp.route('/<invoice_id>', methods=['GET'])
 def get_invoice(invoice_id):
-    item = crud.get_invoice_by_id(invoice_id)
-    return (jsonify(item.to_dict()), 200) if item else ('', 404)
+    item = Invoice.query.options(defer(Invoice.pdf_data)).get(invoice_id)
+    if not item:
+        return '', 404
+    # El status y el pdf_key cambian al terminar el PDF: son parte de la versión
+    etag = http_cache.make_etag(
+        "invoice", item.id, item.invoice_number, item.status, item.pdf_key, item.updated_at,
+    )
+    return http_cache.conditional_response(
+        etag, item.updated_at or item.created_at, lambda: jsonify(item.to_dict()),
+    )
 
 @invoices_bp.route('/', methods=['POST'])
 def add_invoice():
@@ -95,40 +136,42 @@ def add_invoice():
     if not order:
         return jsonify({'error': 'Orden no encontrada'}), 404
 
-    # Construir ítems CON IGV (directamente como están guardados)
-    items = []
-    for item in order.order_items:
-        items.append({
-            'code': item.product_code,
-            'name': item.product_name,
-            'quantity': item.quantity,
-            'price': float(item.unit_price),  # ya incluye IGV
-        })
-
-    from datetime import datetime
-    invoice_number = f"INV-{datetime.utcnow().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8]}"
-
-    pdf_bytes = generar_boleta_pdf({
-        'invoiceNumber': invoice_number,
-        'date': datetime.utcnow().strftime('%Y-%m-%d %H:%M'),
-        'customerName': customer_name,
-        'customerDni': customer_dni,
-        'customerEmail': order.user.email,
-        'customerPhone': order.shipping_address.get('phone', ''),
-        'items': items,
-    })
+    invoice_number = f"INV-{crud.now_lima().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8]}"
 
     invoice_data = {
         'order_id': order_id,
         'invoice_number': invoice_number,
         'customer_name': customer_name,
         'customer_dni': customer_dni,
-        'pdf_data': pdf_bytes,
-        'created_at': datetime.utcnow(),
+        'status': invoice_jobs.PENDING,
     }
 
     invoice = crud.create_invoice(invoice_data)
-    return jsonify(invoice.to_dict()), 201
+
+    # El PDF se genera en segundo plano; el id de la boleta es el id del trabajo
+    invoice_jobs.submit(invoice.id, invoice_jobs.build_render_data(invoice, order))
+    body = invoice.to_dict()
+    body['job_id'] = invoice.id
+    return jsonify(body), 202
+
+@invoices_bp.route('/<invoice_id>/status', methods=['GET'])
+@login_required
+def get_invoice_status(invoice_id):
+    row = (
+        Invoice.query
+        .join(Order, Order.id == Invoice.order_id)
+        .with_entities(Invoice.id, Invoice.status, Order.user_id)
+        .filter(Invoice.id == invoice_id)
+        .first()
+    )
+    if not row:
+        return jsonify({'error': 'Boleta no encontrada'}), 404
+    if row.user_id != current_user_id() and current_role() != 'admin':
+        return jsonify({'error': 'No autorizado para ver esta boleta'}), 403
+    body = {'job_id': row.id, 'status': row.status}
+    if row.status == invoice_jobs.READY:
+        body['download_url'] = f"/invoices/{row.id}/download"
+    return jsonify(body), 200
 
 @invoices_bp.route('/<invoice_id>', methods=['PUT'])
 def update_invoice(invoice_id):
@@ -145,31 +188,44 @@ def delete_invoice(invoice_id):
 
 # Endpoint: /invoices/<invoice_id>/download
 @invoices_bp.route('/<invoice_id>/download', methods=['GET'])
+@login_required
 def download_invoice(invoice_id):
-    invoice = Invoice.query.get(invoice_id)
-    if not invoice or not invoice.pdf_data:
+    # El blob legado no se lee hasta saber que hay que enviarlo
+    invoice = Invoice.query.options(defer(Invoice.pdf_data)).get(invoice_id)
+    if not invoice:
         abort(404, description='Boleta no encontrada')
+    # El rol viene en el token: no hace falta leer el usuario. Va antes que el
+    # estado para que nadie más pueda consultar cómo va el trabajo
+    if invoice.order.user_id != current_user_id() and current_role() != 'admin':
+        abort(403, description='No autorizado para descargar esta boleta')
+    if invoice.status == invoice_jobs.PENDING:
+        # No es 2xx: un cliente que solo mira response.ok no guarda este JSON como .pdf
+        response = jsonify({'job_id': invoice.id, 'status': invoice.status,
+                            'message': 'La boleta aún se está generando'})
+        response.headers['Retry-After'] = '2'
+        return response, 409
+    if not (invoice.pdf_key or _has_legacy_pdf(invoice_id)):
+        abort(404, description='Boleta no encontrada')
+    return _send_invoice_pdf(invoice)
+
+
+def _has_legacy_pdf(invoice_id):
+    return bool(
+        Invoice.query
+        .with_entities(func.coalesce(func.length(Invoice.pdf_data), 0) > 0)
+        .filter(Invoice.id == invoice_id)
+        .scalar()
+    )
 
-    if JWT_ENABLED:
-        from flask_jwt_extended import jwt_required, get_jwt_identity
-        from models import User
-        @jwt_required()
-        def secured_download():
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
-            if invoice.order.user_id != user_id and (not user or user.role != 'admin'):
-                abort(403, description='No autorizado para descargar esta boleta')
-            return send_file(
-                BytesIO(invoice.pdf_data),
-                download_name=f"boleta-{invoice.invoice_number}.pdf",
-                as_attachment=True,
-                mimetype='application/pdf'
-            )
-        return secured_download()
 
+def _send_invoice_pdf(invoice):
+    download_name = f"boleta-{invoice.invoice_number}.pdf"
+    if invoice.pdf_key:
+        return blob_store.get_blob_store().send(invoice.pdf_key, download_name)
+    # Boletas aún no migradas (ver flask migrate-invoice-blobs)
     return send_file(
         BytesIO(invoice.pdf_data),
-        download_name=f"boleta-{invoice.invoice_number}.pdf",
+        download_name=download_name,
         as_attachment=True,
         mimetype='application/pdf'
     )
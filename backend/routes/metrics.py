@@ -0,0 +1,20 @@
+import hmac
+from flask import Blueprint, Response, current_app, jsonify, request
+import cache
+import pool_metrics
+import request_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+# Endpoint: /metrics (formato de texto de Prometheus). Con METRICS_TOKEN
+# configurado el scraper debe enviar "Authorization: Bearer <token>".
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        sent = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(sent.encode(), token.encode()):
+            return jsonify({"message": "No autorizado"}), 401
+    body = request_metrics.render(pool=pool_metrics.snapshot(), cache_stats=cache.stats())
+    return Response(body, mimetype="text/plain; version=0.0.4")
@@ -1,5 +1,8 @@
 from flask import Blueprint, jsonify, request
 import crud
+import order_export
+from auth_utils import admin_required
+from routes.orders import export_response
 
 order_items_bp = Blueprint('order_items', __name__, url_prefix='/order_items')
 
@@ -12,6 +15,12 @@ def get_order_items():
     items = crud.get_all_order_items()
     return jsonify([i.to_dict() for i in items])
 
+@order_items_bp.route('/export', methods=['GET'])
+@admin_required
+def export_order_items():
+    """Exporta las líneas de orden, filtradas por su orden (mismos filtros que GET /orders/)."""
+    return export_response(order_export.lines_statement, 'lineas-de-orden')
+
 @order_items_bp.route('/<item_id>', methods=['GET'])
 def get_order_item(item_id):
     item = crud.get_order_item_by_id(item_id)
@@ -1,26 +1,70 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 import crud
+from auth_utils import admin_required
+from pagination import parse_limit
+import order_export
+
+# Máximo de órdenes por petición en /orders/bulk y tamaño de cada transacción
+BULK_MAX_ORDERS = 5000
+BULK_CHUNK_SIZE = 100
 
 orders_bp = Blueprint('orders', __name__, url_prefix='/orders')
 
+def order_filters(args):
+    return {
+        'search': args.get('search', type=str),
+        'status': args.get('status', type=str),
+        'payment_method': args.get('payment_method', type=str),
+        'date_from': args.get('date_from', type=str),
+        'date_to': args.get('date_to', type=str),
+    }
+
+def export_response(build_statement, name):
+    """Respuesta en streaming para /orders/export y /order_items/export."""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in order_export.MIMETYPES:
+        return jsonify({'error': "format debe ser 'csv' o 'ndjson'"}), 400
+    statement = build_statement(order_filters(request.args))
+    response = Response(
+        stream_with_context(order_export.stream(statement, export_format)),
+        mimetype=order_export.MIMETYPES[export_format],
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}.{export_format}"'
+    return response
+
 @orders_bp.route('/', methods=['GET'])
 def get_orders():
     """
     Obtiene todas las órdenes, con filtros opcionales:
-    - search: texto libre (número de orden, correo de usuario)
+    - search: número de orden, nombre o correo del usuario (por prefijo)
     - status: estado de la orden (pending, paid, etc.)
     - payment_method: método de pago
     - date_from, date_to: rango de fechas (YYYY-MM-DD)
+    Con limit y/o cursor responde por páginas:
+    {"items": [...], "next_cursor": "...", "total": n, "total_exact": bool}
+    (total solo en la primera página; si no es exacto, hay al menos ese número).
     """
-    filters = {
-        'search': request.args.get('search', type=str),
-        'status': request.args.get('status', type=str),
-        'payment_method': request.args.get('payment_method', type=str),
-        'date_from': request.args.get('date_from', type=str),
-        'date_to': request.args.get('date_to', type=str),
-    }
-    orders = crud.get_all_orders(**filters)
-    return jsonify([order.to_dict() for order in orders]), 200
+    filters = order_filters(request.args)
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        orders = crud.get_all_orders(**filters)
+        return jsonify([order.to_dict() for order in orders]), 200
+
+    cursor = request.args.get('cursor', type=str)
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        orders, next_cursor = crud.get_orders_page(limit, cursor=cursor, **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    body = {'items': [order.to_dict() for order in orders], 'next_cursor': next_cursor}
+    if not cursor:
+        body['total'], body['total_exact'] = crud.count_orders(**filters)
+    return jsonify(body), 200
+
+@orders_bp.route('/export', methods=['GET'])
+@admin_required
+def export_orders():
+    """Exporta las órdenes (mismos filtros que GET /orders/) en CSV o NDJSON (?format=)."""
+    return export_response(order_export.orders_statement, 'ordenes')
 
 @orders_bp.route('/<order_id>', methods=['GET'])
 def get_order(order_id):
@@ -40,6 +84,28 @@ def add_order():
         return jsonify({'error': str(e)}), 400
     return jsonify(order.to_dict()), 201
 
+@orders_bp.route('/bulk', methods=['POST'])
+@admin_required
+def add_orders_bulk():
+    """
+    Crea muchas órdenes en una petición (importaciones, sincronización de POS).
+    Cuerpo: {"orders": [{...igual que POST /orders/...}, ...]}
+    Responde con el resultado de cada orden; las que fallan no afectan al resto.
+    """
+    data = request.get_json() or {}
+    orders = data.get('orders')
+    if not isinstance(orders, list) or not orders:
+        return jsonify({'error': 'Se requiere una lista "orders"'}), 400
+    if len(orders) > BULK_MAX_ORDERS:
+        return jsonify({'error': f'Máximo {BULK_MAX_ORDERS} órdenes por petición'}), 400
+    results = crud.create_orders_bulk(orders, chunk_size=BULK_CHUNK_SIZE)
+    created = sum(1 for r in results if r['status'] == 'created')
+    return jsonify({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results,
+    }), 200
+
 @orders_bp.route('/<order_id>', methods=['PUT'])
 def update_order(order_id):
     """Actualiza una orden existente."""
@@ -1,21 +1,69 @@
 from flask import Blueprint, jsonify, request
 import crud
 from auth_utils import admin_required
-from sqlalchemy import or_, func
+from sqlalchemy import func
+from sqlalchemy.orm import load_only
 from models import Product
+from pagination import keyset_paginate, parse_limit, InvalidCursor
+import search_index
+import facet_index
+import http_cache
+import io
+import product_import
 
 products_bp = Blueprint('products', __name__, url_prefix='/products')
 
+# Modo de orden -> (expresión de orden, atributo del modelo, descendente).
+# El id se agrega siempre como desempate para que el cursor sea estable.
+SORT_MODES = {
+    "name": (Product.name, "name", False),
+    "price_asc": (Product.price, "price", False),
+    "price_desc": (Product.price, "price", True),
+    "stock": (Product.stock, "stock", True),
+    "created_at": (Product.created_at, "created_at", True),
+}
+
+def _parse_fields(fields_param):
+    if not fields_param:
+        return None
+    fields = [f.strip() for f in fields_param.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in Product.FIELDS]
+    if unknown:
+        raise ValueError(f"Campos no válidos: {', '.join(unknown)}")
+    return fields
+
 @products_bp.route('/', methods=['GET'])
 def get_products():
+    # El ETag depende del estado de la tabla y de los parámetros de la consulta
+    latest, count = http_cache.watermark(Product.updated_at)
+    etag = http_cache.make_etag("products", latest, count, request.query_string.decode())
+    return http_cache.conditional_response(etag, None, _list_products)
+
+def _list_products():
     search = request.args.get("search", type=str)
     category = request.args.get("category", type=str)
     brand = request.args.get("brand", type=str)
     sortBy = request.args.get("sortBy", type=str)
     is_active_param = request.args.get("is_active", type=str)
+    cursor = request.args.get("cursor", type=str)
+    paginated = "limit" in request.args or "cursor" in request.args
+
+    try:
+        fields = _parse_fields(request.args.get("fields", type=str))
+        limit = parse_limit(request.args.get("limit")) if paginated else None
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    sort_mode = sortBy if sortBy in SORT_MODES else "created_at"
+    sort_expr, sort_attr, descending = SORT_MODES[sort_mode]
 
     query = Product.query
 
+    # Proyección: solo carga las columnas pedidas (más id y la columna de orden)
+    if fields is not None:
+        columns = {"id", sort_attr, *fields}
+        query = query.options(load_only(*[getattr(Product, c) for c in columns]))
+
     # Filtrar activos/inactivos si se manda el filtro
     if is_active_param is not None and is_active_param.lower() != "all":
         if is_active_param.lower() in ("true", "1"):
@@ -23,19 +71,14 @@ def get_products():
         elif is_active_param.lower() in ("false", "0"):
             query = query.filter_by(is_active=False)
 
-    # Búsqueda general: código, nombre, descripción, modelo, marca
+    # Búsqueda general (código, nombre, descripción, modelo, marca) vía índice invertido;
+    # como mucho SEARCH_MAX_RESULTS ids, así un prefijo corto no arma un IN enorme
+    ranked_ids = None
     if search:
-        like_str = f"%{search.lower()}%"
-        query = query.filter(
-            or_(
-                func.lower(Product.product_code).like(like_str),
-                func.lower(Product.name).like(like_str),
-                func.lower(Product.description).like(like_str),
-                func.lower(Product.long_description).like(like_str),
-                func.lower(Product.model).like(like_str),
-                func.lower(Product.brand).like(like_str)
-            )
-        )
+        ranked_ids = search_index.search_product_ids(search)
+        if not ranked_ids:
+            return jsonify({"items": [], "next_cursor": None} if paginated else [])
+        query = query.filter(Product.id.in_(ranked_ids))
 
     # Filtrar por categoría
     if category and category != "all":
@@ -45,31 +88,100 @@ def get_products():
     if brand and brand != "all":
         query = query.filter(func.lower(Product.brand) == brand.lower())
 
-    # Ordenar
-    if sortBy == "name":
-        query = query.order_by(Product.name.asc())
-    elif sortBy == "price_asc":
-        query = query.order_by(Product.price.asc())
-    elif sortBy == "price_desc":
-        query = query.order_by(Product.price.desc())
-    elif sortBy == "stock":
-        query = query.order_by(Product.stock.desc())
-    else:
-        query = query.order_by(Product.created_at.desc())
+    # Filtrar por rango de precio (mismas claves que /products/facets, p. ej. "100-300")
+    price = request.args.get("price", type=str)
+    if price and price != "all":
+        bucket = next(((lo, hi) for lo, hi in facet_index.PRICE_BUCKETS
+                       if facet_index.bucket_key(lo, hi) == price), None)
+        if bucket is None:
+            return jsonify({"message": "Rango de precio no válido"}), 400
+        query = query.filter(Product.price >= bucket[0])
+        if bucket[1] is not None:
+            query = query.filter(Product.price < bucket[1])
+
+    # Filtrar por disponibilidad
+    in_stock_param = request.args.get("in_stock", type=str)
+    if in_stock_param is not None and in_stock_param.lower() != "all":
+        if in_stock_param.lower() in ("true", "1"):
+            query = query.filter(Product.stock > 0)
+        else:
+            query = query.filter(Product.stock <= 0)
 
+    # Paginación por cursor: {"items": [...], "next_cursor": "..."}
+    if paginated:
+        def sort_key(p):
+            return [getattr(p, sort_attr), p.id]
+        try:
+            productos, next_cursor = keyset_paginate(
+                query, [sort_expr, Product.id], descending, limit, sort_mode,
+                cursor=cursor, key=sort_key,
+            )
+        except InvalidCursor as e:
+            return jsonify({"message": str(e)}), 400
+        return jsonify({
+            "items": [p.to_dict(fields) for p in productos],
+            "next_cursor": next_cursor,
+        })
+
+    # Sin paginación se mantiene la respuesta original (lista completa)
+    if descending:
+        query = query.order_by(sort_expr.desc(), Product.id.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), Product.id.asc())
     productos = query.all()
-    return jsonify([p.to_dict() for p in productos])
+    # Una búsqueda sin sortBy explícito se devuelve por relevancia
+    if ranked_ids is not None and not sortBy:
+        rank = {pid: i for i, pid in enumerate(ranked_ids)}
+        productos.sort(key=lambda p: rank[p.id])
+    return jsonify([p.to_dict(fields) for p in productos])
 
 @products_bp.route('/brands', methods=['GET'])
 def get_brands():
-    brands = Product.query.with_entities(Product.brand).filter(Product.is_active == True).distinct().all()
+    latest, count = http_cache.watermark(Product.updated_at)
+    etag = http_cache.make_etag("brands", latest, count)
     # Devuelve solo la lista de nombres
-    return jsonify([b[0] for b in brands if b[0]])
+    return http_cache.conditional_response(etag, None, lambda: jsonify(crud.get_brands()))
+
+@products_bp.route('/facets', methods=['GET'])
+def get_facets():
+    """
+    Conteos por marca, categoría, rango de precio y stock para los filtros
+    actuales (search, category, brand, price, in_stock, is_active).
+    Cada faceta se cuenta sin aplicar su propio filtro.
+    """
+    search = request.args.get("search", type=str)
+    category = request.args.get("category", type=str)
+    brand = request.args.get("brand", type=str)
+    price = request.args.get("price", type=str)
+    in_stock_param = request.args.get("in_stock", type=str)
+    is_active_param = request.args.get("is_active", type=str)
+
+    product_ids = None
+    if search:
+        product_ids = search_index.search_product_ids(search)
+
+    def as_bool(value):
+        if value is None or value.lower() == "all":
+            return None
+        return value.lower() in ("true", "1")
+
+    counts = facet_index.get_facet_index().counts(
+        product_ids=product_ids,
+        is_active=as_bool(is_active_param),
+        brand=brand if brand and brand != "all" else None,
+        category_id=category if category and category != "all" else None,
+        price_bucket=price if price and price != "all" else None,
+        in_stock=as_bool(in_stock_param),
+    )
+    return jsonify(counts)
 
 @products_bp.route('/<product_id>', methods=['GET'])
 def get_product(product_id):
-    product = crud.get_product_by_id(product_id)
-    return (jsonify(product.to_dict()), 200) if product else ('', 404)
+    product = crud.get_product_data(product_id)
+    if not product:
+        return '', 404
+    etag = http_cache.make_etag("product", product["id"], product["updated_at"])
+    return http_cache.conditional_response(etag, product["updated_at"], lambda: jsonify(product))
 
 @products_bp.route('/', methods=['POST'])
 @admin_required
@@ -81,6 +193,32 @@ def add_product():
     product = crud.create_product(data)
     return jsonify(product.to_dict()), 201
 
+# Endpoint: /products/import?format=csv|jsonl&chunk_size=500
+# (archivo en el campo "file" de un multipart o directamente en el cuerpo)
+@products_bp.route('/import', methods=['POST'])
+@admin_required
+def import_products():
+    upload = request.files.get('file')
+    import_format = request.args.get('format') or product_import.format_from_filename(
+        upload.filename if upload else None
+    )
+    if import_format not in product_import.FORMATS:
+        return jsonify({"message": "format debe ser 'csv' o 'jsonl'"}), 400
+    try:
+        chunk_size = int(request.args.get('chunk_size', product_import.CHUNK_SIZE))
+    except ValueError:
+        return jsonify({"message": "chunk_size debe ser un entero"}), 400
+    # Se lee en streaming; utf-8-sig descarta el BOM que agrega Excel. Con
+    # surrogateescape un byte inválido falla solo su línea: los lotes anteriores
+    # ya están guardados y cortar ahí respondería 400 sin decir qué se importó
+    raw = upload.stream if upload else io.BufferedReader(request.stream)
+    stream = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='surrogateescape', newline='')
+    try:
+        result = product_import.import_products(stream, import_format, chunk_size)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify(result), 200
+
 @products_bp.route('/<product_id>', methods=['PUT'])
 @admin_required
 def update_product(product_id):
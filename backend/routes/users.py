@@ -1,8 +1,16 @@
 from flask import Blueprint, jsonify, request
+from passwords import PasswordBusy
 import crud
 
 users_bp = Blueprint('users', __name__, url_prefix='/users')
 
+# create_user hashea en el pool de passwords.py: saturado, 503 con Retry-After (como /register)
+@users_bp.errorhandler(PasswordBusy)
+def _busy(error):
+    response = jsonify({"message": str(error)})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 503
+
 @users_bp.route('/', methods=['GET'])
 def get_users():
     users = crud.get_all_users()
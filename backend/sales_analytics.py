@@ -0,0 +1,361 @@
+"""
+Analítica de ventas por periodo con tablas de rollup.
+
+sales_rollups guarda, por hora, día y mes, las ventas por dimensión:
+  total            órdenes, unidades e ingresos (total_amount de la orden)
+  payment_method   ídem por medio de pago
+  product / category / brand
+                   órdenes distintas, unidades e ingresos de las líneas (total_price)
+Las órdenes canceladas no cuentan. Los periodos usan la hora de Lima, igual
+que created_at de las órdenes. Categoría y marca son las actuales del producto.
+
+Mantenimiento:
+- Cada escritura de órdenes anota su día en sales_dirty_days (un INSERT,
+  dentro de la misma transacción).
+- refresh() (flask rollup-sales, por cron) recalcula esos días desde
+  orders/order_items: filas de hora y día, y luego los meses a partir de los días.
+- backfill() (flask backfill-sales) reconstruye todo el historial mes a mes.
+
+Las consultas leen solo rollups: una serie lee un punto por periodo y el
+top-N cubre el rango con meses completos más días y horas en los bordes,
+así un año son ~12 filas por clave en vez de recorrer las órdenes.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from sqlalchemy import and_, or_, func, insert
+from models import db, Order, OrderItem, Product, Category, SalesRollup, SalesDirtyDay
+
+HOUR = "hour"
+DAY = "day"
+MONTH = "month"
+INTERVALS = (HOUR, DAY, MONTH)
+
+TOTAL = "total"
+PAYMENT_METHOD = "payment_method"
+PRODUCT = "product"
+CATEGORY = "category"
+BRAND = "brand"
+DIMENSIONS = (TOTAL, PAYMENT_METHOD, PRODUCT, CATEGORY, BRAND)
+
+EXCLUDED_STATUSES = ("cancelled",)
+MAX_POINTS = 2000
+INSERT_BATCH = 1000
+REFRESH_BATCH = 5000
+
+
+# --- Periodos ---
+
+def _naive(dt):
+    # Antes de recargarse de la BD, created_at trae zona (now_lima); la BD la guarda sin zona
+    return dt.replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def truncate(dt, granularity):
+    dt = _naive(dt).replace(minute=0, second=0, microsecond=0)
+    if granularity == HOUR:
+        return dt
+    dt = dt.replace(hour=0)
+    return dt.replace(day=1) if granularity == MONTH else dt
+
+
+def step(dt, granularity):
+    if granularity == HOUR:
+        return dt + timedelta(hours=1)
+    if granularity == DAY:
+        return dt + timedelta(days=1)
+    return dt.replace(year=dt.year + 1, month=1) if dt.month == 12 else dt.replace(month=dt.month + 1)
+
+
+def _ceil(dt, granularity):
+    start = truncate(dt, granularity)
+    return start if start == _naive(dt) else step(start, granularity)
+
+
+def choose_interval(start, end):
+    span = end - start
+    if span <= timedelta(days=2):
+        return HOUR
+    if span <= timedelta(days=120):
+        return DAY
+    return MONTH
+
+
+def cover(start, end):
+    """
+    Segmentos [(granularidad, desde, hasta)] que cubren [start, end) con la
+    menor cantidad de filas: horas hasta el primer día completo, días hasta el
+    primer mes completo, meses, y de nuevo días y horas al final.
+    """
+    start, end = truncate(start, HOUR), _ceil(end, HOUR)
+    segments = []
+
+    def add(granularity, a, b):
+        if a < b:
+            segments.append((granularity, a, b))
+
+    day_a = min(_ceil(start, DAY), end)
+    day_b = max(truncate(end, DAY), day_a)
+    add(HOUR, start, day_a)
+    month_a = min(_ceil(day_a, MONTH), day_b)
+    month_b = max(truncate(day_b, MONTH), month_a)
+    add(DAY, day_a, month_a)
+    add(MONTH, month_a, month_b)
+    add(DAY, month_b, day_b)
+    add(HOUR, day_b, end)
+    return segments
+
+
+# --- Hooks de escritura (dentro de la transacción del llamador) ---
+
+def mark_dirty(*created_ats):
+    days = sorted({truncate(c, DAY) for c in created_ats if c is not None})
+    if days:
+        db.session.execute(insert(SalesDirtyDay), [{"day": day} for day in days])
+
+
+def mark_order_dirty(order_id):
+    mark_dirty(db.session.query(Order.created_at).filter(Order.id == order_id).scalar())
+
+
+def mark_user_orders_dirty(user_id):
+    mark_dirty(*[c for (c,) in db.session.query(Order.created_at).filter(Order.user_id == user_id)])
+
+
+# --- Cálculo ---
+
+def _counted():
+    return or_(Order.status == None, Order.status.notin_(EXCLUDED_STATUSES))
+
+
+def _aggregate(start, end):
+    """{(granularidad, dimensión, clave, periodo): [órdenes, unidades, ingresos]} de horas y días."""
+    acc = defaultdict(lambda: [0, 0, Decimal(0)])
+
+    orders = (
+        db.session.query(Order.created_at, Order.payment_method, Order.total_amount)
+        .filter(Order.created_at >= start, Order.created_at < end, _counted())
+        .execution_options(yield_per=1000)
+    )
+    for created_at, payment_method, total_amount in orders:
+        amount = Decimal(total_amount or 0)
+        for granularity in (HOUR, DAY):
+            bucket = truncate(created_at, granularity)
+            for key in ((TOTAL, ""), (PAYMENT_METHOD, payment_method or "")):
+                row = acc[(granularity,) + key + (bucket,)]
+                row[0] += 1
+                row[2] += amount
+
+    # Líneas ordenadas por orden: las órdenes distintas se cuentan sin guardar ids
+    lines = (
+        db.session.query(
+            OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.total_price,
+            Order.created_at, Order.payment_method, Product.category_id, Product.brand,
+        )
+        .join(Order, OrderItem.order_id == Order.id)
+        .outerjoin(Product, OrderItem.product_id == Product.id)
+        .filter(Order.created_at >= start, Order.created_at < end, _counted())
+        .order_by(OrderItem.order_id)
+        .execution_options(yield_per=1000)
+    )
+    current_order, seen = None, set()
+    for order_id, product_id, quantity, total_price, created_at, payment_method, category_id, brand in lines:
+        if order_id != current_order:
+            current_order, seen = order_id, set()
+        quantity = quantity or 0
+        keys = ((PRODUCT, product_id or ""), (CATEGORY, category_id or ""), (BRAND, brand or ""))
+        for granularity in (HOUR, DAY):
+            bucket = truncate(created_at, granularity)
+            acc[(granularity, TOTAL, "", bucket)][1] += quantity
+            acc[(granularity, PAYMENT_METHOD, payment_method or "", bucket)][1] += quantity
+            for key in keys:
+                row = acc[(granularity,) + key + (bucket,)]
+                if key not in seen:
+                    row[0] += 1
+                row[1] += quantity
+                row[2] += Decimal(total_price or 0)
+        seen.update(keys)
+    return acc
+
+
+def _insert_rows(rows):
+    for i in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(insert(SalesRollup), rows[i:i + INSERT_BATCH])
+
+
+def _rebuild_month(month):
+    end = step(month, MONTH)
+    SalesRollup.query.filter(
+        SalesRollup.granularity == MONTH, SalesRollup.bucket_start == month,
+    ).delete(synchronize_session=False)
+    totals = (
+        db.session.query(
+            SalesRollup.dimension, SalesRollup.dim_key,
+            func.sum(SalesRollup.orders), func.sum(SalesRollup.units), func.sum(SalesRollup.revenue),
+        )
+        .filter(SalesRollup.granularity == DAY, SalesRollup.bucket_start >= month, SalesRollup.bucket_start < end)
+        .group_by(SalesRollup.dimension, SalesRollup.dim_key)
+        .all()
+    )
+    _insert_rows([
+        {"granularity": MONTH, "dimension": dimension, "dim_key": key, "bucket_start": month,
+         "orders": orders, "units": units, "revenue": revenue}
+        for dimension, key, orders, units, revenue in totals
+    ])
+
+
+def rebuild(start, end):
+    """Recalcula los rollups de los días en [start, end) y de sus meses. No hace commit."""
+    start, end = truncate(start, DAY), _ceil(end, DAY)
+    acc = _aggregate(start, end)
+    SalesRollup.query.filter(
+        SalesRollup.granularity.in_((HOUR, DAY)),
+        SalesRollup.bucket_start >= start,
+        SalesRollup.bucket_start < end,
+    ).delete(synchronize_session=False)
+    _insert_rows([
+        {"granularity": granularity, "dimension": dimension, "dim_key": key, "bucket_start": bucket,
+         "orders": orders, "units": units, "revenue": revenue}
+        for (granularity, dimension, key, bucket), (orders, units, revenue) in acc.items()
+    ])
+    month = truncate(start, MONTH)
+    while month < end:
+        _rebuild_month(month)
+        month = step(month, MONTH)
+
+
+def _day_ranges(days):
+    """Junta días consecutivos en rangos [desde, hasta)."""
+    ranges = []
+    for day in sorted(days):
+        if ranges and ranges[-1][1] == day:
+            ranges[-1][1] = step(day, DAY)
+        else:
+            ranges.append([day, step(day, DAY)])
+    return ranges
+
+
+def refresh():
+    """Actualización incremental: recalcula los días marcados. Devuelve cuántos días."""
+    total = 0
+    while True:
+        # FOR UPDATE: si corren dos a la vez, el segundo espera al primero
+        marks = (
+            SalesDirtyDay.query
+            .order_by(SalesDirtyDay.id)
+            .limit(REFRESH_BATCH)
+            .with_for_update()
+            .all()
+        )
+        if not marks:
+            return total
+        days = {truncate(mark.day, DAY) for mark in marks}
+        for start, end in _day_ranges(days):
+            rebuild(start, end)
+        SalesDirtyDay.query.filter(
+            SalesDirtyDay.id.in_([mark.id for mark in marks])
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        total += len(days)
+
+
+def backfill(start=None, end=None, log=print):
+    """
+    Reconstruye [start, end) mes a mes (un commit por mes); sin rango, todo el
+    historial, y entonces también descarta las marcas pendientes ya cubiertas.
+    Devuelve los meses procesados.
+    """
+    full = start is None and end is None
+    last_mark = db.session.query(func.max(SalesDirtyDay.id)).scalar()
+    if start is None or end is None:
+        first, last = db.session.query(func.min(Order.created_at), func.max(Order.created_at)).one()
+        if first is None:
+            return 0
+        start = start or first
+        end = end or step(truncate(last, DAY), DAY)
+    months = 0
+    month = truncate(start, MONTH)
+    while month < end:
+        rebuild(max(month, truncate(start, DAY)), min(step(month, MONTH), _ceil(end, DAY)))
+        db.session.commit()
+        months += 1
+        log(f"{month:%Y-%m} listo")
+        month = step(month, MONTH)
+    if full and last_mark is not None:
+        SalesDirtyDay.query.filter(SalesDirtyDay.id <= last_mark).delete(synchronize_session=False)
+        db.session.commit()
+    return months
+
+
+# --- Consultas ---
+
+def _names(dimension, keys):
+    if dimension == PRODUCT:
+        rows = db.session.query(Product.id, Product.name).filter(Product.id.in_(keys)).all()
+    elif dimension == CATEGORY:
+        rows = db.session.query(Category.id, Category.name).filter(Category.id.in_(keys)).all()
+    else:
+        return {}
+    return dict(rows)
+
+
+def top(start, end, dimension=PRODUCT, by="revenue", limit=10):
+    conditions = [
+        and_(SalesRollup.granularity == granularity,
+             SalesRollup.bucket_start >= a, SalesRollup.bucket_start < b)
+        for granularity, a, b in cover(start, end)
+    ]
+    if not conditions:
+        return []
+    orders = func.sum(SalesRollup.orders)
+    units = func.sum(SalesRollup.units)
+    revenue = func.sum(SalesRollup.revenue)
+    metric = {"revenue": revenue, "units": units, "orders": orders}[by]
+    rows = (
+        db.session.query(SalesRollup.dim_key, orders, units, revenue)
+        .filter(SalesRollup.dimension == dimension, or_(*conditions))
+        .group_by(SalesRollup.dim_key)
+        .order_by(metric.desc(), SalesRollup.dim_key)
+        .limit(limit)
+        .all()
+    )
+    names = _names(dimension, [row[0] for row in rows])
+    return [
+        {"key": key, "name": names.get(key, key), "orders": int(o or 0), "units": int(u or 0),
+         "revenue": float(r or 0)}
+        for key, o, u, r in rows
+    ]
+
+
+def series(start, end, interval, dimension=TOTAL, key=""):
+    """Un punto por periodo en [start, end), con ceros donde no hubo ventas."""
+    first = truncate(start, interval)
+    buckets = []
+    bucket = first
+    while bucket < end:
+        buckets.append(bucket)
+        if len(buckets) > MAX_POINTS:
+            raise ValueError(f"Demasiados puntos (máximo {MAX_POINTS}); usa un intervalo mayor")
+        bucket = step(bucket, interval)
+    rows = (
+        db.session.query(SalesRollup.bucket_start, SalesRollup.orders, SalesRollup.units, SalesRollup.revenue)
+        .filter(
+            SalesRollup.granularity == interval,
+            SalesRollup.dimension == dimension,
+            SalesRollup.dim_key == key,
+            SalesRollup.bucket_start >= first,
+            SalesRollup.bucket_start < end,
+        )
+        .all()
+    )
+    found = {row[0]: row for row in rows}
+    points = []
+    for bucket in buckets:
+        row = found.get(bucket)
+        points.append({
+            "bucket": bucket.isoformat(),
+            "orders": row[1] if row else 0,
+            "units": row[2] if row else 0,
+            "revenue": float(row[3]) if row else 0.0,
+        })
+    return points
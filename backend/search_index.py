@@ -0,0 +1,221 @@
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from flask import current_app
+from index_sync import IndexSync
+
+# Peso de cada columna en la relevancia (el código y el nombre pesan más)
+FIELD_WEIGHTS = {
+    "product_code": 4.0,
+    "name": 3.0,
+    "brand": 2.0,
+    "model": 2.0,
+    "description": 1.0,
+    "long_description": 0.5,
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text):
+    """Minúsculas y sin tildes: 'Gráfica' -> 'grafica', 'Año' -> 'ano'."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(fold(text))
+
+
+def product_document(product):
+    return {field: getattr(product, field) or "" for field in FIELD_WEIGHTS}
+
+
+class MemorySearchIndex:
+    """Índice invertido en memoria: término -> {product_id: peso}."""
+
+    def __init__(self):
+        self._postings = {}
+        self._doc_terms = {}
+        self._terms = []  # términos ordenados para la búsqueda por prefijo
+        self._lock = threading.RLock()
+
+    def add(self, product_id, document):
+        weights = {}
+        for field, text in document.items():
+            for token in tokenize(text):
+                weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS.get(field, 1.0)
+        with self._lock:
+            self._remove(product_id)
+            for token, weight in weights.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    insort(self._terms, token)
+                postings[product_id] = weight
+            self._doc_terms[product_id] = set(weights)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        for token in self._doc_terms.pop(product_id, ()):
+            postings = self._postings[token]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                del self._terms[bisect_left(self._terms, token)]
+
+    def clear(self):
+        with self._lock:
+            self._postings, self._doc_terms, self._terms = {}, {}, []
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def _expand(self, prefix):
+        start = bisect_left(self._terms, prefix)
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def search(self, query, limit=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            total = len(self._doc_terms) or 1
+            scores = None
+            # Todas las palabras deben aparecer (AND); cada una se busca como prefijo
+            for token in tokens:
+                matches = {}
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    boost = 1.0 if term == token else 0.5
+                    for product_id, weight in postings.items():
+                        score = weight * idf * boost
+                        if score > matches.get(product_id, 0.0):
+                            matches[product_id] = score
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {pid: s + matches[pid] for pid, s in scores.items() if pid in matches}
+                if not scores:
+                    return []
+        ranked = sorted(scores, key=lambda pid: (-scores[pid], pid))
+        return ranked[:limit] if limit else ranked
+
+
+class SqliteSearchIndex:
+    """Mismo contrato que MemorySearchIndex sobre una tabla FTS5 de SQLite."""
+
+    def __init__(self, path=":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        columns = ", ".join(FIELD_WEIGHTS)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+                f"product_id UNINDEXED, {columns}, "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+
+    def add(self, product_id, document):
+        values = [product_id] + [document.get(field) or "" for field in FIELD_WEIGHTS]
+        placeholders = ", ".join("?" for _ in values)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM product_search WHERE product_id = ?", (product_id,))
+            self._conn.execute(f"INSERT INTO product_search VALUES ({placeholders})", values)
+
+    def remove(self, product_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM product_search WHERE product_id = ?", (product_id,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM product_search")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM product_search").fetchone()[0]
+
+    def search(self, query, limit=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = " ".join(f'"{token}"*' for token in tokens)
+        weights = ", ".join(str(w) for w in FIELD_WEIGHTS.values())
+        sql = (
+            f"SELECT product_id FROM product_search WHERE product_search MATCH ? "
+            f"ORDER BY bm25(product_search, 0, {weights}), product_id"
+        )
+        params = [match]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, params)]
+
+
+_index = None
+_index_lock = threading.Lock()
+_sync = IndexSync(lambda Product: [getattr(Product, field) for field in FIELD_WEIGHTS], product_document)
+
+
+def _create_index():
+    backend = current_app.config.get("SEARCH_BACKEND", "memory")
+    if backend == "sqlite":
+        return SqliteSearchIndex(current_app.config.get("SEARCH_SQLITE_PATH", ":memory:"))
+    if backend == "memory":
+        return MemorySearchIndex()
+    raise ValueError(f"SEARCH_BACKEND desconocido: {backend}")
+
+
+def get_search_index():
+    """
+    Devuelve el índice del proceso; lo construye desde la BD en el primer uso.
+    Los hooks de abajo lo actualizan con las escrituras de este proceso y las
+    de otros workers entran al sincronizarlo antes de cada uso (index_sync.py).
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = _create_index()
+                _sync.build(index)
+                _index = index
+                return _index
+    _sync.sync(_index)
+    return _index
+
+
+def search_product_ids(query, limit=None):
+    """Ids por relevancia; como mucho `limit` (por defecto SEARCH_MAX_RESULTS)."""
+    if limit is None:
+        limit = current_app.config.get("SEARCH_MAX_RESULTS", 1000)
+    return get_search_index().search(query, limit or None)
+
+
+# Hooks llamados desde crud tras cada escritura. Si el índice aún no se ha
+# construido no hacen nada: se cargará completo desde la BD al primer uso.
+def index_product(product):
+    if _index is not None:
+        _index.add(product.id, product_document(product))
+
+
+def remove_product(product_id):
+    if _index is not None:
+        _index.remove(product_id)
+
+
+def reset():
+    global _index, _sync
+    with _index_lock:
+        _index = None
+        _sync = IndexSync(_sync._columns, _sync._value)
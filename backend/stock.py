@@ -0,0 +1,209 @@
+"""
+Reserva de stock concurrente.
+
+Todo el descuento de stock pasa por UPDATE condicionales
+(`stock = stock - q WHERE stock >= q`), nunca por leer-restar-escribir en
+Python, así dos compras simultáneas del último producto no pueden ambas
+tener éxito. Las filas se bloquean siempre en el mismo orden (reservas del
+usuario y luego productos por id) para evitar deadlocks.
+
+Las funciones no hacen commit: corren dentro de la transacción del llamador
+(crud), que hace commit o rollback según el resultado.
+"""
+from datetime import timedelta
+import uuid
+from flask import current_app
+from sqlalchemy import case, update
+from models import db, Product, StockHold
+from clock import now_lima
+import admin_stats
+
+
+class InsufficientStock(ValueError):
+    def __init__(self, product_id, name, available):
+        self.product_id = product_id
+        self.available = available
+        super().__init__(f"No hay suficiente stock para el producto {name}. Quedan {available}.")
+
+
+def _normalize(lines):
+    """{product_id: cantidad} sumando líneas repetidas y validando cantidades."""
+    totals = {}
+    for product_id, quantity in lines:
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError("La cantidad debe ser mayor que 0")
+        totals[product_id] = totals.get(product_id, 0) + quantity
+    return totals
+
+
+def _expire_cached(product_ids):
+    # Los UPDATE directos no pasan por el ORM: refresca el stock de los objetos en sesión
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Product) and obj.id in product_ids:
+            db.session.expire(obj, ["stock", "updated_at"])
+
+
+def _guarded_update(quantities):
+    """UPDATE de todos los productos a la vez; devuelve cuántas filas alcanzaron."""
+    delta = case(quantities, value=Product.id)
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id.in_(sorted(quantities)))
+        .where(Product.stock >= delta)
+        .values(stock=Product.stock - delta)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def _first_short(rows, quantities):
+    """Primera fila cuyo stock no alcanza para lo pedido (None si todas alcanzan)."""
+    return next((row for row in rows if row.stock < quantities[row.id]), None)
+
+
+def _locked_rows(ids):
+    return (
+        db.session.query(Product.id, Product.name, Product.stock)
+        .filter(Product.id.in_(ids))
+        .order_by(Product.id)
+        .with_for_update()
+        .all()
+    )
+
+
+def _decrement(quantities):
+    """
+    Un solo UPDATE para todos los productos. Devuelve los ids que no existen;
+    lanza InsufficientStock si alguno no alcanza (el llamador debe hacer rollback).
+    """
+    if not quantities:
+        return set()
+    ids = sorted(quantities)
+    savepoint = db.session.begin_nested()
+    if _guarded_update(quantities) == len(ids):
+        savepoint.commit()
+        _expire_cached(ids)
+        admin_stats.stock_changed(quantities, -1)
+        return set()
+
+    # Camino lento (solo si algo falló): deshace y distingue productos
+    # inexistentes de falta de stock. La relectura es con FOR UPDATE: en
+    # REPEATABLE READ un SELECT simple vería la foto de inicio de la
+    # transacción y no la compra concurrente que se llevó las unidades.
+    savepoint.rollback()
+    rows = _locked_rows(ids)
+    short = _first_short(rows, quantities)
+    if short:
+        raise InsufficientStock(short.id, short.name, short.stock)
+    found = {row.id: quantities[row.id] for row in rows}
+    # Con las filas bloqueadas el stock no puede cambiar: si aun así no
+    # alcanzan todas, se informa como falta de stock (sin reintentar) el
+    # producto que se quedó corto según una nueva lectura
+    if found and _guarded_update(found) != len(found):
+        rows = _locked_rows(list(found))
+        short = _first_short(rows, quantities) or rows[0]
+        raise InsufficientStock(short.id, short.name, short.stock)
+    _expire_cached(list(found))
+    admin_stats.stock_changed(found, -1)
+    return set(ids) - set(found)
+
+
+def restock(lines):
+    """Devuelve unidades al stock (órdenes eliminadas, reservas vencidas)."""
+    quantities = _normalize(lines)
+    if not quantities:
+        return
+    ids = sorted(quantities)
+    delta = case(quantities, value=Product.id)
+    db.session.execute(
+        update(Product)
+        .where(Product.id.in_(ids))
+        .values(stock=Product.stock + delta)
+        .execution_options(synchronize_session=False)
+    )
+    _expire_cached(ids)
+    admin_stats.stock_changed(quantities, 1)
+
+
+def release_expired_holds(product_ids=None):
+    """Libera las reservas de carrito vencidas (todas o las de ciertos productos)."""
+    query = StockHold.query.filter(StockHold.expires_at <= now_lima())
+    if product_ids is not None:
+        query = query.filter(StockHold.product_id.in_(list(product_ids)))
+    holds = query.order_by(StockHold.user_id, StockHold.product_id).with_for_update().all()
+    if not holds:
+        return []
+    restock([(h.product_id, h.quantity) for h in holds])
+    for hold in holds:
+        db.session.delete(hold)
+    return sorted({h.product_id for h in holds})
+
+
+def reserve(lines, user_id=None):
+    """
+    Descuenta el stock de varias líneas [(product_id, cantidad), ...] en una
+    sola ida a la BD. Si el usuario tenía reservas de carrito para esos
+    productos, se consumen primero (ese stock ya estaba descontado).
+    Devuelve los ids de productos inexistentes, que el llamador puede omitir.
+    """
+    quantities = _normalize(lines)
+    release_expired_holds(quantities)
+
+    if user_id:
+        holds = (
+            StockHold.query
+            .filter(StockHold.user_id == user_id, StockHold.product_id.in_(sorted(quantities)))
+            .order_by(StockHold.product_id)
+            .with_for_update()
+            .all()
+        )
+        for hold in holds:
+            covered = min(hold.quantity, quantities[hold.product_id])
+            quantities[hold.product_id] -= covered
+            hold.quantity -= covered
+            if hold.quantity == 0:
+                db.session.delete(hold)
+        quantities = {pid: q for pid, q in quantities.items() if q > 0}
+
+    return _decrement(quantities)
+
+
+def hold_minutes():
+    return current_app.config.get("STOCK_HOLD_MINUTES", 0)
+
+
+def set_hold(user_id, product_id, quantity):
+    """
+    Deja reservadas exactamente `quantity` unidades del producto para el
+    carrito del usuario durante STOCK_HOLD_MINUTES (0 desactiva las reservas).
+    Solo se descuenta o devuelve la diferencia respecto de la reserva actual.
+    """
+    minutes = hold_minutes()
+    if not minutes or not user_id:
+        return None
+    release_expired_holds([product_id])
+    hold = (
+        StockHold.query
+        .filter_by(user_id=user_id, product_id=product_id)
+        .with_for_update()
+        .first()
+    )
+    current = hold.quantity if hold else 0
+    if quantity > current:
+        missing = _decrement({product_id: quantity - current})
+        if missing:
+            raise ValueError("Producto no encontrado")
+    elif quantity < current:
+        restock([(product_id, current - quantity)])
+
+    if quantity <= 0:
+        if hold:
+            db.session.delete(hold)
+        return None
+    if not hold:
+        hold = StockHold(id=str(uuid.uuid4()), user_id=user_id, product_id=product_id, created_at=now_lima())
+        db.session.add(hold)
+    hold.quantity = quantity
+    hold.expires_at = now_lima() + timedelta(minutes=minutes)
+    return hold
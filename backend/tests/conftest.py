@@ -0,0 +1,98 @@
+"""
+Fixtures de las pruebas: la app sobre un SQLite en memoria, recreado en cada
+prueba, sin caché compartida ni pools de procesos.
+
+Uso (desde backend/): python -m pytest
+"""
+import os
+import sys
+import uuid
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# Antes de importar la app: Config lee el entorno al cargarse
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["DATABASE_REPLICA_URLS"] = ""
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["CART_STORE"] = "db"
+os.environ["INVOICE_ASYNC"] = "0"
+os.environ["PASSWORD_WORKERS"] = "0"
+os.environ["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+os.environ["LOGIN_RATE_PER_MINUTE"] = "0"
+os.environ["REGISTER_RATE_PER_MINUTE"] = "0"
+os.environ["SLOW_REQUEST_MS"] = "0"
+os.environ.setdefault("JWT_SECRET_KEY", "pruebas-secret-key-0123456789-abcdefghij")
+
+import pytest
+from flask_jwt_extended import create_access_token
+from app import app as flask_app
+from database import db
+from models import User
+import cache
+import crud
+import facet_index
+import search_index
+
+
+@pytest.fixture
+def app(tmp_path):
+    flask_app.config.update(
+        TESTING=True,
+        CACHE_BACKEND="none",
+        BLOB_STORE="fs",
+        BLOB_STORE_PATH=str(tmp_path / "blobs"),
+    )
+    cache.set_cache(None)
+    search_index.reset()
+    facet_index.reset()
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.remove()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Crea un usuario y devuelve (id, cabeceras con su token)."""
+    def make(role="customer"):
+        with app.app_context():
+            user = User(
+                id=str(uuid.uuid4()), email=f"{uuid.uuid4().hex[:8]}@pcdos2.pe",
+                password_hash="x", full_name="Cliente", role=role,
+            )
+            db.session.add(user)
+            db.session.commit()
+            token = create_access_token(identity=user.id, additional_claims={"role": role})
+            return user.id, {"Authorization": f"Bearer {token}"}
+    return make
+
+
+@pytest.fixture
+def admin_headers(make_user):
+    return make_user("admin")[1]
+
+
+@pytest.fixture
+def make_product(app):
+    """Crea un producto por crud (con sus hooks) y devuelve su id."""
+    counter = iter(range(1, 10**6))
+
+    def make(**data):
+        n = next(counter)
+        with app.app_context():
+            if "category_id" not in data:
+                category = crud.create_category({"name": f"Categoría {uuid.uuid4().hex[:6]}"})
+                data["category_id"] = category.id
+            data = {"product_code": f"P-{n}-{uuid.uuid4().hex[:6]}", "name": f"Producto {n}",
+                    "price": 100, "stock": 10, **data}
+            return crud.create_product(data).id
+    return make
@@ -0,0 +1,36 @@
+"""Agregados del panel (user-013): se mantienen al escribir y GET no escribe."""
+import admin_stats
+import crud
+from models import AdminStat
+
+
+def _rows(app):
+    with app.app_context():
+        return sorted((s.metric, s.dimension, s.shard, s.count) for s in AdminStat.query.all())
+
+
+def test_get_does_not_reconcile(app, client, admin_headers, make_product):
+    make_product()
+    before = _rows(app)
+    response = client.get("/admin/stats", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.get_json()["seeded"] is False
+    assert _rows(app) == before
+
+
+def test_hooks_keep_totals_after_seeding(app, client, admin_headers, make_product):
+    with app.app_context():
+        admin_stats.reconcile()
+    product_id = make_product(stock=5, min_stock=10)
+    with app.app_context():
+        crud.create_order({"payment_method": "yape",
+                           "items": [{"product_id": product_id, "quantity": 2, "price": 10.0}]})
+
+    body = client.get("/admin/stats", headers=admin_headers).get_json()
+    assert body["seeded"] is True
+    assert body["totalProducts"] == 1
+    assert body["totalOrders"] == 1
+    assert body["lowStockProducts"] == 1
+    assert body["revenueByPaymentMethod"]["yape"]["count"] == 1
+    with app.app_context():
+        assert admin_stats.reconcile() == {}
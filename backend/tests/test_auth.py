@@ -0,0 +1,55 @@
+"""Verificación de JWT con caché y un solo camino de autenticación (user-021)."""
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+import jwt
+from flask_jwt_extended import create_access_token
+from database import db
+from query_counter import count_queries
+import auth_utils
+
+
+def _count_decodes(monkeypatch):
+    calls = []
+    decode = jwt.decode
+    monkeypatch.setattr(jwt, "decode", lambda *a, **k: calls.append(1) or decode(*a, **k))
+    return calls
+
+
+def test_token_is_verified_once(app, client, admin_headers, monkeypatch):
+    auth_utils.reset_cache()
+    calls = _count_decodes(monkeypatch)
+    for _ in range(3):
+        assert client.get("/admin/stats", headers=admin_headers).status_code == 200
+    assert len(calls) == 1
+
+
+def test_cached_claims_expire_with_the_token(app, client, admin_headers, monkeypatch):
+    auth_utils.reset_cache()
+    calls = _count_decodes(monkeypatch)
+    client.get("/admin/stats", headers=admin_headers)
+    # Pasado el exp del token la caché ya no lo acepta
+    later = time.time() + 86400
+    monkeypatch.setattr(auth_utils, "time", SimpleNamespace(time=lambda: later))
+    client.get("/admin/stats", headers=admin_headers)
+    assert len(calls) == 2
+
+
+def test_expired_and_forged_tokens_are_rejected(app, client):
+    with app.app_context():
+        expired = create_access_token(identity="u1", additional_claims={"role": "admin"},
+                                      expires_delta=timedelta(seconds=-1))
+    forged = jwt.encode({"sub": "u1", "role": "admin"}, "otra-clave-de-al-menos-32-bytes-0123", algorithm="HS256")
+    for token in (expired, forged):
+        response = client.get("/admin/stats", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 401
+
+
+def test_roles_come_from_the_token(app, client, make_user, admin_headers):
+    _, customer = make_user()
+    assert client.get("/admin/stats").status_code == 401
+    assert client.get("/admin/stats", headers=customer).status_code == 403
+    with app.app_context():
+        with count_queries(db.engine) as log:
+            assert client.get("/admin/stats", headers=admin_headers).status_code == 200
+    assert not any("FROM users" in sql for sql, _ in log)
@@ -0,0 +1,36 @@
+"""Almacén de PDFs (user-010)."""
+import os
+import stat
+import pytest
+import blob_store
+from blob_store import FileSystemBlobStore, S3BlobStore
+
+
+def test_fs_blobs_are_not_private_to_the_app_user(tmp_path):
+    store = FileSystemBlobStore(str(tmp_path))
+    key = store.put(b"%PDF-1.4 prueba")
+    mode = stat.S_IMODE(os.stat(store._path(key)).st_mode)
+    assert mode == blob_store.FILE_MODE & ~blob_store._UMASK
+    assert mode & stat.S_IROTH or blob_store._UMASK & 0o004
+    assert store.exists(key) and store.size(key) == len(b"%PDF-1.4 prueba")
+
+
+class _ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class _Client:
+    def __init__(self, code):
+        self.code = code
+
+    def head_object(self, **kwargs):
+        raise _ClientError(self.code)
+
+
+def test_s3_exists_only_false_for_missing_objects():
+    assert S3BlobStore(_Client("404"), "bucket").exists("key") is False
+    assert S3BlobStore(_Client("NoSuchKey"), "bucket").exists("key") is False
+    with pytest.raises(_ClientError):
+        S3BlobStore(_Client("403"), "bucket").exists("key")
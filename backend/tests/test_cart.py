@@ -0,0 +1,44 @@
+"""Carrito (user-004 y siguientes): precio y stock de la fila, no de la caché."""
+import pytest
+from sqlalchemy import update
+from database import db
+from models import Product
+import cache
+
+
+@pytest.fixture
+def local_cache(app):
+    app.config["CACHE_BACKEND"] = "local"
+    cache.set_cache(None)
+    yield
+    app.config["CACHE_BACKEND"] = "none"
+    cache.set_cache(None)
+
+
+def _change_elsewhere(app, product_id, **values):
+    """Un cambio hecho por otro worker: no invalida la caché de este."""
+    with app.app_context():
+        db.session.execute(update(Product).where(Product.id == product_id).values(**values))
+        db.session.commit()
+
+
+def test_cart_prices_from_row_not_cache(app, client, make_product, make_user, local_cache):
+    user_id, _ = make_user()
+    product_id = make_product(price=100, stock=10)
+    assert float(client.get(f"/products/{product_id}").get_json()["price"]) == 100  # queda en caché
+    _change_elsewhere(app, product_id, price=200)
+
+    response = client.post("/cart_items/add", json={"user_id": user_id, "product_id": product_id, "quantity": 1})
+    assert response.status_code == 200
+    assert response.get_json()["price"] == pytest.approx(200 * 1.18)
+
+
+def test_cart_validates_stock_from_row(app, client, make_product, make_user, local_cache):
+    user_id, _ = make_user()
+    product_id = make_product(stock=10)
+    client.get(f"/products/{product_id}")
+    _change_elsewhere(app, product_id, stock=1)
+
+    response = client.post("/cart_items/add", json={"user_id": user_id, "product_id": product_id, "quantity": 2})
+    assert response.status_code == 400
+    assert "1 unidades" in response.get_json()["message"]
@@ -0,0 +1,49 @@
+"""Cambios en lote del carrito: PATCH /cart/user/<id>/items (user-024)."""
+import pytest
+import crud
+from database import db
+from query_counter import count_queries
+
+
+def test_plan_applies_operations_in_order():
+    planned = crud.plan_cart_operations({"a": 1, "b": 2}, [
+        {"op": "add", "product_id": "a", "quantity": 2},
+        {"op": "set", "product_id": "c", "quantity": 4},
+        {"op": "remove", "product_id": "b"},
+        {"op": "set", "product_id": "a", "quantity": 3},
+    ])
+    assert planned == {"a": 3, "b": 0, "c": 4}
+    with pytest.raises(ValueError, match="Operación 1"):
+        crud.plan_cart_operations({}, [{"op": "set", "product_id": "a", "quantity": -1}])
+
+
+def _patch(client, user_id, *operations):
+    return client.patch(f"/cart/user/{user_id}/items", json={"operations": list(operations)})
+
+
+def test_all_or_nothing(app, client, make_user, make_product):
+    user_id, _ = make_user()
+    cpu, gpu = make_product(stock=5), make_product(stock=1)
+    response = _patch(client, user_id, {"op": "add", "product_id": cpu, "quantity": 2},
+                      {"op": "set", "product_id": gpu, "quantity": 1})
+    assert response.status_code == 200
+    assert {i["product_id"]: i["quantity"] for i in response.get_json()["items"]} == {cpu: 2, gpu: 1}
+
+    # La segunda operación no tiene stock: la primera tampoco se aplica
+    response = _patch(client, user_id, {"op": "remove", "product_id": cpu},
+                      {"op": "add", "product_id": gpu, "quantity": 1})
+    assert response.status_code == 400
+    view = client.get(f"/cart/user/{user_id}/full").get_json()
+    assert {i["product_id"]: i["quantity"] for i in view["items"]} == {cpu: 2, gpu: 1}
+
+
+def test_query_count_does_not_grow_with_operations(app, client, make_user, make_product):
+    def queries(count):
+        user_id, _ = make_user()
+        operations = [{"op": "add", "product_id": make_product(stock=5)} for _ in range(count)]
+        with app.app_context():
+            with count_queries(db.engine) as log:
+                assert _patch(client, user_id, *operations).status_code == 200
+        return log.count
+
+    assert queries(8) == queries(2)
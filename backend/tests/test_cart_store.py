@@ -0,0 +1,69 @@
+"""Carritos en almacén por clave con escritura diferida (user-023)."""
+import pytest
+import cart_store
+from models import CartItem
+
+
+@pytest.fixture
+def memory_store(app, tmp_path):
+    app.config.update(CART_STORE="memory", CART_JOURNAL_PATH=str(tmp_path / "carts.journal"))
+    cart_store.set_backend(None)
+    yield
+    cart_store.set_backend(None)
+    app.config.update(CART_STORE="db", CART_JOURNAL_PATH=None)
+
+
+def _add(client, user_id, product_id, quantity=1):
+    response = client.post("/cart_items/add", json={"user_id": user_id, "product_id": product_id,
+                                                    "quantity": quantity})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def _saved(app):
+    with app.app_context():
+        return {(i.product_id, i.quantity) for i in CartItem.query.all()}
+
+
+def test_changes_reach_the_db_on_flush(app, client, make_user, make_product, memory_store):
+    user_id, _ = make_user()
+    product_id = make_product(stock=10)
+    _add(client, user_id, product_id)
+    assert _add(client, user_id, product_id, 2)["quantity"] == 3
+    assert _saved(app) == set()
+    with app.app_context():
+        assert cart_store.flush_all() == 1
+    assert _saved(app) == {(product_id, 3)}
+
+
+def test_journal_recovers_unsaved_carts(app, client, make_user, make_product, memory_store, tmp_path):
+    user_id, _ = make_user()
+    product_id = make_product(stock=10)
+    _add(client, user_id, product_id, 2)
+    # Otro proceso arranca con el mismo diario tras una caída
+    restarted = cart_store.MemoryCartBackend(str(tmp_path / "carts.journal"))
+    assert restarted.recover() == 1
+    cart_store.set_backend(restarted)
+    with app.app_context():
+        cart_store.flush_all()
+    assert _saved(app) == {(product_id, 2)}
+
+
+def test_failing_cart_is_quarantined_without_blocking_others(app, client, make_user, make_product,
+                                                              memory_store):
+    good_user, _ = make_user()
+    bad_user, _ = make_user()
+    product_id = make_product(stock=10)
+    _add(client, good_user, product_id)
+    _add(client, bad_user, product_id)
+    backend = cart_store.get_backend()
+    broken = backend.load(bad_user)
+    broken["items"][product_id]["price"] = None  # price es NOT NULL
+    backend.save(bad_user, broken)
+
+    with app.app_context():
+        cart_store.flush_all()
+    assert _saved(app) == {(product_id, 1)}
+    assert backend.dirty(10) == []
+    assert cart_store.retry_failed() == 1
+    assert backend.dirty(10) == [bad_user]
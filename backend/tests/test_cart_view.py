@@ -0,0 +1,45 @@
+"""Vista completa del carrito con totales: GET /cart/user/<id>/full (user-025)."""
+from database import db
+from query_counter import count_queries
+
+
+def _add(client, user_id, product_id, quantity):
+    client.post("/cart_items/add", json={"user_id": user_id, "product_id": product_id, "quantity": quantity})
+
+
+def test_totals_split_igv_from_item_prices(app, client, make_user, make_product):
+    user_id, _ = make_user()
+    product_id = make_product(price=100, stock=10)
+    _add(client, user_id, product_id, 2)
+    view = client.get(f"/cart/user/{user_id}/full").get_json()
+    [item] = view["items"]
+    assert (item["price"], item["quantity"], item["stock"]) == (118.0, 2, 10)
+    assert (view["subtotal"], view["igv"], view["total"]) == (200.0, 36.0, 236.0)
+
+
+def test_view_is_one_query(app, client, make_user, make_product):
+    user_id, _ = make_user()
+    for _ in range(3):
+        _add(client, user_id, make_product(stock=10), 1)
+    with app.app_context():
+        with count_queries(db.engine) as log:
+            assert len(client.get(f"/cart/user/{user_id}/full").get_json()["items"]) == 3
+    assert log.count == 1
+
+
+def test_etag_follows_cart_changes(app, client, make_user, make_product):
+    user_id, _ = make_user()
+    product_id = make_product(stock=10)
+    _add(client, user_id, product_id, 1)
+    url = f"/cart/user/{user_id}/full"
+    etag = client.get(url).headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    _add(client, user_id, product_id, 1)
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_new_user_gets_an_empty_cart(client, make_user):
+    user_id, _ = make_user()
+    view = client.get(f"/cart/user/{user_id}/full").get_json()
+    assert view["user_id"] == user_id
+    assert (view["items"], view["total"]) == ([], 0)
@@ -0,0 +1,56 @@
+"""ETag de listados (user-005): una edición tiene que cambiar la versión."""
+from database import db
+from models import Product
+import crud
+import stock
+
+
+def _revalidate(client, url, etag, headers=None):
+    return client.get(url, headers={**(headers or {}), "If-None-Match": etag})
+
+
+def test_unchanged_list_returns_304(client, make_product):
+    make_product()
+    first = client.get("/products/")
+    assert first.status_code == 200
+    assert _revalidate(client, "/products/", first.headers["ETag"]).status_code == 304
+
+
+def test_product_edit_invalidates_list_etag(client, make_product, admin_headers):
+    product_id = make_product(price=100)
+    first = client.get("/products/")
+    response = client.put(f"/products/{product_id}", json={"price": 150}, headers=admin_headers)
+    assert response.status_code == 200
+
+    again = _revalidate(client, "/products/", first.headers["ETag"])
+    assert again.status_code == 200
+    assert float(again.get_json()[0]["price"]) == 150
+
+
+def test_category_edit_invalidates_list_etag(app, client, admin_headers):
+    with app.app_context():
+        category_id = crud.create_category({"name": "GPU"}).id
+    first = client.get("/categories/")
+    client.put(f"/categories/{category_id}", json={"name": "Tarjetas"}, headers=admin_headers)
+    assert _revalidate(client, "/categories/", first.headers["ETag"]).status_code == 200
+
+
+def test_stock_update_moves_watermark(app, make_product):
+    product_id = make_product(stock=5)
+    with app.app_context():
+        before = db.session.get(Product, product_id).updated_at
+        stock._decrement({product_id: 2})
+        db.session.commit()
+        db.session.expire_all()
+        after = db.session.get(Product, product_id).updated_at
+    assert after > before
+
+
+def test_updated_at_uses_one_clock(app, make_product):
+    """Alta y edición con el mismo reloj: la edición nunca queda "antes" del alta."""
+    first = make_product()
+    second = make_product()
+    with app.app_context():
+        crud.update_product(first, {"name": "Editado"})
+        rows = {p.id: p.updated_at for p in Product.query}
+    assert rows[first] > rows[second]
@@ -0,0 +1,31 @@
+"""Conteos de /products/facets (user-003): iguales al listado, aun con escrituras de otros workers."""
+from sqlalchemy import update
+from database import db
+from models import Product
+
+
+def test_each_facet_ignores_its_own_filter(app, client, make_product):
+    make_product(brand="AMD", price=250, stock=0)
+    make_product(brand="AMD", price=50, stock=3)
+    make_product(brand="Intel", price=250, stock=3)
+
+    counts = client.get("/products/facets?brand=AMD").get_json()
+    assert counts["total"] == 2
+    assert {b["value"]: b["count"] for b in counts["brands"]} == {"AMD": 2, "Intel": 1}
+    assert counts["stock"] == {"in_stock": 1, "out_of_stock": 1}
+
+
+def test_counts_follow_stock_changed_by_another_worker(app, client, make_product):
+    sold_out = make_product(stock=1)
+    make_product(stock=2)
+    assert client.get("/products/facets").get_json()["stock"] == {"in_stock": 2, "out_of_stock": 0}
+
+    # Un checkout atendido por otro worker: UPDATE directo, sin los hooks de este proceso
+    with app.app_context():
+        db.session.execute(update(Product).where(Product.id == sold_out).values(stock=0))
+        db.session.commit()
+
+    counts = client.get("/products/facets?in_stock=true").get_json()
+    listed = client.get("/products/?in_stock=true").get_json()
+    assert counts["stock"] == {"in_stock": 1, "out_of_stock": 1}
+    assert counts["total"] == len(listed) == 1
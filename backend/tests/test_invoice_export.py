@@ -0,0 +1,72 @@
+"""Exportación masiva de boletas (user-012): ZIP y PDF combinado."""
+import io
+import zipfile
+import pytest
+import invoice_export
+
+
+def _invoices(app, client, make_product, count):
+    import crud
+    order_ids = []
+    with app.app_context():
+        product_id = make_product()
+        for _ in range(count):
+            order = crud.create_order({"payment_method": "tarjeta",
+                                       "items": [{"product_id": product_id, "quantity": 1, "price": 10.0}]})
+            order_ids.append(order.id)
+    invoice_numbers = []
+    for order_id in order_ids:
+        response = client.post("/invoices/", json={"order_id": order_id, "customer_name": "Cliente",
+                                                   "customer_dni": "12345678"})
+        invoice_numbers.append(response.get_json()["invoice_number"])
+    return order_ids, invoice_numbers
+
+
+def _break_references(data):
+    # Misma longitud (la xref sigue valiendo), pero la página apunta a un objeto que no existe
+    source = invoice_export._PdfSource(data)
+    missing = max(source.offsets) + 1
+    page = source.header(source.kids[0])
+    contents = page.split(b"/Contents ")[1].split(b" 0 R")[0]
+    assert len(str(missing)) == len(contents)
+    return data.replace(b"/Contents %s 0 R" % contents, b"/Contents %d 0 R" % missing, 1)
+
+
+def test_zip_contains_every_ready_invoice(app, client, make_product, admin_headers):
+    order_ids, numbers = _invoices(app, client, make_product, 3)
+    response = client.get(f"/invoices/export?order_ids={','.join(order_ids)}", headers=admin_headers)
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert sorted(archive.namelist()) == sorted(f"boleta-{n}.pdf" for n in numbers)
+
+
+def test_merged_pdf_skips_broken_invoice_and_lists_it(app, client, make_product, admin_headers, monkeypatch):
+    order_ids, numbers = _invoices(app, client, make_product, 3)
+    read_pdf = invoice_export._read_pdf
+    monkeypatch.setattr(invoice_export, "_read_pdf", lambda row: _break_references(read_pdf(row))
+                        if row.invoice_number == numbers[1] else read_pdf(row))
+    summaries = []
+    summary_pdf = invoice_export._summary_pdf
+    monkeypatch.setattr(invoice_export, "_summary_pdf", lambda skipped: summaries.append(skipped)
+                        or summary_pdf(skipped))
+
+    response = client.get(f"/invoices/export?format=pdf&order_ids={','.join(order_ids)}",
+                          headers=admin_headers)
+    assert response.status_code == 200
+    merged = invoice_export._PdfSource(response.data)
+    # Dos boletas de una página y la página de faltantes
+    assert len(merged.kids) == 3
+    assert len(summaries) == 1 and summaries[0][0].startswith(numbers[1])
+    # Ninguna referencia quedó apuntando al objeto 0 ni a uno inexistente
+    for _, header, _ in merged.objects():
+        for ref in invoice_export._REF.findall(header):
+            assert int(ref) in merged.offsets
+
+
+def test_unknown_reference_is_an_error(app):
+    import pdf_generator
+    data = pdf_generator.generar_boleta_pdf({"invoiceNumber": "INV-1", "customerName": "C",
+                                             "customerDni": "1", "items": []})
+    source = invoice_export._PdfSource(_break_references(data))
+    with pytest.raises(ValueError):
+        invoice_export._copy_objects(source, 3)
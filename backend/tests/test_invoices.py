@@ -0,0 +1,99 @@
+"""Boletas (user-009): fecha de emisión, ETag por estado y descarga."""
+import pdf_generator
+
+ITEMS = [{"code": "GPU-1", "name": "GPU", "quantity": 1, "price": 1180.0}]
+
+
+def _render_data(**data):
+    return {"invoiceNumber": "INV-1", "customerName": "Cliente", "customerDni": "12345678",
+            "customerEmail": "", "customerPhone": "", "items": ITEMS, **data}
+
+
+def test_pdf_prints_issue_date(monkeypatch):
+    printed = []
+    start_page = pdf_generator._start_page
+
+    def spy(c, data, fecha, page):
+        printed.append(fecha)
+        return start_page(c, data, fecha, page)
+
+    monkeypatch.setattr(pdf_generator, "_start_page", spy)
+    pdf_generator.generar_boleta_pdf(_render_data(date="2020-01-02 03:04"))
+    assert printed == ["2020-01-02 03:04"]
+
+
+def _invoice(app, client, make_product, user_id, status=None):
+    import crud
+    from database import db
+    from models import Invoice
+    with app.app_context():
+        product_id = make_product()
+        order = crud.create_order({"user_id": user_id, "payment_method": "tarjeta",
+                                   "items": [{"product_id": product_id, "quantity": 1, "price": 1180.0}]})
+        order_id = order.id
+    response = client.post("/invoices/", json={"order_id": order_id, "customer_name": "Cliente",
+                                               "customer_dni": "12345678"})
+    assert response.status_code == 202
+    invoice_id = response.get_json()["job_id"]
+    if status:
+        with app.app_context():
+            Invoice.query.filter_by(id=invoice_id).update({"status": status})
+            db.session.commit()
+    return invoice_id
+
+
+def test_download_ready_invoice(app, client, make_product, make_user):
+    user_id, headers = make_user()
+    invoice_id = _invoice(app, client, make_product, user_id)
+    response = client.get(f"/invoices/{invoice_id}/download", headers=headers)
+    assert response.status_code == 200
+    assert response.data.startswith(b"%PDF")
+
+
+def test_pending_download_is_not_2xx(app, client, make_product, make_user):
+    user_id, headers = make_user()
+    invoice_id = _invoice(app, client, make_product, user_id, status="pending")
+    response = client.get(f"/invoices/{invoice_id}/download", headers=headers)
+    assert response.status_code == 409
+    assert response.headers["Retry-After"]
+
+
+def test_other_users_cannot_probe_job_status(app, client, make_product, make_user):
+    owner, _ = make_user()
+    _, stranger = make_user()
+    invoice_id = _invoice(app, client, make_product, owner, status="pending")
+    assert client.get(f"/invoices/{invoice_id}/download", headers=stranger).status_code == 403
+    assert client.get(f"/invoices/{invoice_id}/status", headers=stranger).status_code == 403
+    assert client.get(f"/invoices/{invoice_id}/status").status_code == 401
+
+
+def test_invoice_etag_changes_with_status(app, client, make_product, make_user):
+    from database import db
+    from models import Invoice
+    user_id, _ = make_user()
+    invoice_id = _invoice(app, client, make_product, user_id, status="pending")
+    etag = client.get(f"/invoices/{invoice_id}").headers["ETag"]
+    with app.app_context():
+        Invoice.query.filter_by(id=invoice_id).update({"status": "ready"})
+        db.session.commit()
+    response = client.get(f"/invoices/{invoice_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "ready"
+
+
+def test_async_render_stores_pdf(app, client, make_product, make_user):
+    """Pool real (spawn) y guardado en el hilo aparte."""
+    import time
+    user_id, headers = make_user()
+    app.config["INVOICE_ASYNC"] = True
+    try:
+        invoice_id = _invoice(app, client, make_product, user_id)
+        deadline = time.monotonic() + 60
+        status = "pending"
+        while status == "pending" and time.monotonic() < deadline:
+            time.sleep(0.1)
+            status = client.get(f"/invoices/{invoice_id}/status", headers=headers).get_json()["status"]
+    finally:
+        app.config["INVOICE_ASYNC"] = False
+    assert status == "ready"
+    assert client.get(f"/invoices/{invoice_id}/download", headers=headers).status_code == 200
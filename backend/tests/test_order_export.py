@@ -0,0 +1,50 @@
+"""Exportación de órdenes y líneas en streaming (user-016)."""
+import csv
+import io
+import json
+import crud
+import order_export
+
+
+def _orders(app, make_product, payment_methods):
+    product_id = make_product(stock=100)
+    with app.app_context():
+        return [
+            crud.create_order({"payment_method": method,
+                               "items": [{"product_id": product_id, "quantity": 2, "price": 10.0}]}).id
+            for method in payment_methods
+        ]
+
+
+def test_csv_export_uses_order_filters(app, client, admin_headers, make_product):
+    order_ids = _orders(app, make_product, ["tarjeta", "yape", "tarjeta"])
+    response = client.get("/orders/export?format=csv&payment_method=tarjeta", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert sorted(row["id"] for row in rows) == sorted([order_ids[0], order_ids[2]])
+    assert {row["total_amount"] for row in rows} == {"20.00"}
+
+
+def test_ndjson_lines_export(app, client, admin_headers, make_product):
+    order_ids = _orders(app, make_product, ["tarjeta", "yape"])
+    response = client.get("/order_items/export?format=ndjson", headers=admin_headers)
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    by_order = {line["order_id"]: line for line in lines}
+    assert sorted(by_order) == sorted(order_ids)
+    assert by_order[order_ids[1]]["payment_method"] == "yape"
+    assert by_order[order_ids[1]]["total_price"] == 20.0
+
+
+def test_export_streams_in_batches(app, make_product, monkeypatch):
+    _orders(app, make_product, ["tarjeta"] * 5)
+    monkeypatch.setattr(order_export, "YIELD_PER", 2)
+    with app.app_context():
+        chunks = list(order_export.stream(order_export.orders_statement({}), "csv"))
+    # Cabecera sola (antes de consultar) y luego un trozo por lote de 2 filas
+    assert chunks[0].startswith("id,order_number")
+    assert [chunk.count("\n") for chunk in chunks[1:]] == [2, 2, 1]
+
+
+def test_unknown_format_is_rejected(client, admin_headers):
+    assert client.get("/orders/export?format=xlsx", headers=admin_headers).status_code == 400
@@ -0,0 +1,40 @@
+"""Alta de órdenes por lotes (user-008): un IN de productos y fallos aislados."""
+from database import db
+from models import Order, Product
+from query_counter import count_queries
+
+
+def _order(product_id, quantity):
+    return {"payment_method": "tarjeta",
+            "items": [{"product_id": product_id, "quantity": quantity, "price": 10.0}]}
+
+
+def test_failed_order_does_not_affect_the_rest(app, client, admin_headers, make_product):
+    product_id = make_product(stock=5)
+    response = client.post("/orders/bulk", headers=admin_headers, json={"orders": [
+        _order(product_id, 2), _order(product_id, 4), "no es una orden", _order(product_id, 3),
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [r["status"] for r in body["results"]] == ["created", "error", "error", "created"]
+    assert (body["created"], body["failed"]) == (2, 2)
+    with app.app_context():
+        assert db.session.get(Product, product_id).stock == 0
+        assert Order.query.count() == 2
+
+
+def _product_loads(app, orders):
+    import crud
+    with app.app_context():
+        with count_queries(db.engine) as log:
+            results = crud.create_orders_bulk(orders, chunk_size=100)
+    assert all(r["status"] == "created" for r in results)
+    # Carga de productos del bloque y refresco de índices tras el commit; no una por orden
+    return len([sql for sql, _ in log if "FROM products" in sql and "products.product_code" in sql])
+
+
+def test_products_are_loaded_once_per_chunk(app, make_product):
+    product_ids = [make_product(stock=10) for _ in range(4)]
+    few = _product_loads(app, [_order(product_ids[0], 1)])
+    many = _product_loads(app, [_order(pid, 1) for pid in product_ids * 2])
+    assert many == few
@@ -0,0 +1,48 @@
+"""Búsqueda y paginación de GET /orders/ (user-015)."""
+import crud
+
+
+def _orders(app, make_user, make_product, count):
+    user_id, _ = make_user()
+    product_id = make_product(stock=100)
+    with app.app_context():
+        return user_id, [
+            crud.create_order({"user_id": user_id, "payment_method": "tarjeta",
+                               "items": [{"product_id": product_id, "quantity": 1, "price": 10.0}]}).id
+            for _ in range(count)
+        ]
+
+
+def test_pages_cover_every_order_newest_first(app, client, make_user, make_product):
+    _, order_ids = _orders(app, make_user, make_product, 5)
+    first = client.get("/orders/?limit=2").get_json()
+    assert (first["total"], first["total_exact"]) == (5, True)
+    seen, body = [], first
+    while True:
+        seen.extend(o["id"] for o in body["items"])
+        if not body["next_cursor"]:
+            break
+        body = client.get(f"/orders/?limit=2&cursor={body['next_cursor']}").get_json()
+        assert "total" not in body
+    assert sorted(seen) == sorted(order_ids)
+    assert seen == [o["id"] for o in client.get("/orders/").get_json()]
+
+
+def test_search_by_prefix_of_number_or_user(app, client, make_user, make_product):
+    _orders(app, make_user, make_product, 1)
+    _, [order_id] = _orders(app, make_user, make_product, 1)
+    with app.app_context():
+        order = crud.get_order_by_id(order_id)
+        number, email = order.order_number, order.user.email
+    assert [o["id"] for o in client.get(f"/orders/?search={number}").get_json()] == [order_id]
+    assert [o["id"] for o in client.get(f"/orders/?search={email[:6]}").get_json()] == [order_id]
+    # Prefijo, no subcadena: así la búsqueda usa los índices
+    assert client.get(f"/orders/?search={email[2:8]}").get_json() == []
+
+
+def test_count_is_capped_for_broad_searches(app, make_user, make_product, monkeypatch):
+    _orders(app, make_user, make_product, 3)
+    monkeypatch.setattr(crud, "ORDER_COUNT_CAP", 2)
+    with app.app_context():
+        assert crud.count_orders(search="ORD-") == (2, False)
+        assert crud.count_orders(search="ORD-", status="cancelled") == (0, True)
@@ -0,0 +1,25 @@
+"""Contraseñas en el pool de procesos (user-022)."""
+import pytest
+import passwords
+
+
+def test_hash_and_verify_in_pool(app):
+    app.config["PASSWORD_WORKERS"] = 1
+    try:
+        with app.app_context():
+            password_hash = passwords.hash_password("secreta")
+            assert passwords.verify_password(password_hash, "secreta") == (True, None)
+            assert passwords.verify_password(password_hash, "otra") == (False, None)
+    finally:
+        app.config["PASSWORD_WORKERS"] = 0
+
+
+def test_busy_pool_answers_503(app, client, monkeypatch):
+    def busy(*args):
+        raise passwords.PasswordBusy(retry_after=3)
+
+    monkeypatch.setattr(passwords, "_run", busy)
+    for url in ("/users/", "/register"):
+        response = client.post(url, json={"email": "a@pcdos2.pe", "password": "x", "full_name": "A"})
+        assert response.status_code == 503, url
+        assert response.headers["Retry-After"] == "3"
@@ -0,0 +1,39 @@
+"""Render de boletas (user-011): plantilla compartida y tablas de varias páginas."""
+import invoice_export
+import pdf_generator
+
+
+def _data(count, name="Tarjeta de video"):
+    items = [{"code": f"GPU-{i}", "name": name, "quantity": 1, "price": 118.0} for i in range(count)]
+    return {"invoiceNumber": "INV-1", "date": "2025-01-02 10:00", "customerName": "Cliente",
+            "customerDni": "12345678", "items": items}
+
+
+def _pages(pdf):
+    return len(invoice_export._PdfSource(pdf).kids)
+
+
+def test_long_item_list_continues_on_new_pages(monkeypatch):
+    totals = []
+    draw_totals = pdf_generator._draw_totals
+    monkeypatch.setattr(pdf_generator, "_draw_totals",
+                        lambda c, subtotal, y: totals.append(subtotal) or draw_totals(c, subtotal, y))
+    pdf = pdf_generator.generar_boleta_pdf(_data(120))
+    assert _pages(pdf) > 1
+    # Subtotal sin IGV de todas las filas, una sola vez al final
+    assert totals == [120 * 100.0]
+
+
+def test_static_template_is_a_single_form_per_document():
+    short = pdf_generator.generar_boleta_pdf(_data(1))
+    long = pdf_generator.generar_boleta_pdf(_data(120))
+    assert _pages(short) == 1
+    assert long.count(b"/Subtype /Form") == short.count(b"/Subtype /Form") == 2
+
+
+def test_long_names_wrap_instead_of_overflowing():
+    rows, _ = pdf_generator._build_rows(_data(1, name="RTX " * 600)["items"])
+    # Fila principal más filas de continuación, cada una con a lo sumo MAX_CELL_LINES líneas
+    assert len(rows) > 2
+    assert all(row[1].count("\n") < pdf_generator.MAX_CELL_LINES for row in rows[1:])
+    assert _pages(pdf_generator.generar_boleta_pdf(_data(1, name="RTX " * 600))) >= 1
@@ -0,0 +1,46 @@
+"""Pool de conexiones configurable e instrumentado (user-018)."""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+import config
+import pool_metrics
+
+
+def test_engine_options_from_environment(monkeypatch):
+    assert config._engine_options("sqlite://") == {}
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "0")
+    options = config._engine_options("mysql+pymysql://u:p@db/tienda")
+    assert options["poolclass"] is pool_metrics.TimedQueuePool
+    assert (options["pool_size"], options["pool_pre_ping"]) == (3, False)
+
+
+def test_checkout_wait_and_timeouts_are_recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(pool_metrics, "_engines", [])
+    monkeypatch.setattr(pool_metrics, "_installed", set())
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=pool_metrics.TimedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    pool_metrics.install(engine)
+    pool_metrics.reset()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            with pytest.raises(PoolTimeout):
+                engine.connect()
+            data = pool_metrics.snapshot()
+            assert data["pools"][0]["checked_out"] == 1
+        data = pool_metrics.snapshot()
+        assert (data["checkouts"], data["checkout_timeouts"], data["connects"]) == (1, 1, 1)
+        assert data["wait_seconds_max"] >= 0.05
+        assert sum(b["count"] for b in data["wait_buckets"]) == 2
+        assert data["pools"][0]["checked_out"] == 0
+    finally:
+        engine.dispose()
+        pool_metrics.reset()
+
+
+def test_pool_endpoint_is_admin_only(client, make_user, admin_headers):
+    _, headers = make_user()
+    assert client.get("/admin/pool", headers=headers).status_code == 403
+    body = client.get("/admin/pool", headers=admin_headers).get_json()
+    assert "checkouts" in body and "pools" in body
@@ -0,0 +1,44 @@
+"""Importación masiva de productos (user-017)."""
+import io
+import admin_stats
+import crud
+import search_index
+from models import Product
+
+
+def _import(client, admin_headers, body, filename, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return client.post(f"/products/import?{query}", headers=admin_headers,
+                       data={"file": (io.BytesIO(body), filename)},
+                       content_type="multipart/form-data")
+
+
+def test_csv_upserts_by_product_code(app, client, admin_headers, make_product):
+    with app.app_context():
+        admin_stats.reconcile()
+        crud.create_category({"name": "GPU"})
+    make_product(product_code="GPU-1", name="RTX 4060", price=1000, stock=3)
+    body = ("product_code,name,price,stock,category_id\n"
+            "GPU-1,,1100,,\n"
+            "GPU-2,RX 7600,900,4,gpu\n"
+            "GPU-3,Sin stock válido,500,-1,\n").encode()
+    result = _import(client, admin_headers, body, "precios.csv", chunk_size=1).get_json()
+    assert (result["created"], result["updated"], result["failed"]) == (1, 1, 1)
+    assert result["errors"][0]["line"] == 4
+    with app.app_context():
+        updated = Product.query.filter_by(product_code="GPU-1").one()
+        # Celda vacía: no cambia
+        assert (float(updated.price), updated.name, updated.stock) == (1100, "RTX 4060", 3)
+        assert Product.query.filter_by(product_code="GPU-2").one().category.name == "GPU"
+        assert search_index.search_product_ids("RX 7600")
+        assert admin_stats.reconcile() == {}
+
+
+def test_jsonl_reports_bad_lines_and_repeated_codes(app, client, admin_headers):
+    body = (b'{"product_code": "SSD-1", "name": "SSD", "price": 200}\n'
+            b'no es json\n'
+            b'{"product_code": "SSD-1", "name": "Otro", "price": 1}\n'
+            b'{"product_code": "SSD-2", "name": "\xff", "price": 1}\n')
+    result = _import(client, admin_headers, body, "lista.jsonl").get_json()
+    assert (result["created"], result["failed"]) == (1, 3)
+    assert [e["line"] for e in result["errors"]] == [2, 3, 4]
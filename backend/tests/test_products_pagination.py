@@ -0,0 +1,44 @@
+"""Paginación por cursor del catálogo (user-001)."""
+from sqlalchemy import event
+from database import db
+from models import Product
+
+
+def _walk(client, query):
+    ids, cursor = [], None
+    while True:
+        url = f"/products/?{query}" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url).get_json()
+        ids.extend(p["id"] for p in body["items"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return ids
+
+
+def test_stock_pages_cover_every_product_once(app, client, make_product):
+    stocks = [3, 0, 3, 7, 1, 0]
+    ids = {make_product(stock=s): s for s in stocks}
+    walked = _walk(client, "sortBy=stock&limit=2")
+    assert sorted(walked) == sorted(ids)
+    assert walked == sorted(ids, key=lambda pid: (ids[pid], pid), reverse=True)
+
+
+def test_stock_sort_uses_bare_column(app, client, make_product):
+    make_product(stock=1)
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        client.get("/products/?sortBy=stock&limit=5")
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    ordered = [s for s in statements if "ORDER BY products.stock DESC" in s]
+    assert ordered and not any("coalesce" in s.lower() for s in ordered)
+
+
+def test_missing_stock_is_stored_as_zero(app, make_product):
+    product_id = make_product(stock=None)
+    with app.app_context():
+        assert db.session.get(Product, product_id).stock == 0
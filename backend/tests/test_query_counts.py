@@ -0,0 +1,33 @@
+"""Cantidad de consultas por endpoint (user-006): sin N+1 ni cargas perezosas."""
+from database import db
+from query_counter import count_queries
+import check_query_counts
+
+
+def test_endpoints_do_not_grow_with_rows(app):
+    small = check_query_counts.measure(check_query_counts.SMALL)
+    large = check_query_counts.measure(check_query_counts.LARGE)
+    grown = {url: (small[url], large[url]) for url in check_query_counts.ENDPOINTS if large[url] > small[url]}
+    assert grown == {}
+
+
+def _product_loads(app, request):
+    # Una carga perezosa de CartItem.product trae la entidad entera (con long_description)
+    with app.app_context():
+        with count_queries(db.engine) as log:
+            response = request()
+    assert response.status_code == 200
+    return [sql for sql, _ in log if "products.long_description" in sql]
+
+
+def test_cart_item_responses_load_product_with_item(app, client, make_user, make_product):
+    user_id, _ = make_user()
+    product_id = make_product(stock=5)
+    add = lambda: client.post("/cart_items/add", json={"user_id": user_id, "product_id": product_id})
+    assert _product_loads(app, add) == []
+    item_id = add().get_json()["id"]
+
+    assert _product_loads(app, lambda: client.get(f"/cart_items/{item_id}")) == []
+    assert _product_loads(app, lambda: client.put(f"/cart_items/{item_id}", json={"quantity": 1})) == []
+    body = client.get(f"/cart_items/{item_id}").get_json()
+    assert body["stock"] == 5 and body["name"]
@@ -0,0 +1,44 @@
+"""Métricas por endpoint y log de peticiones lentas (user-020)."""
+import json
+import logging
+import request_metrics
+
+
+def _line(body, prefix):
+    return next(line for line in body.splitlines() if line.startswith(prefix))
+
+
+def test_metrics_count_requests_queries_and_statuses(client, make_product):
+    make_product()
+    request_metrics.reset()
+    client.get("/products/")
+    client.get("/products/")
+    client.get("/no-existe")
+    body = client.get("/metrics").get_data(as_text=True)
+
+    labels = '{blueprint="products",endpoint="products.get_products",method="GET"'
+    assert _line(body, f"http_requests_total{labels},status=\"200\"}}").endswith(" 2")
+    assert _line(body, f"http_request_duration_seconds_count{labels}}}").endswith(" 2")
+    assert int(_line(body, f"http_request_queries_total{labels}}}").split()[-1]) >= 2
+    # Rutas inexistentes: una sola serie, no una por URL
+    assert 'endpoint="<sin ruta>",method="GET",status="404"' in body
+
+
+def test_metrics_token(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "secreto")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer secreto"}).status_code == 200
+
+
+def test_slow_request_log_includes_top_queries(client, app, make_product, monkeypatch, caplog):
+    make_product()
+    monkeypatch.setitem(app.config, "SLOW_REQUEST_MS", 0.001)
+    with caplog.at_level(logging.WARNING, logger="slow_requests"):
+        client.get("/products/")
+    entry = json.loads(caplog.records[-1].getMessage())
+    assert entry["endpoint"] == "products.get_products" and entry["status"] == 200
+    assert entry["queries"] >= 1 and entry["top_queries"][0]["sql"].startswith("SELECT")
+
+
+def test_escape_label_values():
+    assert request_metrics._format_labels(path='a"b\\c\n') == '{path="a\\"b\\\\c\\n"}'
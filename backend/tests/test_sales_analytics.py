@@ -0,0 +1,65 @@
+"""Analítica de ventas con rollups (user-014)."""
+from datetime import datetime, timedelta
+import crud
+import sales_analytics as sa
+from models import SalesRollup, SalesDirtyDay
+
+
+def test_cover_is_contiguous_and_uses_coarse_buckets():
+    start, end = datetime(2025, 1, 15, 10), datetime(2025, 4, 2, 5)
+    segments = sa.cover(start, end)
+    assert segments[0][1] == start and segments[-1][2] == end
+    assert all(a[2] == b[1] for a, b in zip(segments, segments[1:]))
+    assert (sa.MONTH, datetime(2025, 2, 1), datetime(2025, 4, 1)) in segments
+
+
+def _sell(app, make_product, brand="Marca", quantity=1, price=100.0, payment_method="tarjeta"):
+    product_id = make_product(stock=100, brand=brand)
+    with app.app_context():
+        return product_id, crud.create_order({
+            "payment_method": payment_method,
+            "items": [{"product_id": product_id, "quantity": quantity, "price": price}],
+        }).id
+
+
+def _today():
+    return sa.truncate(crud.now_lima(), sa.DAY)
+
+
+def test_refresh_builds_series_and_top(app, make_product):
+    big, _ = _sell(app, make_product, quantity=3)
+    small, _ = _sell(app, make_product, quantity=1)
+    with app.app_context():
+        assert SalesDirtyDay.query.count() > 0
+        assert sa.refresh() == 1
+        assert SalesDirtyDay.query.count() == 0
+        day = _today()
+        points = sa.series(day, day + timedelta(days=1), sa.DAY)
+        assert points == [{"bucket": day.isoformat(), "orders": 2, "units": 4, "revenue": 400.0}]
+        top = sa.top(day, day + timedelta(days=1), sa.PRODUCT, by="units")
+        assert [row["key"] for row in top] == [big, small]
+
+
+def test_cancelled_orders_drop_out_on_refresh(app, make_product):
+    _, order_id = _sell(app, make_product)
+    _sell(app, make_product, price=50.0)
+    with app.app_context():
+        sa.refresh()
+        crud.update_order(order_id, {"status": "cancelled"})
+        sa.refresh()
+        day = _today()
+        [point] = sa.series(day, day + timedelta(days=1), sa.DAY)
+        assert (point["orders"], point["revenue"]) == (1, 50.0)
+
+
+def test_backfill_matches_incremental_refresh(app, make_product):
+    _sell(app, make_product, payment_method="yape")
+    _sell(app, make_product, brand="Otra")
+    with app.app_context():
+        sa.refresh()
+        incremental = sorted((r.granularity, r.bucket_start, r.dimension, r.dim_key, r.orders, r.units,
+                              float(r.revenue)) for r in SalesRollup.query.all())
+        assert sa.backfill(log=lambda _: None) == 1
+        rebuilt = sorted((r.granularity, r.bucket_start, r.dimension, r.dim_key, r.orders, r.units,
+                          float(r.revenue)) for r in SalesRollup.query.all())
+    assert rebuilt == incremental
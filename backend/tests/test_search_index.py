@@ -0,0 +1,44 @@
+"""Índice de búsqueda en memoria (user-002): cambios de otros workers y tope."""
+from sqlalchemy import delete, update
+from database import db
+from models import Product
+import search_index
+
+
+def _search(client, text):
+    return [p["name"] for p in client.get(f"/products/?search={text}").get_json()]
+
+
+def test_search_ranks_by_relevance(client, make_product):
+    make_product(name="Teclado mecánico", description="con tarjeta")
+    make_product(name="Tarjeta gráfica")
+    assert _search(client, "tarjeta") == ["Tarjeta gráfica", "Teclado mecánico"]
+    assert _search(client, "grafica") == ["Tarjeta gráfica"]
+
+
+def test_sees_writes_from_other_workers(app, client, make_product):
+    renamed = make_product(name="Monitor curvo")
+    removed = make_product(name="Monitor plano")
+    assert sorted(_search(client, "monitor")) == ["Monitor curvo", "Monitor plano"]
+
+    # Otro worker: escribe en la BD sin pasar por los hooks de este proceso
+    with app.app_context():
+        db.session.execute(update(Product).where(Product.id == renamed).values(name="Parlante"))
+        db.session.execute(delete(Product).where(Product.id == removed))
+        db.session.commit()
+    added = make_product(name="Monitor gamer")
+    with app.app_context():
+        search_index.remove_product(added)  # como si lo hubiera creado otro worker
+
+    assert _search(client, "monitor") == ["Monitor gamer"]
+    assert _search(client, "parlante") == ["Parlante"]
+
+
+def test_search_results_are_capped(app, client, make_product):
+    for i in range(5):
+        make_product(name=f"Cable {i}")
+    app.config["SEARCH_MAX_RESULTS"] = 3
+    try:
+        assert len(_search(client, "ca")) == 3
+    finally:
+        app.config["SEARCH_MAX_RESULTS"] = 1000
@@ -0,0 +1,48 @@
+"""Descuento de stock (user-007): sin sobreventa y errores con el producto correcto."""
+import pytest
+from database import db
+from models import Product, SalesDirtyDay
+from stock import InsufficientStock
+import admin_stats
+import crud
+
+
+def _order(product_ids, quantity=1):
+    return crud.create_order({
+        "payment_method": "tarjeta",
+        "items": [{"product_id": pid, "quantity": quantity, "price": 1.0} for pid in product_ids],
+    })
+
+
+def test_last_units_are_sold_once(app, make_product):
+    product_id = make_product(stock=2)
+    with app.app_context():
+        _order([product_id])
+        _order([product_id])
+        with pytest.raises(InsufficientStock):
+            _order([product_id])
+        db.session.rollback()
+        assert db.session.get(Product, product_id).stock == 0
+
+
+def test_reports_the_product_that_ran_short(app, make_product):
+    # Ids ordenados: el que alcanza va primero en el bloqueo
+    plenty = make_product(stock=10)
+    short = make_product(stock=1)
+    first, second = sorted([plenty, short])
+    with app.app_context():
+        with pytest.raises(InsufficientStock) as error:
+            _order([first, second], quantity=2)
+        db.session.rollback()
+    assert error.value.product_id == short
+    assert error.value.available == 1
+
+
+def test_load_test_cleanup_keeps_dashboard_counters(app):
+    import load_test_checkout
+    with app.app_context():
+        admin_stats.reconcile()
+    assert load_test_checkout.main(orders=4, initial_stock=3, threads=1)
+    with app.app_context():
+        assert admin_stats.reconcile() == {}
+        assert SalesDirtyDay.query.count() > 0
@@ -30,19 +30,9 @@ export function CartProvider({ children }: { children: React.ReactNode }) {
       return
     }
     setLoading(true)
-    cartsApi.getByUser(user.id)
-      .then(cart => {
-        if (!cart) {
-          setItems([])
-          setLoading(false)
-          return
-        }
-        cartItemsApi.getAll()
-          .then(data => {
-            setItems(data.filter((item: CartItem) => item.cart_id === cart.id))
-          })
-          .finally(() => setLoading(false))
-      })
+    cartsApi.getFull(user.id)
+      .then(cart => setItems(cart.items))
+      .finally(() => setLoading(false))
   }, [user])
 
   // --- Agregar producto ---
@@ -51,10 +41,8 @@ export function CartProvider({ children }: { children: React.ReactNode }) {
     setLoading(true)
     try {
       await cartItemsApi.addOrUpdate(user.id, product_id, quantity)
-      const cart = await cartsApi.getByUser(user.id)
-      if (!cart) { setItems([]); setLoading(false); return }
-      const data = await cartItemsApi.getAll()
-      setItems(data.filter((item: CartItem) => item.cart_id === cart.id))
+      const cart = await cartsApi.getFull(user.id)
+      setItems(cart.items)
     } finally {
       setLoading(false)
     }
@@ -69,10 +57,8 @@ export function CartProvider({ children }: { children: React.ReactNode }) {
         await removeItem(itemId)
       } else {
         await cartItemsApi.updateQuantity(itemId, quantity)
-        const cart = await cartsApi.getByUser(user.id)
-        if (!cart) { setItems([]); setLoading(false); return }
-        const data = await cartItemsApi.getAll()
-        setItems(data.filter((item: CartItem) => item.cart_id === cart.id))
+        const cart = await cartsApi.getFull(user.id)
+        setItems(cart.items)
       }
     } finally {
       setLoading(false)
@@ -85,10 +71,8 @@ export function CartProvider({ children }: { children: React.ReactNode }) {
     setLoading(true)
     try {
       await cartItemsApi.delete(itemId)
-      const cart = await cartsApi.getByUser(user.id)
-      if (!cart) { setItems([]); setLoading(false); return }
-      const data = await cartItemsApi.getAll()
-      setItems(data.filter((item: CartItem) => item.cart_id === cart.id))
+      const cart = await cartsApi.getFull(user.id)
+      setItems(cart.items)
     } finally {
       setLoading(false)
     }
@@ -0,0 +1,6 @@
+-- Índices para la paginación por cursor del catálogo (GET /products/?limit=...)
+-- Cada modo de orden usa (columna, id) para que el recorrido sea estable.
+CREATE INDEX ix_products_name_id ON products (name, id);
+CREATE INDEX ix_products_price_id ON products (price, id);
+CREATE INDEX ix_products_stock_id ON products (stock, id);
+CREATE INDEX ix_products_created_at_id ON products (created_at, id);
@@ -0,0 +1,4 @@
+-- Índices para calcular los ETag/Last-Modified (MAX(...) y COUNT(*)) sin leer filas
+CREATE INDEX ix_products_updated_at ON products (updated_at);
+CREATE INDEX ix_categories_updated_at ON categories (updated_at);
+CREATE INDEX ix_invoices_order_id_created_at ON invoices (order_id, created_at);
@@ -0,0 +1,14 @@
+-- Reservas de stock por carrito (STOCK_HOLD_MINUTES > 0), ver backend/stock.py
+CREATE TABLE stock_holds (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(36) NOT NULL,
+    product_id VARCHAR(36) NOT NULL,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_stock_holds_user_product UNIQUE (user_id, product_id),
+    INDEX ix_stock_holds_product_expires (product_id, expires_at),
+    INDEX ix_stock_holds_expires_at (expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (product_id) REFERENCES products(id)
+);
@@ -0,0 +1,2 @@
+-- Estado de generación del PDF de la boleta (pending, ready, failed)
+ALTER TABLE invoices ADD COLUMN status VARCHAR(20) NOT NULL DEFAULT 'ready';
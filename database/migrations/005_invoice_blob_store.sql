@@ -0,0 +1,5 @@
+-- PDFs de boletas fuera de la fila: clave SHA-256 en el almacén de blobs.
+-- Luego de aplicar, mover los existentes con: flask --app app migrate-invoice-blobs
+ALTER TABLE invoices ADD COLUMN pdf_key VARCHAR(64) NULL;
+ALTER TABLE invoices ADD COLUMN pdf_size INT NULL;
+CREATE INDEX ix_invoices_pdf_key ON invoices (pdf_key);
@@ -0,0 +1,9 @@
+-- Agregados del panel mantenidos al escribir (ver backend/admin_stats.py).
+-- Tras crear la tabla: flask reconcile-stats (la llena desde las tablas base)
+CREATE TABLE admin_stats (
+    metric VARCHAR(30) NOT NULL,
+    dimension VARCHAR(50) NOT NULL DEFAULT '',
+    count BIGINT NOT NULL DEFAULT 0,
+    amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, dimension)
+);
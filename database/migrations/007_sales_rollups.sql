@@ -0,0 +1,18 @@
+-- Analítica de ventas (ver backend/sales_analytics.py).
+-- Tras crear las tablas: flask backfill-sales
+CREATE TABLE sales_rollups (
+    granularity VARCHAR(5) NOT NULL,
+    dimension VARCHAR(20) NOT NULL,
+    dim_key VARCHAR(100) NOT NULL DEFAULT '',
+    bucket_start DATETIME NOT NULL,
+    orders INT NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, dimension, dim_key, bucket_start),
+    INDEX ix_sales_rollups_top (granularity, dimension, bucket_start, dim_key)
+);
+
+CREATE TABLE sales_dirty_days (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    day DATETIME NOT NULL
+);
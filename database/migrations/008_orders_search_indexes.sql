@@ -0,0 +1,8 @@
+-- Listado de órdenes (GET /orders/): filtros + paginación por (created_at, id)
+CREATE INDEX ix_orders_created_at_id ON orders (created_at, id);
+CREATE INDEX ix_orders_status_created_at ON orders (status, created_at, id);
+CREATE INDEX ix_orders_payment_method_created_at ON orders (payment_method, created_at, id);
+CREATE INDEX ix_orders_user_id_created_at ON orders (user_id, created_at, id);
+
+-- Búsqueda por prefijo de nombre (order_number y email ya tienen índice único)
+CREATE INDEX ix_users_full_name ON users (full_name);
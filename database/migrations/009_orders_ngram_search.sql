@@ -0,0 +1,4 @@
+-- Opcional, solo con ORDER_SEARCH=ngram: búsqueda por fragmentos (n-gramas)
+-- en número de orden, correo y nombre. Encarece algo las escrituras.
+ALTER TABLE orders ADD FULLTEXT INDEX ft_orders_order_number (order_number) WITH PARSER ngram;
+ALTER TABLE users ADD FULLTEXT INDEX ft_users_name_email (full_name, email) WITH PARSER ngram;
@@ -0,0 +1,8 @@
+-- Contadores del panel repartidos en shards (ver backend/admin_stats.py):
+-- cada transacción suma en una fila al azar de (metric, dimension).
+ALTER TABLE admin_stats
+    ADD COLUMN shard SMALLINT NOT NULL DEFAULT 0 AFTER dimension,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (metric, dimension, shard);
+-- Después (obligatorio): flask reconcile-stats. Deja los totales exactos y la
+-- marca _seeded; hasta entonces el panel concilia al primer acceso.
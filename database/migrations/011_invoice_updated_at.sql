@@ -0,0 +1,5 @@
+-- Versión de la boleta para los ETag de /invoices: cambia cuando el PDF pasa a
+-- ready/failed o se mueve al almacén de blobs (microsegundos, ver http_cache.py)
+ALTER TABLE invoices
+    ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX ix_invoices_updated_at (updated_at);
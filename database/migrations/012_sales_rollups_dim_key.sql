@@ -0,0 +1,3 @@
+-- dim_key guarda también la marca (products.brand es VARCHAR(100)); con 64 una
+-- marca larga hacía fallar el rollup. Para bases creadas con la 007 original.
+ALTER TABLE sales_rollups MODIFY dim_key VARCHAR(100) NOT NULL DEFAULT '';
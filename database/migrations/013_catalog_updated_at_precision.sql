@@ -0,0 +1,7 @@
+-- updated_at de productos y categorías con microsegundos: los ETag de
+-- /products y /categories usan MAX(updated_at) y con segundos dos ediciones
+-- en el mismo segundo devolvían un 304 con el listado anterior (ver http_cache.py)
+ALTER TABLE products
+    MODIFY updated_at DATETIME(6) NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+ALTER TABLE categories
+    MODIFY updated_at DATETIME(6) NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
@@ -0,0 +1,29 @@
+-- Llena admin_stats desde las tablas base si nunca se concilió (mismo
+-- cálculo que admin_stats.compute() / flask reconcile-stats). GET
+-- /admin/stats ya no concilia: solo lee lo que hay. Si la tabla ya tiene la
+-- marca _seeded no hace nada.
+START TRANSACTION;
+
+SELECT COUNT(*) INTO @seeded FROM admin_stats WHERE metric = '_seeded' FOR UPDATE;
+
+-- Sin la marca solo hay ajustes parciales de los hooks: se reemplazan
+DELETE FROM admin_stats WHERE @seeded = 0;
+
+INSERT INTO admin_stats (metric, dimension, shard, count, amount)
+SELECT 'products', '', 0, COUNT(*), 0 FROM products WHERE @seeded = 0
+UNION ALL
+SELECT 'users', '', 0, COUNT(*), 0 FROM users WHERE @seeded = 0
+UNION ALL
+SELECT 'low_stock', '', 0, COUNT(*), 0 FROM products WHERE stock < min_stock AND @seeded = 0
+UNION ALL
+SELECT 'orders', '', 0, COUNT(*), COALESCE(SUM(total_amount), 0) FROM orders WHERE @seeded = 0
+UNION ALL
+SELECT 'status', COALESCE(status, ''), 0, COUNT(*), SUM(total_amount)
+FROM orders WHERE @seeded = 0 GROUP BY COALESCE(status, '')
+UNION ALL
+SELECT 'payment_method', COALESCE(payment_method, ''), 0, COUNT(*), SUM(total_amount)
+FROM orders WHERE @seeded = 0 GROUP BY COALESCE(payment_method, '')
+UNION ALL
+SELECT '_seeded', '', 0, 1, 0 FROM DUAL WHERE @seeded = 0;
+
+COMMIT;
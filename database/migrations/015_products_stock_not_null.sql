@@ -0,0 +1,6 @@
+-- stock NOT NULL DEFAULT 0: un NULL ya se trataba como sin stock (orden y
+-- filtro in_stock del catálogo, carrito). El orden por stock de GET
+-- /products usa la columna tal cual, así ix_products_stock_id (stock, id)
+-- sirve para el ORDER BY y el cursor; con COALESCE(stock, 0) no se usaba.
+UPDATE products SET stock = 0 WHERE stock IS NULL;
+ALTER TABLE products MODIFY stock INT NOT NULL DEFAULT 0;
@@ -1,6 +1,7 @@
 // src/lib/api.ts
 import type {
   Product, ProductCreate, Category, Order, User, Cart, CartItem, OrderItem, Invoice,
+  CartOperation, CartWithItems, CartView,
 } from "./types"
 
 const API_URL = "http://localhost:5000"
@@ -265,6 +266,26 @@ export const cartsApi = {
     return res.json()
   },
 
+  // Carrito con items, datos del producto y totales en una sola petición
+  async getFull(user_id: string): Promise<CartView> {
+    const res = await fetch(`${API_URL}/cart/user/${user_id}/full`, { headers: getAuthHeaders() })
+    if (!res.ok) throw new Error("Error al obtener carrito del usuario")
+    return res.json()
+  },
+
+  // Varias operaciones (p. ej. restaurar un armado guardado) en una sola petición;
+  // devuelve el carrito completo con sus items
+  async patchItems(user_id: string, operations: CartOperation[]): Promise<CartWithItems> {
+    const res = await fetch(`${API_URL}/cart/user/${user_id}/items`, {
+      method: "PATCH",
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ operations }),
+    })
+    const data = await res.json()
+    if (!res.ok) throw new Error(data.message || "Error al actualizar el carrito")
+    return data
+  },
+
   // Normalmente NO necesitas create/update/delete de carrito desde frontend, pero los dejo por si acaso:
   async create(cart: Omit<Cart, "id" | "created_at" | "updated_at">): Promise<Cart> {
     const res = await fetch(`${API_URL}/cart/`, {
@@ -297,8 +318,9 @@ export const cartsApi = {
 
 // ----------- CART ITEMS -----------
 export const cartItemsApi = {
-  async getAll(): Promise<CartItem[]> {
-    const res = await fetch(`${API_URL}/cart_items/`, { headers: getAuthHeaders() })
+  async getAll(cartId?: string): Promise<CartItem[]> {
+    const query = cartId ? `?cart_id=${encodeURIComponent(cartId)}` : ""
+    const res = await fetch(`${API_URL}/cart_items/${query}`, { headers: getAuthHeaders() })
     if (!res.ok) throw new Error("Error al obtener items del carrito")
     return res.json()
   },
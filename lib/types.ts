@@ -90,6 +90,24 @@ export type CartItem = {
   stock?: number // <--- añade esto
 }
 
+// Operación del PATCH /cart/user/<id>/items (se aplican todas o ninguna)
+export type CartOperation = {
+  op: "add" | "set" | "remove"
+  product_id: string
+  quantity?: number
+}
+
+export type CartWithItems = Cart & { items: CartItem[] }
+
+// GET /cart/user/<id>/full: los precios ya incluyen IGV; subtotal + igv = total
+export type CartView = CartWithItems & {
+  version: string
+  item_count: number
+  subtotal: number
+  igv: number
+  total: number
+}
+
 // ---------- ORDER ----------
 export type Order = {
   id: string